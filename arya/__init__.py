@@ -2,5 +2,6 @@ from .style import style
 from .style.style import COLORS
 from .plotting import *
 from .figure import *
+from . import stats
 
 
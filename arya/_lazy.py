@@ -0,0 +1,36 @@
+import importlib
+import sys
+
+
+class LazyModule:
+    """
+    A module imported only on first use, i.e. when one of its attributes
+    is first looked up, to keep ``import arya`` fast. For example,
+
+        pd = LazyModule("pandas")
+
+    stands in for ``import pandas as pd``.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'>"
+
+
+
+def is_imported(name):
+    """
+    Whether the module name has been imported (by anyone). Objects of
+    a library cannot exist before it is imported, so type checks may
+    be skipped until then.
+    """
+    return name in sys.modules
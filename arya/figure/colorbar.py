@@ -1,10 +1,26 @@
 import matplotlib as mpl
-import matplotlib.pyplot as plt
 import numpy as np
 
+from .._lazy import LazyModule
+
+
+plt = LazyModule("matplotlib.pyplot")
+
+
+
+# the number of values mapped at once, so the indices stay in cache
+BLOCK_SIZE = 2**16
 
 
 class HueMap:
+    """
+    Maps hue values to colours through a norm and a colormap.
+
+    The colormap is precomputed as a uint8 RGBA lookup table (with the
+    under, over, and bad colours), so an array of values is mapped by
+    quantizing it to indices of the table and one ``np.take``, a block
+    at a time.
+    """
     def __init__(self, clim, norm="linear", cmap=None):
         if cmap is None:
             cmap = plt.get_cmap()
@@ -22,9 +38,103 @@ class HueMap:
             norm = mpl.colors.LogNorm(vmin=clim[0], vmax=clim[1])
 
         self._mpl = mpl.cm.ScalarMappable(norm=norm, cmap=cmap)
+        self._lut_float = rgba_lut(self._mpl.cmap)
+        self._lut = (self._lut_float * 255).astype(np.uint8)
 
-    def __call__(self, val):
-        return self._mpl.to_rgba(val)
+    def __call__(self, val, bytes=False):
+        """
+        The RGBA colour of val (a tuple for a scalar, or an array of
+        shape val.shape + (4,)), as floats or, if bytes, uint8
+        """
+        if bytes:
+            rgba = self.to_rgba_bytes(val)
+        else:
+            rgba = np.take(self._lut_float, self.index(val), axis=0)
+        return tuple(rgba) if np.ndim(val) == 0 else rgba
+
+    def bin_color(self, code):
+        """
+        The colour of the bin with index code, for a norm given by bin edges
+        """
+        rgba = self._lut_float[np.asarray(code) + 1]
+        return tuple(rgba) if np.ndim(code) == 0 else rgba
+
+    def to_rgba_bytes(self, val, out=None):
+        """
+        The uint8 RGBA colours of an array of values
+        """
+        val = np.asarray(val)
+        if out is None:
+            out = np.empty(val.shape + (4,), dtype=np.uint8)
+
+        flat = val.reshape(-1)
+        # each colour is taken as one uint32
+        lut = self._lut.view(np.uint32).reshape(-1)
+        packed = out.reshape(-1, 4).view(np.uint32).reshape(-1)
+        for start in range(0, len(flat), BLOCK_SIZE):
+            block = slice(start, start + BLOCK_SIZE)
+            np.take(lut, self.index(flat[block]), out=packed[block])
+        return out
+
+    def index(self, val):
+        """
+        The index of each value in the lookup table: 0 for values under
+        the norm, 1 to N for the N colours, N + 1 over, and N + 2 if bad
+        """
+        norm = self._mpl.norm
+        N = self._mpl.cmap.N
+        shape = np.shape(val)
+        val = np.atleast_1d(np.asarray(val, dtype=float))
+
+        bad = np.isnan(val)
+        if _is_binned(norm) and norm.Ncmap == N:
+            idx = np.searchsorted(norm.boundaries, val, side="right")
+        else:
+            # the same operations as the norm and Colormap, so the
+            # colours are identical
+            if type(norm) is mpl.colors.Normalize:
+                f = val - norm.vmin
+                f /= norm.vmax - norm.vmin
+            elif type(norm) is mpl.colors.LogNorm:
+                # LogNorm masks inf as well as values <= 0
+                bad = ~((val > 0) & (val < np.inf))
+                lo, hi = np.log10([norm.vmin, norm.vmax])
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    f = np.log10(val)
+                f -= lo
+                f /= hi - lo
+            else:
+                f = np.ma.filled(norm(val).astype(float), np.nan)
+            f *= N
+
+            # the top of the range is in the last colour; nan becomes
+            # under, but is bad below
+            top = f == N
+            np.fmax(f, -1, out=f)
+            np.fmin(f, N, out=f)
+            f += 1
+            idx = f.astype(np.intp)
+            idx[top] = N
+
+        idx[bad] = N + 2
+        return idx.reshape(shape)
+
+
+def rgba_lut(cmap):
+    """
+    The RGBA lookup table of cmap: the under colour, the N colours, 
+    then the over and bad colours
+    """
+    under, over, bad = cmap.get_under(), cmap.get_over(), cmap.get_bad()
+    return np.vstack([under, cmap(np.arange(cmap.N)), over, bad])
+
+
+def _is_binned(norm):
+    """
+    Whether norm maps each bin of its boundaries to one colour
+    """
+    return (isinstance(norm, mpl.colors.BoundaryNorm) and norm.extend == "neither"
+            and norm.Ncmap == len(norm.boundaries) - 1)
 
 
 class Colorbar:
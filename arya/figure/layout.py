@@ -1,6 +1,10 @@
-import matplotlib.pyplot as plt
 from .grid import Grid
 from .subplot import Subplot
+from .._lazy import LazyModule
+
+
+plt = LazyModule("matplotlib.pyplot")
+
 
 class LayoutManager:
     """
@@ -1,9 +1,14 @@
-from matplotlib import pyplot as plt
 import numpy as np
 from matplotlib.transforms import Bbox
 import matplotlib as mpl
 import itertools
 
+from .._lazy import LazyModule
+
+
+plt = LazyModule("matplotlib.pyplot")
+
+
 class Legend:
     def __init__(self, loc=None, ax=None, labels=None, 
                  color_only=False, transpose=False, **kwargs):
@@ -1,6 +1,9 @@
-import matplotlib.pyplot as plt
 from matplotlib.transforms import Bbox
 from ..style.style import FIG_SIZE
+from .._lazy import LazyModule
+
+
+plt = LazyModule("matplotlib.pyplot")
 
 
 class Subplot:
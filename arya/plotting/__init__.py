@@ -1,7 +1,15 @@
 from .binnedplot import binnedplot
 from .medianplot import medianplot
 from ._plot_data import PlotData
-from .histogram import hist, hist2d
+from ._readers import LazyTable
+from .histogram import hist, hist2d, Histogram, Histogram2D
+from .density import densityplot, DensityImage
+from .pyramid import HistPyramid
+from .kde import kde, kde2d, KDE, KDE2D
+from ._cache import ResultCache
 
 
-__all__ = ["binnedplot", "PlotData", "medianplot", "hist", "hist2d"]
+__all__ = ["binnedplot", "PlotData", "LazyTable", "medianplot", 
+           "hist", "hist2d", "Histogram", "Histogram2D",
+           "densityplot", "DensityImage", "HistPyramid",
+           "kde", "kde2d", "KDE", "KDE2D", "ResultCache"]
@@ -0,0 +1,671 @@
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import nullcontext
+import os
+
+import numpy as np
+
+from .._lazy import LazyModule
+
+
+pd = LazyModule("pandas")
+
+
+# the number of values per bin and level a QuantileSketch keeps
+SKETCH_SIZE = 200
+
+# the largest sample a scan for bin ranges and widths keeps
+SAMPLE_SIZE = 100000
+
+
+def sketch_size(accuracy=None):
+    """
+    The size k of a :class:`QuantileSketch` whose percentiles are within
+    accuracy (as a fraction of the count, e.g. 0.01 for one percentile
+    point) of the requested rank. The default is SKETCH_SIZE.
+    """
+    if accuracy is None:
+        return SKETCH_SIZE
+    if not 0 < accuracy < 1:
+        raise ValueError("accuracy must be between 0 and 1")
+    return int(np.ceil(2 / accuracy))
+
+
+def digitize(x, bins):
+    """
+    Returns the index of the bin each value of x falls into.
+
+    Follows the conventions of ``scipy.stats.binned_statistic``:
+    bins are half open, [a, b), except for the last bin which also
+    includes its right edge. Values outside of the bins (or nan)
+    are given the index -1.
+    """
+    x = np.asarray(x)
+    bins = np.asarray(bins)
+    nbins = len(bins) - 1
+
+    idx = np.searchsorted(bins, x, side="right")
+    idx -= 1
+    idx[x == bins[-1]] = nbins - 1
+    idx[(idx < 0) | (idx >= nbins)] = -1
+
+    return idx
+
+
+
+class BinnedMoments:
+    """
+    A per-bin accumulator of the count, sum, sum of squared deviations
+    from the mean (m2), minimum and maximum of some values.
+
+    Accumulators for different subsets of the data may be combined
+    exactly with :meth:`merge`.
+    """
+
+    def __init__(self, count, total, m2, vmin, vmax):
+        self.count = count
+        self.total = total
+        self.m2 = m2
+        self.min = vmin
+        self.max = vmax
+
+
+    @classmethod
+    def empty(cls, nbins):
+        return cls(np.zeros(nbins, dtype=int),
+                   np.zeros(nbins),
+                   np.zeros(nbins),
+                   np.full(nbins, np.inf),
+                   np.full(nbins, -np.inf))
+
+
+    @classmethod
+    def from_index(cls, idx, y, nbins):
+        """
+        Computes the moments of y in one pass, given the bin index
+        of each value (see :func:`digitize`). Indices of -1 are ignored.
+        """
+        idx = np.asarray(idx)
+        y = np.asarray(y, dtype=float)
+
+        filt = idx >= 0
+        if not np.any(filt):
+            return cls.empty(nbins)
+        if not np.all(filt):
+            # ignored values go to an extra bin which is dropped at
+            # the end, rather than copying out the rest
+            idx = np.where(filt, idx, nbins)
+
+        # shifting by a reference value avoids most of the
+        # cancellation in sum(y^2) - sum(y)^2 / n
+        shift = y[np.argmax(filt)]
+        dy = y - shift
+
+        with np.errstate(invalid="ignore"):
+            count = np.bincount(idx, minlength=nbins+1)[:nbins]
+            s1 = np.bincount(idx, weights=dy, minlength=nbins+1)[:nbins]
+            np.square(dy, out=dy)
+            s2 = np.bincount(idx, weights=dy, minlength=nbins+1)[:nbins]
+        del dy
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            m2 = np.where(count > 0, s2 - s1**2 / count, 0)
+        m2 = np.maximum(m2, 0)
+
+        vmin = np.full(nbins+1, np.inf)
+        vmax = np.full(nbins+1, -np.inf)
+        np.minimum.at(vmin, idx, y)
+        np.maximum.at(vmax, idx, y)
+
+        return cls(count, s1 + shift*count, m2, vmin[:nbins], vmax[:nbins])
+
+
+    def resize(self, nbins):
+        """
+        Returns the moments padded with empty bins to length nbins
+        """
+        pad = BinnedMoments.empty(nbins - len(self))
+        return BinnedMoments(*(np.concatenate([a, b]) for a, b in 
+                               zip(self._arrays(), pad._arrays())))
+
+
+    def _arrays(self):
+        return self.count, self.total, self.m2, self.min, self.max
+
+
+    def merge(self, other):
+        """
+        Returns the moments of the union of the two samples
+        (Chan et al. parallel variance update).
+        """
+        count = self.count + other.count
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            delta = other.mean - self.mean
+            m2 = self.m2 + other.m2 + delta**2 * self.count * other.count / count
+
+        m2 = np.where((self.count > 0) & (other.count > 0), m2, self.m2 + other.m2)
+
+        return BinnedMoments(count, self.total + other.total, m2,
+                             np.minimum(self.min, other.min),
+                             np.maximum(self.max, other.max))
+
+
+    def __len__(self):
+        return len(self.count)
+
+
+    def _per_count(self, a, ddof=0):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.count > ddof, a / (self.count - ddof), np.nan)
+
+    @property
+    def mean(self):
+        return self._per_count(self.total)
+
+    @property
+    def var(self):
+        return self._per_count(self.m2)
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    @property
+    def sterr(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.std / np.sqrt(self.count)
+
+
+
+def bin_accumulators(x, y, codes, bins, size, sketch=False, seed=None, k=None):
+    """
+    Bins the rows x, y with group codes into the accumulators 
+    (a :class:`BinnedMoments` and, if sketch, a :class:`QuantileSketch`)
+    over the keys group * nbins + bin, of which there are size.
+    """
+    keys = bin_keys(digitize(x, bins), codes, len(bins) - 1)
+    return accumulators(keys, y, size, sketch=sketch, seed=seed, k=k)
+
+
+def bin_keys(idx, codes, nbins):
+    """
+    Combines the bin index and group code of each value into the key
+    group * nbins + bin (-1 if either is -1), overwriting idx.
+    """
+    invalid = (idx < 0) | (codes < 0)
+    idx += codes * nbins
+    idx[invalid] = -1
+    return idx
+
+
+def accumulators(keys, y, size, sketch=False, seed=None, k=None):
+    """
+    Accumulates y by key (-1 is ignored) into a :class:`BinnedMoments`
+    and, if sketch, a :class:`QuantileSketch` of size k.
+    """
+    moments = BinnedMoments.from_index(keys, y, size)
+    if sketch:
+        return moments, QuantileSketch(size, k=k, seed=seed).update(keys, y)
+    else:
+        return moments, None
+
+
+def merge_accumulators(parts):
+    """
+    Merges an iterable of (moments, sketch) accumulators, 
+    padding any with fewer keys.
+    """
+    moments = BinnedMoments.empty(0)
+    sketch = None
+    for part_moments, part_sketch in parts:
+        size = max(len(moments), len(part_moments))
+        moments = moments.resize(size).merge(part_moments.resize(size))
+
+        if part_sketch is not None:
+            if sketch is None:
+                sketch = part_sketch
+            else:
+                sketch.merge(part_sketch)
+
+    return moments, sketch
+
+
+def num_workers(workers):
+    """
+    The number of workers of workers (see :func:`imap`)
+    """
+    if isinstance(workers, Executor):
+        return getattr(workers, "_max_workers", None) or os.cpu_count() or 1
+    return workers or 1
+
+
+def imap(func, args, workers=None):
+    """
+    Yields func(*a) for each a in args, in order. 
+
+    workers may be a number of threads or a 
+    :class:`concurrent.futures.Executor` (e.g. a ProcessPoolExecutor).
+    Only a few tasks per worker are submitted ahead, so args may
+    be a long generator.
+    """
+    if workers is None or workers == 1:
+        for a in args:
+            yield func(*a)
+        return
+
+    if isinstance(workers, Executor):
+        executor = nullcontext(workers)
+    else:
+        executor = ThreadPoolExecutor(workers)
+    ahead = 2 * num_workers(workers)
+
+    with executor as ex:
+        pending = deque()
+        for a in args:
+            pending.append(ex.submit(func, *a))
+            if len(pending) > ahead:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+class Scan:
+    """
+    The ranges lo and hi (arrays with one entry per column), sample
+    (a list of columns), and number of rows n found by :func:`scan`
+    """
+    def __init__(self, lo, hi, sample, n):
+        self.lo = lo
+        self.hi = hi
+        self.sample = sample
+        self.n = n
+
+
+def scan(blocks, sample_size=SAMPLE_SIZE, seed=0):
+    """
+    One pass over blocks (tuples of columns), returning the range of
+    the finite rows of each column, the total number of rows, and a 
+    uniform random sample of at most sample_size finite rows, as a
+    :class:`Scan`. Rows with a value which is not finite in any
+    column are left out of the ranges and the sample.
+    """
+    rng = np.random.default_rng(seed)
+    lo = hi = None
+    sample = None
+    keys = np.zeros(0)
+    n = 0
+
+    for cols in blocks:
+        n += len(cols[0])
+        finite = np.isfinite(cols[0])
+        for col in cols[1:]:
+            finite &= np.isfinite(col)
+        cols = [np.asarray(col)[finite] for col in cols]
+        if len(cols[0]) == 0:
+            continue
+
+        block_lo = np.array([np.min(col) for col in cols])
+        block_hi = np.array([np.max(col) for col in cols])
+        lo = block_lo if lo is None else np.minimum(lo, block_lo)
+        hi = block_hi if hi is None else np.maximum(hi, block_hi)
+
+        # keeping the rows with the smallest random keys gives a
+        # uniform sample; once full, only smaller keys can enter
+        block_keys = rng.random(len(cols[0]))
+        if len(keys) >= sample_size:
+            enter = block_keys < keys.max()
+            block_keys = block_keys[enter]
+            cols = [col[enter] for col in cols]
+
+        keys = np.concatenate([keys, block_keys])
+        if sample is None:
+            sample = cols
+        else:
+            sample = [np.concatenate([a, b]) for a, b in zip(sample, cols)]
+        if len(keys) > sample_size:
+            keep = np.argpartition(keys, sample_size)[:sample_size]
+            keys = keys[keep]
+            sample = [col[keep] for col in sample]
+
+    if lo is None:
+        raise ValueError("there are no finite values to bin")
+    return Scan(lo, hi, sample, n)
+
+
+def binned_stats(idx, y, nbins, stat="mean", errorbar=None):
+    """
+    Calculates the given stat (and errorbar range) of y in each bin,
+    given the bin index of each value.
+
+    Returns y_l, y_c, y_h, counts, where y_l and y_h are None if
+    errorbar is None.
+    """
+    idx = np.asarray(idx)
+    moments = BinnedMoments.from_index(idx, y, nbins)
+    percentiles = lambda q: binned_percentiles(idx, y, nbins, q)
+
+    return _stats(moments, percentiles, stat, errorbar)
+
+
+def sketched_stats(moments, sketch, stat="mean", errorbar=None):
+    """
+    Like :func:`binned_stats`, but from accumulated moments and
+    a :class:`QuantileSketch` (which may be None if the stat
+    does not need percentiles).
+    """
+    percentiles = None if sketch is None else sketch.percentiles
+    return _stats(moments, percentiles, stat, errorbar)
+
+
+def needs_percentiles(stat):
+    return stat == "median"
+
+
+def _stats(moments, percentiles, stat, errorbar):
+    counts = moments.count
+
+    y_l = y_h = None
+    if stat == "count":
+        y_c = counts.astype(float)
+        if errorbar == "std":
+            e = np.sqrt(y_c)
+            y_l = y_c - e
+            y_h = y_c + e
+        elif errorbar is not None:
+            raise NotImplementedError
+
+    elif stat in ("mean", "std"):
+        y_c = getattr(moments, stat)
+        if errorbar in ("std", "sterr"):
+            e = getattr(moments, errorbar)
+            y_l = y_c - e
+            y_h = y_c + e
+        elif errorbar is not None:
+            raise NotImplementedError
+
+    elif stat in ("min", "max"):
+        y_c = np.where(counts > 0, getattr(moments, stat), np.nan)
+        if errorbar is not None:
+            raise NotImplementedError
+
+    elif stat == "median":
+        if errorbar is None:
+            y_c = percentiles(50)
+        else:
+            y_c, y_l, y_h = percentiles([50, *_errorbar_percentiles(errorbar)])
+
+    else:
+        raise NotImplementedError
+
+    return y_l, y_c, y_h, counts
+
+
+def rolling_stats(y, window, stat="median", errorbar=None):
+    """
+    Calculates the given stat (and errorbar range) of y in the window
+    of points ending at each point (nan for the first window - 1).
+
+    pandas keeps the rolling window in a skiplist, so this costs 
+    O(N log window) rather than re-sorting every window.
+    Returns y_l, y_c, y_h, where y_l and y_h are None if errorbar is None.
+    """
+    rolled = pd.Series(y).rolling(window)
+
+    y_l = y_h = None
+    if stat == "median":
+        y_c = rolled.median().values
+        if errorbar is not None:
+            lo, hi = _errorbar_percentiles(errorbar)
+            y_l = rolled.quantile(lo/100, interpolation="linear").values
+            y_h = rolled.quantile(hi/100, interpolation="linear").values
+
+    elif stat in ("mean", "std"):
+        std = rolled.std(ddof=0).values
+        if stat == "mean":
+            y_c = rolled.mean().values
+        else:
+            y_c = std
+
+        if errorbar in ("std", "sterr"):
+            e = std
+            if errorbar == "sterr":
+                e = e / np.sqrt(window)
+            y_l = y_c - e
+            y_h = y_c + e
+        elif errorbar is not None:
+            raise NotImplementedError
+
+    else:
+        raise NotImplementedError
+
+    return y_l, y_c, y_h
+
+
+def binned_percentiles(idx, y, nbins, q):
+    """
+    Returns the percentiles q (in percent, interpolated linearly as in
+    ``np.percentile``) of y in each bin, given the bin index of each value.
+    Empty bins are nan.
+
+    The values are sorted once by (bin, y) and every requested
+    percentile is then read off by index arithmetic, so asking for
+    more percentiles is almost free. Returns an array of shape
+    (len(q), nbins), or (nbins,) if q is a scalar.
+    """
+    idx = np.asarray(idx)
+    y = np.asarray(y, dtype=float)
+    q = np.asarray(q, dtype=float)
+
+    filt = idx >= 0
+    idx = idx[filt]
+    y = y[filt]
+
+    y = y[bin_order(idx, y, nbins)]
+
+    counts = np.bincount(idx, minlength=nbins)
+    starts = np.cumsum(counts) - counts
+    filled = counts > 0
+
+    pos = starts + np.multiply.outer(q / 100, np.maximum(counts - 1, 0))
+    lo = np.floor(pos).astype(int)
+    hi = np.minimum(lo + 1, starts + counts - 1)
+    frac = pos - lo
+
+    lo = np.where(filled, lo, 0)
+    hi = np.where(filled, hi, 0)
+    if len(y) == 0:
+        return np.full(pos.shape, np.nan)
+
+    values = y[lo] + frac * (y[hi] - y[lo])
+    return np.where(filled, values, np.nan)
+
+
+def bin_order(idx, y, nbins):
+    """
+    Returns the order which sorts the values by bin, then by value
+    """
+    # sort by y, then stably by bin; the latter is a radix sort
+    # whenever the bin index fits in 16 bits
+    order = np.argsort(y)
+    idx = idx[order]
+    if nbins <= np.iinfo(np.uint16).max:
+        idx = idx.astype(np.uint16)
+    return order[np.argsort(idx, kind="stable")]
+
+
+def _errorbar_percentiles(errorbar):
+    """
+    Returns the (lower, upper) percentiles for a percentile interval
+    errorbar, either "pi" (16 to 84) or ("pi", width).
+    """
+    if errorbar == "pi":
+        return 16, 84
+
+    if isinstance(errorbar, tuple) and len(errorbar) == 2 and errorbar[0] == "pi":
+        width = errorbar[1]
+        return 50 - width/2, 50 + width/2
+
+    raise NotImplementedError
+
+
+
+class QuantileSketch:
+    """
+    A mergeable sketch of the values in each bin, from which
+    approximate percentiles may be read in bounded memory.
+
+    Values are kept in levels, where a value at level h stands in for
+    2**h of the original values. Whenever a bin holds more than k
+    values at one level, they are sorted and every other one (from a
+    random offset) is promoted to the next level. Each bin then keeps
+    at most about k log2(n / k) values. Until a bin has been compacted,
+    its percentiles are exact.
+
+    Each compaction shifts a rank by at most half the weight of the
+    level, in a random direction, so the errors mostly cancel: the
+    rank of a percentile of a bin of n values is off by about 0.6 n / k
+    (rms), and by less than 2 n / k with high probability, independent
+    of n. :func:`sketch_size` gives k for a required accuracy.
+    Sketches with the same k merge without further loss.
+    """
+
+    def __init__(self, nbins, k=None, seed=None):
+        if k is None:
+            k = SKETCH_SIZE
+        self.nbins = nbins
+        self.k = k
+        self.levels = []
+        self._rng = np.random.default_rng(seed)
+
+
+    def update(self, idx, y):
+        """
+        Adds the values y with the bin indices idx (-1 is ignored)
+        """
+        idx = np.asarray(idx)
+        y = np.asarray(y, dtype=float)
+
+        filt = idx >= 0
+        self._add(0, idx[filt], y[filt])
+        self._compress()
+        return self
+
+
+    def merge(self, other):
+        """
+        Adds all values of another sketch to this one
+        """
+        self.nbins = max(self.nbins, other.nbins)
+        for h, (keys, values) in enumerate(other.levels):
+            self._add(h, keys, values)
+        self._compress()
+        return self
+
+
+    def resize(self, nbins):
+        self.nbins = nbins
+        return self
+
+
+    def _add(self, h, keys, values):
+        while len(self.levels) <= h:
+            self.levels.append((np.zeros(0, dtype=int), np.zeros(0)))
+
+        old_keys, old_values = self.levels[h]
+        self.levels[h] = (np.concatenate([old_keys, keys]),
+                          np.concatenate([old_values, values]))
+
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            keys, values = self.levels[h]
+            counts = np.bincount(keys, minlength=self.nbins)
+            full = counts > self.k
+            h += 1
+
+            if not np.any(full):
+                continue
+
+            in_full = full[keys]
+            fkeys = keys[in_full]
+            fvalues = values[in_full]
+            order = bin_order(fkeys, fvalues, self.nbins)
+            fkeys = fkeys[order]
+            fvalues = fvalues[order]
+
+            counts = np.where(full, counts, 0)
+            starts = np.cumsum(counts) - counts
+            rank = np.arange(len(fkeys)) - starts[fkeys]
+
+            # neighbouring pairs are replaced by one of the two,
+            # and an odd value out stays at this level
+            paired = rank < 2 * (counts[fkeys] // 2)
+            offset = self._rng.integers(0, 2, self.nbins)
+            promote = paired & (rank % 2 == offset[fkeys])
+
+            self.levels[h-1] = (
+                    np.concatenate([keys[~in_full], fkeys[~paired]]),
+                    np.concatenate([values[~in_full], fvalues[~paired]]))
+            self._add(h, fkeys[promote], fvalues[promote])
+
+
+    @property
+    def error(self):
+        """
+        The bound on the rank error of a percentile, as a fraction of the
+        count of its bin
+        """
+        return 2 / self.k
+
+
+    def percentiles(self, q, idx=None):
+        """
+        Returns the approximate percentiles q (in percent) of each bin,
+        in the same form as :func:`binned_percentiles`.
+
+        If idx is given, returns instead the percentile q[i] of
+        the bin idx[i] (broadcasting q against idx).
+        """
+        q = np.asarray(q, dtype=float)
+        if idx is None:
+            idx = np.arange(self.nbins)
+            q = q[..., np.newaxis]
+        q, idx = np.broadcast_arrays(q, np.asarray(idx, dtype=int))
+
+        keys = np.concatenate([k for k, _ in self.levels] + [np.zeros(0, dtype=int)])
+        values = np.concatenate([v for _, v in self.levels] + [np.zeros(0)])
+        weights = np.concatenate([np.full(len(k), 2.0**h) 
+                                  for h, (k, _) in enumerate(self.levels)] 
+                                 + [np.zeros(0)])
+
+        order = bin_order(keys, values, self.nbins)
+        keys = keys[order]
+        values = values[order]
+        weights = weights[order]
+
+        totals = np.bincount(keys, weights=weights, minlength=self.nbins)
+        starts = np.cumsum(totals) - totals
+        if len(values) == 0:
+            return np.full(q.shape, np.nan)
+
+        totals = totals[idx]
+        starts = starts[idx]
+        filled = totals > 0
+
+        # each value covers the ranks [cum - weight, cum)
+        cum = np.cumsum(weights)
+        pos = q / 100 * np.maximum(totals - 1, 0)
+        lo = np.floor(pos)
+        frac = pos - lo
+        hi = np.minimum(lo + 1, np.maximum(totals - 1, 0))
+
+        i_lo = np.searchsorted(cum, starts + lo, side="right")
+        i_hi = np.searchsorted(cum, starts + hi, side="right")
+        i_lo = np.minimum(i_lo, len(values) - 1)
+        i_hi = np.minimum(i_hi, len(values) - 1)
+
+        result = values[i_lo] + frac * (values[i_hi] - values[i_lo])
+        return np.where(filled, result, np.nan)
@@ -0,0 +1,323 @@
+from collections import OrderedDict
+import hashlib
+import os
+
+import numpy as np
+
+from .._lazy import LazyModule
+
+
+pd = LazyModule("pandas")
+
+
+# the default number of results a ResultCache keeps in memory
+CACHE_SIZE = 32
+
+# the default total size of the files a ResultCache keeps on disk
+CACHE_BYTES = 2**30
+
+# the number of values hashed at once, so columns are never copied whole
+HASH_BLOCK_SIZE = 2**20
+
+# part of every key, so results saved by older versions (e.g. with
+# other columns) are never read; bump it when the results change
+CACHE_VERSION = 3
+
+
+class ResultCache:
+    """
+    Memoizes the binned statistics of :class:`BinnedData` and
+    :class:`MedianData`, so that re-plotting unchanged data (e.g. while
+    changing the aesthetics) skips the binning. Results are keyed by a
+    fingerprint of the input columns and the binning parameters
+    (see :func:`fingerprint`).
+
+    The last maxsize results are kept in memory, dropping the least
+    recently used. With a path, results are also saved there as ``.npz``
+    files, which outlive the session; the least recently used files are
+    removed once they take up more than max_bytes.
+
+    Params
+    ------
+    maxsize : ``int``
+        the number of results kept in memory
+    path : ``str``
+        the directory of the on-disk tier (created if needed)
+    max_bytes : ``int``
+        the most space the files on disk may take up
+    """
+    def __init__(self, maxsize=CACHE_SIZE, path=None, max_bytes=CACHE_BYTES):
+        self.maxsize = maxsize
+        self.path = None if path is None else os.fspath(path)
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+
+        if self.path is not None:
+            os.makedirs(self.path, exist_ok=True)
+
+
+    def get(self, key):
+        """
+        Returns the result (a DataFrame and a dict of attributes) stored
+        under key, or None. A result found on disk is kept in memory.
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            data, attrs = self._memory[key]
+            return data.copy(), dict(attrs)
+
+        if self.path is None:
+            return None
+        file = self._file(key)
+        try:
+            data, attrs = _load_result(file)
+        except FileNotFoundError:
+            return None
+
+        # mark the file as recently used
+        os.utime(file)
+        self._remember(key, data, attrs)
+        return data.copy(), attrs
+
+
+    def put(self, key, data, attrs):
+        """
+        Stores a result: the DataFrame data and a dict of attributes
+        (arrays, scalars, or None). Results with columns of objects
+        other than strings are only kept in memory.
+        """
+        data = data.copy()
+        self._remember(key, data, dict(attrs))
+
+        if self.path is None:
+            return
+        try:
+            arrays = _result_arrays(data, attrs)
+        except TypeError:
+            return
+
+        # written to a temporary file first, so readers never see half a file
+        file = self._file(key)
+        tmp = f"{file}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, file)
+        self._evict()
+
+
+    def clear(self):
+        """
+        Removes every result, from memory and disk
+        """
+        self._memory.clear()
+        if self.path is not None:
+            for file, _ in self._files():
+                os.remove(file)
+
+
+    def __contains__(self, key):
+        return (key in self._memory
+                or (self.path is not None and os.path.exists(self._file(key))))
+
+
+    def __len__(self):
+        return len(self._memory)
+
+
+    def _remember(self, key, data, attrs):
+        self._memory[key] = (data, attrs)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ".npz")
+
+
+    def _files(self):
+        """
+        The cached files and their stats, least recently used first
+        """
+        files = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".npz"):
+                files.append((entry.path, entry.stat()))
+        files.sort(key=lambda f: f[1].st_mtime_ns)
+        return files
+
+
+    def _evict(self):
+        files = self._files()
+        total = sum(stat.st_size for _, stat in files)
+        for file, stat in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+            total -= stat.st_size
+
+
+
+# the cache used for cache=True
+DEFAULT_CACHE = ResultCache()
+
+
+def get_cache(cache):
+    """
+    The :class:`ResultCache` for a cache argument: None or False for
+    none, True for the shared in-memory cache, a path for a cache
+    on disk, or a ResultCache
+    """
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return DEFAULT_CACHE
+    if isinstance(cache, (str, os.PathLike)):
+        return ResultCache(path=cache)
+    return cache
+
+
+def fingerprint(*parts):
+    """
+    A hex digest of parts, which may be arrays (hashed by their dtype,
+    shape, and bytes, one block at a time), pandas Categoricals and
+    Series, dicts, lists and tuples of these, or scalars.
+    Columns of 10^7 floats take about 0.1s.
+    """
+    h = hashlib.sha1(usedforsecurity=False)
+    _update(h, parts)
+    return h.hexdigest()
+
+
+def result_key(dat, chunks=None, **params):
+    """
+    The cache key of the result of dat (e.g. a :class:`BinnedData`),
+    from its columns (or the chunks it reads and the names of the
+    columns read), params, and CACHE_VERSION. Returns None
+    if the chunks cannot be fingerprinted without reading them, i.e.
+    unless they are a list of files (keyed by their size and
+    modification time).
+    """
+    if chunks is None:
+        inputs = dat.columns
+    else:
+        stats = _chunk_stats(chunks)
+        if stats is None:
+            return None
+        # the files say nothing of which columns are read
+        inputs = (sorted(dat.vars.items(), key=str), stats)
+
+    return fingerprint(CACHE_VERSION, type(dat).__name__, sorted(dat.vars),
+                       inputs, params)
+
+
+def _chunk_stats(chunks):
+    if not isinstance(chunks, (list, tuple)):
+        return None
+
+    stats = []
+    for chunk in chunks:
+        if not isinstance(chunk, (str, os.PathLike)):
+            return None
+        stat = os.stat(chunk)
+        stats.append((os.fspath(chunk), stat.st_size, stat.st_mtime_ns))
+    return stats
+
+
+def _update(h, obj):
+    if isinstance(obj, dict):
+        h.update(b"dict")
+        for key in sorted(obj, key=str):
+            _update(h, key)
+            _update(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"{type(obj).__name__}{len(obj)}".encode())
+        for o in obj:
+            _update(h, o)
+    elif isinstance(obj, np.ndarray):
+        _update_array(h, obj)
+    elif type(obj).__module__.split(".")[0] == "pandas":
+        if isinstance(obj, pd.Categorical):
+            h.update(b"categorical")
+            _update(h, obj.codes)
+            _update(h, np.asarray(obj.categories))
+        else:
+            _update(h, np.asarray(obj))
+    elif obj is None or isinstance(obj, (str, bytes, bool, int, float,
+                                         complex, np.generic)):
+        h.update(f"{type(obj).__name__}:{obj!r}".encode())
+    else:
+        _update(h, np.asarray(obj))
+
+
+def _update_array(h, a):
+    h.update(f"array{a.dtype.str}{a.shape}".encode())
+    # (a view for columns, even strided ones)
+    a = a.reshape(-1)
+    if a.dtype.kind == "O":
+        # objects are hashed by value
+        a = pd.util.hash_array(a)
+
+    for start in range(0, len(a), HASH_BLOCK_SIZE):
+        block = np.ascontiguousarray(a[start:start + HASH_BLOCK_SIZE])
+        h.update(block.view(np.uint8))
+
+
+def _result_arrays(data, attrs):
+    """
+    The DataFrame data and dict attrs as arrays for ``np.savez``.
+    Categorical columns are saved as codes and categories.
+    Raises TypeError for columns of objects other than strings.
+    """
+    arrays = {"columns": np.array(data.columns, dtype=str),
+              "attrs": np.array(list(attrs), dtype=str)}
+
+    for i, name in enumerate(data.columns):
+        col = data[name]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            arrays[f"codes_{i}"] = np.asarray(col.cat.codes)
+            arrays[f"categories_{i}"] = _plain(np.asarray(col.cat.categories))
+            arrays[f"ordered_{i}"] = np.array(col.cat.ordered)
+        else:
+            arrays[f"column_{i}"] = _plain(np.asarray(col))
+
+    for name, value in attrs.items():
+        if value is not None:
+            arrays[f"attr_{name}"] = _plain(np.asarray(value))
+    return arrays
+
+
+def _load_result(file):
+    with np.load(file, allow_pickle=False) as f:
+        data = pd.DataFrame()
+        for i, name in enumerate(f["columns"]):
+            name = str(name)
+            if f"codes_{i}" in f:
+                data[name] = pd.Categorical.from_codes(f[f"codes_{i}"],
+                        categories=f[f"categories_{i}"],
+                        ordered=bool(f[f"ordered_{i}"]))
+            else:
+                data[name] = f[f"column_{i}"]
+
+        attrs = {}
+        for name in f["attrs"]:
+            value = f[f"attr_{name}"] if f"attr_{name}" in f else None
+            if value is not None and value.ndim == 0:
+                value = value.item()
+            attrs[str(name)] = value
+
+    return data, attrs
+
+
+def _plain(a):
+    """
+    a without objects, which np.load would need to unpickle
+    """
+    if a.dtype.kind != "O":
+        return a
+    if all(isinstance(v, str) for v in a.ravel()):
+        return a.astype(str)
+    raise TypeError("only arrays of numbers and strings are saved")
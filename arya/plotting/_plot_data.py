@@ -1,39 +1,285 @@
-from seaborn._core import typing
-import pandas as pd
-import numpy as np
+from collections.abc import Iterator
+import os
 
+import numpy as np
 
-class PlotData:
-    def __init__(self, data, x=None, y=None, hue=None, size=None, style=None):
-        self._vars = {}
-        self._data = pd.DataFrame()
+from .._lazy import LazyModule, is_imported
+from ._readers import LazyTable, is_table, read_columns
 
-        for var, name in [(x, "x"), 
-                (y, "y"), 
-                (hue, "hue"), 
-                (size, "size"), 
-                (style, "style")]:
 
-            if var is None:
-                continue
-            self._data[name] = data[var]
-            self._vars[name] = var
+pd = LazyModule("pandas")
 
 
-        self._data.dropna(inplace=True)
+class PlotData:
+    """
+    The columns x, y, hue, size, and style of data, which may be a
+    DataFrame, a dict of arrays, a (structured, or memory mapped)
+    numpy array, a pyarrow Table or RecordBatch, or a polars DataFrame.
+    data may also be a file or lazy handle (see :class:`LazyTable`),
+    of which only the needed columns are read.
 
+    The columns are kept as views into data where possible. Rather than
+    dropping rows with missing or non-finite values, one shared mask of
+    the valid rows is computed, and :attr:`data` (a DataFrame of only
+    the valid rows) is built on first access.
+    """
+    def __init__(self, data, x=None, y=None, hue=None, size=None, style=None):
+        self._vars = plot_vars(x=x, y=y, hue=hue, size=size, style=style)
+        if is_table(data):
+            data = read_columns(data, self._vars.values())
 
+        self._columns = {name: _column(data, var) 
+                         for name, var in self._vars.items()}
+        self._mask = None
+        self._data = None
 
 
     @property
     def data(self):
+        if self._data is None:
+            self._data = pd.DataFrame({name: self.column(name) 
+                                       for name in self._columns})
         return self._data
 
     @property
     def vars(self):
         return self._vars
 
+    @property
+    def columns(self):
+        """
+        The columns by role, including the invalid rows
+        """
+        return self._columns
+
+    @property
+    def mask(self):
+        """
+        Whether each row has a valid (not missing and, if numeric, 
+        finite) value in every column
+        """
+        if self._mask is None:
+            n = len(next(iter(self._columns.values()), []))
+            self._mask = np.ones(n, dtype=bool)
+            for col in self._columns.values():
+                self._mask &= _valid(col)
+        return self._mask
+
+
+    def column(self, name):
+        """
+        The valid values of a column; a view if all rows are valid
+        """
+        col = self._columns[name]
+        if np.all(self.mask):
+            return col
+        return col[self.mask]
+
+
+    def group_codes(self, group_cols):
+        """
+        Returns the group number of every row (-1 if the row is invalid
+        or belongs to no group) and a DataFrame of the group values.
+        """
+        return group_codes(self._columns, group_cols, mask=self.mask)
+
+
+    def _replace_data(self, data):
+        """
+        Replaces the data by a derived table (e.g. the binned statistics),
+        releasing the input columns
+        """
+        self._columns = {}
+        self._mask = None
+        self._data = data
+
+
     def __getitem__(self, key):
         return self.data[key]
 
 
+
+def _column(data, var):
+    """
+    The column var of data as an array, without copying where possible.
+    Categorical columns stay categorical. Columns of pyarrow Tables
+    and RecordBatches and of polars DataFrames are read directly,
+    without converting the table to pandas.
+    """
+    col = data[var]
+    library = type(col).__module__.split(".")[0]
+    if library == "pandas":
+        if isinstance(col, pd.Series):
+            return col.values
+        if isinstance(col, pd.api.extensions.ExtensionArray):
+            return col
+
+    if library == "pyarrow":
+        return _arrow_column(col)
+    if library == "polars":
+        # a view for numbers without nulls; nulls become nan
+        return col.to_numpy()
+
+    col = np.asarray(col)
+    if not col.dtype.isnative:
+        # e.g. FITS columns are big endian
+        col = col.astype(col.dtype.newbyteorder("="))
+    return col
+
+
+def _arrow_column(col):
+    """
+    An arrow Array or ChunkedArray as numpy. A single chunk of numbers
+    without nulls is a view of the arrow buffer, nulls become nan, and 
+    dictionary arrays become Categoricals.
+    """
+    if hasattr(col, "num_chunks"):
+        if col.num_chunks == 1:
+            col = col.chunk(0)
+        else:
+            col = col.combine_chunks()
+
+    if hasattr(col, "dictionary"):
+        codes = col.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+        categories = col.dictionary.to_numpy(zero_copy_only=False)
+        return pd.Categorical.from_codes(codes, categories=categories)
+
+    return col.to_numpy(zero_copy_only=False)
+
+
+def _valid(col):
+    if isinstance(col, np.ndarray) and col.dtype.kind in "fc":
+        return np.isfinite(col)
+    if isinstance(col, np.ndarray) and col.dtype.kind in "iub":
+        return np.ones(len(col), dtype=bool)
+    return np.asarray(pd.notna(col))
+
+
+
+def plot_vars(x=None, y=None, hue=None, size=None, style=None):
+    """
+    Returns a dict of the given variables, keyed by their role
+    """
+    return {name: var for var, name in [(x, "x"), 
+                (y, "y"), 
+                (hue, "hue"), 
+                (size, "size"), 
+                (style, "style")]
+            if var is not None}
+
+
+def group_codes(df, group_cols, mask=None):
+    """
+    Returns the group number of each row of df (-1 if the row
+    belongs to no group, or mask is False) and a DataFrame of the 
+    group values, in sorted order. df may be a DataFrame or a dict 
+    of columns.
+
+    Each column is factorized, and the codes are combined into one
+    integer key which is factorized again, so no table is built.
+    """
+    if mask is not None:
+        n = len(mask)
+    else:
+        n = len(df)
+
+    if len(group_cols) == 0:
+        codes = np.zeros(n, dtype=int)
+        if mask is not None:
+            codes[~mask] = -1
+        return codes, pd.DataFrame(index=[0])
+
+    key = None
+    invalid = np.zeros(n, dtype=bool) if mask is None else ~mask
+    uniques = []
+    for col in group_cols:
+        col_codes, col_uniques = pd.factorize(df[col], sort=True)
+        invalid |= col_codes < 0
+        if key is None:
+            key = col_codes.astype(np.int64, copy=False)
+        else:
+            key *= len(col_uniques)
+            key += col_codes
+        uniques.append(col_uniques)
+
+    key[invalid] = -1
+    del invalid
+    codes, keys = pd.factorize(key, sort=True)
+    if len(keys) > 0 and keys[0] == -1:
+        codes -= 1
+        keys = keys[1:]
+
+    group_values = pd.DataFrame()
+    for col, col_uniques in zip(reversed(group_cols), reversed(uniques)):
+        keys, col_codes = np.divmod(keys, len(col_uniques))
+        group_values[col] = col_uniques.take(col_codes)
+    group_values = group_values[group_cols]
+
+    return codes, group_values
+
+
+def global_codes(df, group_cols, groups):
+    """
+    Like :func:`group_codes`, but numbers the groups of df by the
+    dict groups (from group values to codes), which is extended with
+    any new groups. This keeps the codes of chunked data consistent.
+    """
+    local_codes, local_values = group_codes(df, group_cols)
+    if len(group_cols) > 0:
+        local_values = local_values.itertuples(index=False, name=None)
+    else:
+        local_values = [()]
+
+    to_global = np.array([groups.setdefault(g, len(groups)) 
+                          for g in local_values], dtype=int)
+    return np.where(local_codes >= 0, to_global[local_codes], -1)
+
+
+def group_table(groups, group_cols):
+    """
+    Returns the DataFrame of group values for the codes in groups
+    (see :func:`global_codes`)
+    """
+    if len(group_cols) == 0:
+        return pd.DataFrame(index=range(len(groups)))
+    return pd.DataFrame(list(groups.keys()), columns=group_cols)
+
+
+def is_chunked(data):
+    """
+    Whether data is a collection of chunks rather than a single table:
+    an iterator (e.g. from ``pd.read_csv(chunksize=...)``), a list or 
+    tuple of chunks, or a function returning a new iterator of chunks.
+    """
+    if isinstance(data, (np.ndarray, dict)):
+        return False
+    if is_imported("pandas") and isinstance(data, pd.DataFrame):
+        return False
+    # (an astropy HDUList is a list, but of HDUs rather than chunks)
+    if isinstance(data, (str, os.PathLike)) or is_table(data):
+        return False
+
+    return (isinstance(data, (Iterator, list, tuple)) 
+            or callable(data))
+
+
+def is_reiterable(data):
+    """
+    Whether the chunks may be read more than once
+    """
+    return isinstance(data, (list, tuple)) or callable(data)
+
+
+def iter_chunks(data):
+    """
+    Iterates over the chunks of chunked data. Each chunk may be 
+    anything :class:`PlotData` accepts, including the path to 
+    a file (which is read lazily, see :class:`LazyTable`).
+    """
+    if callable(data):
+        data = data()
+
+    for chunk in data:
+        if isinstance(chunk, (str, os.PathLike)):
+            chunk = LazyTable(chunk)
+        yield chunk
@@ -0,0 +1,328 @@
+from contextlib import contextmanager
+import operator
+import os
+
+import numpy as np
+
+
+FITS_SUFFIXES = (".fits", ".fit", ".fts", ".fits.gz")
+HDF5_SUFFIXES = (".h5", ".hdf5", ".hdf", ".he5")
+PARQUET_SUFFIXES = (".parquet", ".pq")
+
+# the comparisons allowed in LazyTable(where=...), as in pyarrow filters
+_OPS = {
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda a, b: np.isin(a, list(b)),
+    "not in": lambda a, b: ~np.isin(a, list(b)),
+}
+
+
+class LazyTable:
+    """
+    A table on disk (or behind a lazy handle) from which only the
+    columns a plot needs are read, e.g.
+    ``binnedplot(LazyTable("cat.fits", where=[("mag", "<", 20)]), x="ra", y="dec")``.
+    A plain path may also be passed as ``data``.
+
+    FITS and ``.npy`` files and contiguous HDF5 tables are memory
+    mapped, so only the pages of the requested columns and rows
+    are read. Parquet is read column by column with pyarrow,
+    passing on the filters.
+
+    Params
+    ------
+    source : path or handle
+        a FITS, HDF5, Parquet, or ``.npy`` file, or an open astropy
+        HDU or HDUList, h5py Dataset or Group, pyarrow Dataset,
+        or polars LazyFrame
+    rows : ``(start, stop)``
+        read only this range of rows
+    where : list of ``(column, op, value)``
+        read only the rows matching every condition. op is one of
+        ``==, !=, <, <=, >, >=, in, not in``.
+    hdu : ``int`` or ``str``
+        the FITS HDU (by default, the first with data)
+    key : ``str``
+        the path to the table in an HDF5 file, either a compound
+        dataset or a group of column datasets (by default, the first)
+    """
+
+    def __init__(self, source, rows=None, where=None, hdu=None, key=None):
+        self.source = source
+        self.rows = rows
+        self.where = list(where or [])
+        self.hdu = hdu
+        self.key = key
+
+        for _, op, _ in self.where:
+            if op not in _OPS:
+                raise ValueError(f"unknown comparison {op}")
+
+
+    def read(self, columns):
+        """
+        Returns a dict of the given columns, with the rows and
+        filters applied
+        """
+        columns = list(dict.fromkeys(columns))
+        kind = _kind(self.source)
+
+        if kind == "parquet":
+            return self._read_parquet(columns)
+        elif kind == "arrow":
+            return self._read_arrow(columns)
+        elif kind == "polars":
+            return self._read_polars(columns)
+        else:
+            with self._open(kind) as reader:
+                return self._read_arrays(reader, columns)
+
+
+    @contextmanager
+    def _open(self, kind):
+        """
+        Yields a function reading rows start:stop of a column
+        and the number of rows. Files opened from a path are
+        closed on exit; handles passed in are left open.
+        """
+        source = self.source
+        if kind == "npy":
+            source = np.load(source, mmap_mode="r")
+        elif kind == "fits" and isinstance(source, (str, os.PathLike)):
+            from astropy.io import fits
+            with fits.open(source, memmap=True) as hdul:
+                data = _fits_data(hdul, self.hdu)
+                # copied, as the memory map goes with the file
+                read = lambda col, start, stop: np.array(data[col][start:stop])
+                yield read, len(data)
+            return
+        elif kind == "fits":
+            source = _fits_data(source, self.hdu)
+        elif kind == "hdf5":
+            import h5py
+            # the columns read are copies, or memory maps of their own
+            with h5py.File(source, "r") as f:
+                yield _hdf5_reader(_hdf5_table(f, self.key))
+            return
+        elif kind == "h5py":
+            source = _hdf5_table(source, self.key)
+
+        module = type(source).__module__.split(".")[0]
+        if module == "h5py":
+            yield _hdf5_reader(source)
+        else:
+            yield (lambda col, start, stop: source[col][start:stop]), len(source)
+
+
+    def _read_arrays(self, reader, columns):
+        read, length = reader
+        start, stop = self.rows or (0, length)
+
+        mask = None
+        for col, op, value in self.where:
+            m = _OPS[op](read(col, start, stop), value)
+            mask = m if mask is None else (mask & m)
+
+        data = {}
+        for col in columns:
+            values = read(col, start, stop)
+            data[col] = values if mask is None else values[mask]
+        return data
+
+
+    def _read_parquet(self, columns):
+        import pyarrow.parquet as pq
+
+        if self.rows is None:
+            # the filters are pushed down to skip row groups
+            filters = [(col, op, value) for col, op, value in self.where] or None
+            table = pq.read_table(self.source, columns=columns, filters=filters,
+                                  memory_map=True)
+            return {col: table.column(col) for col in columns}
+
+        # only the row groups overlapping rows are read
+        file = pq.ParquetFile(self.source, memory_map=True)
+        start, stop = self.rows
+        ends = np.cumsum([file.metadata.row_group(i).num_rows 
+                          for i in range(file.num_row_groups)])
+        first = np.searchsorted(ends, start, side="right")
+        last = np.searchsorted(ends, stop, side="left")
+        offset = ends[first - 1] if first > 0 else 0
+
+        table = file.read_row_groups(range(first, min(last + 1, len(ends))), 
+                                     columns=self._columns_with_where(columns))
+        table = table.slice(start - offset, stop - start)
+        return self._filter_arrow(table, columns)
+
+
+    def _read_arrow(self, columns):
+        if self.rows is None:
+            table = self.source.to_table(columns=columns, filter=self._arrow_expr())
+            return {col: table.column(col) for col in columns}
+
+        start, stop = self.rows
+        table = self.source.take(np.arange(start, stop), 
+                                 columns=self._columns_with_where(columns))
+        return self._filter_arrow(table, columns)
+
+
+    def _columns_with_where(self, columns):
+        return list(dict.fromkeys(columns + [col for col, _, _ in self.where]))
+
+
+    def _arrow_expr(self):
+        import pyarrow.compute as pc
+
+        expr = None
+        for col, op, value in self.where:
+            field = pc.field(col)
+            if op in ("in", "not in"):
+                e = field.isin(list(value))
+                e = e if op == "in" else ~e
+            else:
+                e = _OPS[op](field, value)
+            expr = e if expr is None else (expr & e)
+        return expr
+
+
+    def _filter_arrow(self, table, columns):
+        expr = self._arrow_expr()
+        if expr is not None:
+            table = table.filter(expr)
+        return {col: table.column(col) for col in columns}
+
+
+    def _read_polars(self, columns):
+        import polars as pl
+
+        frame = self.source
+        if self.rows is not None:
+            start, stop = self.rows
+            frame = frame.slice(start, stop - start)
+
+        for col, op, value in self.where:
+            if op in ("in", "not in"):
+                e = pl.col(col).is_in(list(value))
+                e = e if op == "in" else ~e
+            else:
+                e = _OPS[op](pl.col(col), value)
+            frame = frame.filter(e)
+
+        df = frame.select(columns).collect()
+        return {col: df.get_column(col) for col in columns}
+
+
+
+def is_table(data):
+    """
+    Whether data is a path or lazy handle to be read by :class:`LazyTable`
+    """
+    return isinstance(data, LazyTable) or _kind(data) is not None
+
+
+def read_columns(data, columns):
+    """
+    Reads the columns of a path or handle (see :func:`is_table`)
+    into a dict of arrays
+    """
+    if not isinstance(data, LazyTable):
+        data = LazyTable(data)
+    return data.read(columns)
+
+
+def _kind(source):
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source).lower()
+        if path.endswith(".npy"):
+            return "npy"
+        if path.endswith(FITS_SUFFIXES):
+            return "fits"
+        if path.endswith(HDF5_SUFFIXES):
+            return "hdf5"
+        if path.endswith(PARQUET_SUFFIXES):
+            return "parquet"
+        raise ValueError(f"cannot tell the format of {source}")
+
+    module = type(source).__module__
+    name = type(source).__name__
+    if module.startswith("astropy.io.fits") and name != "FITS_rec":
+        return "fits"
+    if module.startswith("h5py") and name in ("File", "Group", "Dataset"):
+        return "h5py"
+    if module.startswith("pyarrow") and "Dataset" in name:
+        return "arrow"
+    if module.startswith("polars") and name == "LazyFrame":
+        return "polars"
+    return None
+
+
+def _fits_data(source, hdu):
+    """
+    The table data of an HDUList or HDU
+    """
+    if hasattr(source, "data"):
+        return source.data
+    if hdu is not None:
+        return source[hdu].data
+
+    for h in source:
+        if h.data is not None:
+            return h.data
+    raise ValueError("the FITS file has no data")
+
+
+def _hdf5_table(source, key):
+    """
+    The compound dataset or group of columns at key (by default the
+    first in the file)
+    """
+    if key is not None:
+        return source[key]
+
+    while type(source).__name__ != "Dataset":
+        datasets = [source[k] for k in source]
+        compound = [d for d in datasets if type(d).__name__ == "Dataset"
+                    and d.dtype.names is not None]
+        if compound:
+            return compound[0]
+        if all(type(d).__name__ == "Dataset" for d in datasets):
+            return source
+        source = datasets[0]
+    return source
+
+
+def _hdf5_reader(table):
+    """
+    A (read, length) pair for an h5py compound dataset or group of
+    column datasets. Contiguous, uncompressed datasets are memory mapped.
+    """
+    if type(table).__name__ == "Dataset":
+        data = _hdf5_memmap(table)
+        if data is not None:
+            return (lambda col, start, stop: data[col][start:stop]), len(data)
+        return (lambda col, start, stop: table.fields(col)[start:stop]), len(table)
+
+    columns = {}
+    def read(col, start, stop):
+        if col not in columns:
+            columns[col] = _hdf5_memmap(table[col])
+            if columns[col] is None:
+                columns[col] = table[col]
+        return columns[col][start:stop]
+
+    first = table[next(iter(table))]
+    return read, len(first)
+
+
+def _hdf5_memmap(dataset):
+    offset = dataset.id.get_offset()
+    if dataset.chunks is not None or dataset.compression is not None or offset is None:
+        return None
+    return np.memmap(dataset.file.filename, mode="r", dtype=dataset.dtype,
+                     offset=offset, shape=dataset.shape)
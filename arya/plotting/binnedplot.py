@@ -1,70 +1,253 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
+import matplotlib as mpl
 import numpy as np
-import pandas as pd
 
-from scipy.stats import binned_statistic
-import astropy.stats
-
-from ._plot_data import PlotData
+from ._plot_data import (PlotData, plot_vars, global_codes, 
+                         group_table, is_chunked, is_reiterable, iter_chunks)
+from ._binning import (digitize, binned_stats, sketched_stats, needs_percentiles, scan,
+                       bin_keys, bin_accumulators, merge_accumulators, imap, num_workers)
+from .histogram import scotts_bin_width, freedman_bin_width
+from .density import densityplot, fade_cmap
+from ._cache import get_cache, result_key
 from ..figure.colorbar import Colorbar
+from .._lazy import LazyModule
+
+
+plt = LazyModule("matplotlib.pyplot")
+pd = LazyModule("pandas")
+
+
+# the largest sample make_bins evaluates the bin rules on
+BINS_SAMPLE_SIZE = 5000
+
+# the most bins the freedman and scott rules will create
+MAX_AUTO_BINS = 1000
 
 
 class BinnedData(PlotData):
+    """
+    The binned statistics of y in bins of x, for each group of
+    hue, style and size.
+
+    data may also be chunked (see :func:`is_chunked`), e.g. an iterator
+    from ``pd.read_csv(chunksize=...)`` or a list of ``.npy`` files.
+    The chunks are then read one at a time and only per-bin accumulators
+    are kept in memory, with percentiles estimated by a
+    :class:`QuantileSketch`. Unless the bins are fixed (by edges, or by a
+    binrange together with a number of bins or a binwidth), the chunks
+    are read twice, so they must be a list or a function returning
+    a new iterator.
+
+    With a cache (see :class:`ResultCache`), the result is looked up by
+    a fingerprint of the columns (or chunk files) and the parameters,
+    and only computed if missing.
+    """
     def __init__(self, data, x=None, y=None, hue=None, style=None, size=None,
             bins=None, binwidth=None, binrange=None,
             hue_bins=None, hue_binwidth=None, hue_binrange=None,
             stat="mean", errorbar="std",
-            cmin=2
+            cmin=2, workers=None, cache=None
             ):
-        
-        super().__init__(data, x=x, y=y, hue=hue, style=style, size=size)
-        self.group_cols = list(set(["hue", "style", "size"]) & set(self.vars.keys()))
+
+        chunked = is_chunked(data)
+        if chunked:
+            self._vars = plot_vars(x=x, y=y, hue=hue, style=style, size=size)
+            self._data = None
+        else:
+            super().__init__(data, x=x, y=y, hue=hue, style=style, size=size)
+
+        self.group_cols = [c for c in ["hue", "style", "size"] if c in self.vars]
         self.has_errors = False
+        self.hue_bins = None
+
+        cache = get_cache(cache)
+        key = None
+        if cache is not None:
+            key = result_key(self, chunks=data if chunked else None,
+                    bins=bins, binwidth=binwidth, binrange=binrange,
+                    hue_bins=hue_bins, hue_binwidth=hue_binwidth, 
+                    hue_binrange=hue_binrange, stat=stat, errorbar=errorbar,
+                    cmin=cmin, workers=num_workers(workers))
+            result = None if key is None else cache.get(key)
+            if result is not None:
+                self._restore(*result)
+                return
 
         # if hue is binned
-        if ((hue is not None)
+        binned_hue = ((hue is not None)
                 and (hue_bins is not None 
                 or (hue_binrange is not None) 
                 or (hue_binwidth is not None))
-            ):
-            self.bin_hues(hue_bins, hue_binrange, hue_binwidth)
-                
+            )
+
+        if chunked:
+            df = self.make_binned_chunks(data, stat, errorbar, cmin=cmin,
+                    bins=bins, binrange=binrange, binwidth=binwidth,
+                    hue_bins=hue_bins, hue_binrange=hue_binrange, 
+                    hue_binwidth=hue_binwidth, binned_hue=binned_hue,
+                    workers=workers)
+        else:
+            if binned_hue:
+                self.bin_hues(hue_bins, hue_binrange, hue_binwidth)
 
+            self.bins, self.bin_centers = make_bins(
+                    self.column("x"), 
+                    bins=bins, binrange=binrange, binwidth=binwidth)
 
-        self.bins, self.bin_centers = make_bins(
-                self.data["x"], 
-                bins=bins, binrange=binrange, binwidth=binwidth)
+            df = self.make_binned(stat, errorbar, cmin=cmin, workers=workers)
 
-        df = pd.DataFrame()
-        for group in self.groups():
-            df = pd.concat([df, self.make_binned(group, stat, errorbar, cmin=cmin)], 
-                           ignore_index=True)
+        self._replace_data(df)
+        if key is not None:
+            cache.put(key, df, {name: getattr(self, name) 
+                                for name in self._result_attrs})
 
-        self._old_data = self.data
-        self._data = df
+
+    # the attributes computed along with the data, which are cached
+    _result_attrs = ["has_errors", "hue_bins", "bins", "bin_centers"]
+
+    def _restore(self, data, attrs):
+        """
+        Sets the data and attributes to a cached result
+        """
+        for name, value in attrs.items():
+            setattr(self, name, value)
+        self._replace_data(data)
             
 
-    def make_binned(self, df, stat, errorbar, cmin=2):
+    def make_binned(self, stat, errorbar, cmin=2, workers=None):
+        """
+        Bins all groups at once. Each point is given the key
+        group * nbins + bin, so every statistic for every group
+        comes out of a single reduction over the data.
+
+        With workers, the rows are split into one shard per worker 
+        and the accumulators of each shard are merged. The moments
+        merge exactly, but percentiles then come from a QuantileSketch.
+        """
+        nbins = len(self.bin_centers)
+        codes, group_values = self.group_codes()
+        ngroups = len(group_values)
+
+        # invalid rows have a code of -1, so the columns need no filtering
+        x = self.columns["x"]
+        y = self.columns["y"]
+        if workers is None or workers == 1:
+            keys = bin_keys(digitize(x, self.bins), codes, nbins)
+            y_l, y_bin, y_h, counts = binned_stats(keys, y, ngroups*nbins,
+                                                   stat=stat, errorbar=errorbar)
+        else:
+            nshards = num_workers(workers)
+            bounds = np.linspace(0, len(x), nshards + 1).astype(int)
+            shards = [(x[a:b], y[a:b], codes[a:b], self.bins, ngroups*nbins,
+                       needs_percentiles(stat), i)
+                      for i, (a, b) in enumerate(zip(bounds[:-1], bounds[1:]))]
+
+            moments, sketch = merge_accumulators(
+                    imap(bin_accumulators, shards, workers))
+            y_l, y_bin, y_h, counts = sketched_stats(moments.resize(ngroups*nbins),
+                    sketch, stat=stat, errorbar=errorbar)
+
+        return self._binned_frame(y_l, y_bin, y_h, counts, group_values, 
+                                  errorbar, cmin)
+
+
+    def make_binned_chunks(self, chunks, stat, errorbar, cmin=2,
+            bins=None, binrange=None, binwidth=None,
+            hue_bins=None, hue_binrange=None, hue_binwidth=None, 
+            binned_hue=False, workers=None):
+        """
+        Bins chunked data one chunk at a time, merging the
+        accumulators of each chunk into running totals.
+        With workers, chunks are binned in parallel.
+        """
+        scan_cols = []
+        if not _fixed_bins(bins, binrange, binwidth):
+            scan_cols.append("x")
+        if binned_hue and not _fixed_bins(hue_bins, hue_binrange, hue_binwidth):
+            scan_cols.append("hue")
+
+        if len(scan_cols) > 0:
+            if not is_reiterable(chunks):
+                raise ValueError("the bins of an iterator of chunks must be "
+                        "fixed by edges or a binrange, or else pass a list "
+                        "of chunks or a function returning an iterator")
+            ranges, sample, n = _scan_chunks(chunks, self.vars, scan_cols)
+        
+        if binrange is None and "x" in scan_cols:
+            binrange = ranges["x"]
+        self.bins, self.bin_centers = make_bins(
+                sample["x"] if "x" in scan_cols else [], 
+                bins=bins, binrange=binrange, binwidth=binwidth,
+                n=n if "x" in scan_cols else None)
+
+        if binned_hue:
+            if hue_binrange is None and "hue" in scan_cols:
+                hue_binrange = ranges["hue"]
+            self.hue_bins, _ = make_bins(
+                    sample["hue"] if "hue" in scan_cols else [], 
+                    bins=hue_bins, binrange=hue_binrange, binwidth=hue_binwidth,
+                    n=n if "hue" in scan_cols else None)
+
+        nbins = len(self.bin_centers)
+        groups = {}
+        sketch = needs_percentiles(stat)
+
+        def shards():
+            for i, chunk in enumerate(iter_chunks(chunks)):
+                df = PlotData(chunk, **self.vars).data
+                if binned_hue:
+                    df["hue"] = _bin_hue_values(df.hue, self.hue_bins)
+
+                codes = global_codes(df, self.group_cols, groups)
+                yield (df.x.values, df.y.values, codes, self.bins, 
+                       len(groups) * nbins, sketch, i)
+
+        moments, sketch = merge_accumulators(
+                imap(bin_accumulators, shards(), workers))
+        moments = moments.resize(len(groups) * nbins)
+        if sketch is not None:
+            sketch.resize(len(groups) * nbins)
+
+        group_values = group_table(groups, self.group_cols)
+        if binned_hue:
+            group_values["hue"] = pd.Categorical(group_values.hue, 
+                    categories=self.hue_bins[:-1], ordered=True)
+
+        y_l, y_bin, y_h, counts = sketched_stats(moments, sketch, 
+                                                 stat=stat, errorbar=errorbar)
+        data = self._binned_frame(y_l, y_bin, y_h, counts, group_values, 
+                                  errorbar, cmin)
+
+        if len(self.group_cols) > 0:
+            data = data.sort_values(self.group_cols, kind="stable")
+        return data.reset_index(drop=True)
+
+
+    def _binned_frame(self, y_l, y_bin, y_h, counts, group_values, errorbar, cmin):
+        nbins = len(self.bin_centers)
+        ngroups = len(group_values)
+
         data = pd.DataFrame()
-        data["x"] = self.bin_centers
+        data["x"] = np.tile(self.bin_centers, ngroups)
         if errorbar is not None:
-            y_l, y_bin, y_h = _binned_stat_range(df.x, df.y, self.bins, 
-                                               stat=stat, errorbar=errorbar)
             data["y_l"] = y_l
             data["y_h"] = y_h
             self.has_errors = True
-        else:
-            y_bin = _binned_stat(df.x, df.y, self.bins, stat=stat)
 
         data["y"] = y_bin
         for col in self.group_cols:
-            data[col] = _binned_stat(df.x, df[col], self.bins, stat="mode")
-        counts = _binned_stat(df.x, df.y, self.bins, stat="count")
+            data[col] = group_values[col].repeat(nbins).values
         data["counts"] = counts
         filt = counts >= cmin
 
-        return data[filt]
+        return data[filt].reset_index(drop=True)
+
+
+    def group_codes(self):
+        """
+        Returns the group number of each point (-1 if the point
+        is invalid or belongs to no group) and a DataFrame of the group values.
+        """
+        return super().group_codes(self.group_cols)
 
 
     def groups(self):
@@ -73,30 +256,52 @@ class BinnedData(PlotData):
             return [self.data]
 
         gs = []
-        for _, g in self.data.groupby(self.group_cols):
+        for _, g in self.data.groupby(self.group_cols, observed=True):
             if len(g) > 0:
                 gs.append(g)
         return gs
 
 
     def bin_hues(self, bins, binrange, binwidth):
-        hue_bins, hue_centers = make_bins(self.data.hue, bins, binrange, binwidth)
+        hue_bins, hue_centers = make_bins(self.column("hue"), bins, binrange, binwidth)
         self.hue_bins = hue_bins
+        self.columns["hue"] = _bin_hue_values(self.columns["hue"], hue_bins)
+
 
-        cat_filts = [
-                (self.data.hue >= hue_bins[i]) & (self.data.hue < hue_bins[i+1])
-                for i in range(len(hue_centers))
-                ]
 
-        all_filt = cat_filts[0]
+def _bin_hue_values(hue, hue_bins):
+    """
+    Returns the hue bin of each value as an ordered categorical,
+    labelled by the left edge of each bin. Values outside of the 
+    bins are missing.
+    """
+    codes = digitize(hue, hue_bins)
+    return pd.Categorical.from_codes(codes, categories=hue_bins[:-1], ordered=True)
 
-        for cat, filt in zip(hue_bins, cat_filts):
-            self.data.loc[filt, "hue"] = cat
-            all_filt |= filt
 
-        self.data.loc[~all_filt, "hue"] = np.nan
+def _fixed_bins(bins, binrange, binwidth):
+    """
+    Whether the bin edges are determined without looking at the data
+    """
+    if np.ndim(bins) > 0:
+        return True
+    numbins = isinstance(bins, (int, np.integer))
+    return (binrange is not None) and (numbins or (bins is None and binwidth is not None))
 
 
+def _scan_chunks(chunks, vars, cols):
+    """
+    A first pass over chunked data (see :func:`scan`). Returns the 
+    range of each of cols, a sample of at most SAMPLE_SIZE rows of 
+    them (a dict of columns), and the number of rows.
+    """
+    blocks = (tuple(PlotData(chunk, **vars).data[col].to_numpy(dtype=float) 
+                    for col in cols)
+              for chunk in iter_chunks(chunks))
+    scanned = scan(blocks)
+    ranges = {col: (lo, hi) for col, lo, hi in zip(cols, scanned.lo, scanned.hi)}
+    return ranges, dict(zip(cols, scanned.sample)), scanned.n
+
 
 
 
@@ -107,6 +312,7 @@ def binnedplot(data,
                bins=None, binwidth=None, binrange=None,
                hue_bins=None, hue_binwidth=None, hue_binrange=None,
                stat="mean", errorbar="std",
+               workers=None, cache=None,
                # aesthetics
                hue_label=None,
                aes="scatter",
@@ -124,14 +330,29 @@ def binnedplot(data,
     Params
     ------
     data :  :class:`pandas.DataFrame`, :class:`numpy.ndarray`, mapping, or sequence
-        The Input data for the plot.
+        The Input data for the plot. May also be chunked: an iterator 
+        of chunks, a list of chunks (or ``.npy`` paths), or a function
+        returning an iterator, in which case the chunks are streamed
+        (see :class:`BinnedData`).
     x, y :  vectors or keys in ``data``
-    bins : ``int`` or list-like
+    bins : ``int``, list-like, or the name of a rule (see :func:`make_bins`)
     binwidth
     binrange
     stat
     errorbar: 
         statistic for errorbars
+    workers : ``int`` or :class:`concurrent.futures.Executor`
+        bins shards of the data (or chunks) in parallel, in this many
+        threads or with the given executor. Percentiles are then
+        estimated with a sketch.
+    cache : ``bool``, path, or :class:`ResultCache`
+        if set, the binned statistics are memoized, so re-plotting
+        the same data with the same binning skips the binning. True
+        uses a shared in-memory cache, and a path a cache on disk.
+    aes : ``str``
+        "scatter", "line", or "density", which draws the points as an
+        image of their density in each pixel (see :func:`densityplot`),
+        e.g. for a rolling stat of many points. Errors are not drawn.
 
 
     kwargs
@@ -145,7 +366,7 @@ def binnedplot(data,
                 hue_bins=hue_bins, hue_binwidth=hue_binwidth, 
                 hue_binrange=hue_binrange,
                 stat=stat, errorbar=errorbar,
-                cmin=cmin
+                cmin=cmin, workers=workers, cache=cache
                 )
 
     if hue is not None:
@@ -159,16 +380,20 @@ def binnedplot(data,
             hue_label, legend)
 
 
-    kwargs["has_errors"] = dat.has_errors
+    groups = dat.groups()
     if has_cb:
-        for group in dat.groups():
-            color = cb(np.mean(group.hue)) # TODO
-            plot_err(group, color=color, aes=aes, err_kwargs=err_kwargs, **kwargs)
+        if dat.hue_bins is not None:
+            colors = cb.map.bin_color(np.array([group.hue.cat.codes.iloc[0] 
+                                                for group in groups]))
+        else:
+            colors = cb(np.array([np.mean(group.hue) for group in groups])) # TODO
     else:
-        for group in dat.groups():
-            if color is None:
-                color = next(plt.gca()._get_lines.prop_cycler)["color"]
-            plot_err(group, color=color, aes=aes, err_kwargs=err_kwargs, **kwargs)
+        if color is None:
+            color = next(plt.gca()._get_lines.prop_cycler)["color"]
+        colors = [color] * len(groups)
+
+    plot_groups(groups, colors, has_errors=dat.has_errors, aes=aes, 
+                err_kwargs=err_kwargs, **kwargs)
 
 
     if has_cb or not legend:
@@ -179,6 +404,68 @@ def binnedplot(data,
 
 
 
+def plot_groups(groups, colors, has_errors=False, aes="scatter", 
+                err_kwargs={}, **kwargs):
+    """
+    Draws each group (a DataFrame of x, y, and y_l and y_h if has_errors)
+    in its colour, as :func:`plot_err` does, but with one artist per 
+    layer for all the groups: a scatter of the centres and one of the
+    error ends, or a LineCollection of the lines and a PolyCollection 
+    of the error bands. The draw time then does not grow with the
+    number of groups. Lines given keywords a LineCollection does not
+    take (e.g. marker) are drawn one per group.
+    """
+    if len(groups) == 0:
+        return
+    if aes == "line" and "c" in kwargs:
+        # as for plt.plot, c is the colour of every line
+        colors = [kwargs.pop("c")] * len(groups)
+    # Line2D-only keywords (e.g. marker, drawstyle) need a line per group
+    per_group = aes == "line" and not all(
+            hasattr(mpl.collections.LineCollection, f"set_{key}") for key in kwargs)
+    if aes == "density" or per_group:
+        for group, color in zip(groups, colors):
+            plot_err(group, has_errors=has_errors, color=color, aes=aes, 
+                     err_kwargs=err_kwargs, **kwargs)
+        return
+
+    ax = plt.gca()
+    colors = mpl.colors.to_rgba_array(colors)
+    x = [group["x"].values for group in groups]
+    y = [group["y"].values for group in groups]
+
+    if aes == "scatter":
+        point_colors = np.repeat(colors, [len(g) for g in x], axis=0)
+        ax.scatter(np.concatenate(x), np.concatenate(y), color=point_colors, 
+                   **kwargs)
+
+        if has_errors:
+            # the lower and upper ends of each group, in one scatter
+            ends = [np.concatenate([g["y_l"].values, g["y_h"].values]) 
+                    for g in groups]
+            ax.scatter(np.concatenate([np.tile(xs, 2) for xs in x]), 
+                       np.concatenate(ends), marker="_",
+                       color=np.repeat(colors, [len(e) for e in ends], axis=0),
+                       **err_kwargs)
+        return
+
+    lines = mpl.collections.LineCollection(
+            [np.column_stack([xs, ys]) for xs, ys in zip(x, y)],
+            colors=colors, **kwargs)
+    ax.add_collection(lines)
+
+    if has_errors:
+        bands = []
+        for xs, group in zip(x, groups):
+            lo, hi = group["y_l"].values, group["y_h"].values
+            ok = np.isfinite(xs) & np.isfinite(lo) & np.isfinite(hi)
+            bands.append(np.concatenate([np.column_stack([xs[ok], lo[ok]]),
+                                         np.column_stack([xs[ok], hi[ok]])[::-1]]))
+        ax.add_collection(mpl.collections.PolyCollection(
+                bands, facecolors=colors, edgecolors="none", **err_kwargs))
+    ax.autoscale_view()
+
+
 def plot_err(data, has_errors=False,
              color=None, aes="scatter", err_kwargs={}, **kwargs):
     if aes == "scatter":
@@ -191,6 +478,11 @@ def plot_err(data, has_errors=False,
             plt.scatter(data["x"], data["y_h"], marker=marker,
                     color=color, **err_kwargs)
 
+    elif aes == "density":
+        # the points as an image of their density in each pixel
+        cmap = None if color is None else fade_cmap(color)
+        densityplot(data["x"], data["y"], cmap=cmap, **kwargs)
+
     else:
         plt.plot(data["x"], data["y"], color=color, **kwargs)
 
@@ -205,10 +497,10 @@ def create_cb(dat, hue, hue_bins, hue_binrange, hue_binwidth, hue_label, legend)
         if binned_hue:
             if hue_binrange is None:
                 hue_binrange = (min(dat.data.hue), max(dat.data.hue))
-            cb = Colorbar(hue_binrange, norm=dat.hue_bins,
+            cb = Colorbar(clim=hue_binrange, norm=dat.hue_bins,
                           label=hue_label, create=legend)
         else: 
-            cb = Colorbar((min(dat.data.hue), max(dat.data.hue)), label=hue_label,
+            cb = Colorbar(clim=(min(dat.data.hue), max(dat.data.hue)), label=hue_label,
                           create=legend)
         seq_hue = True
     else:
@@ -220,86 +512,90 @@ def create_cb(dat, hue, hue_bins, hue_binrange, hue_binwidth, hue_label, legend)
 
 
 
-def make_bins(x_dat, bins=None, binrange=None, binwidth=None):
+def make_bins(x_dat, bins=None, binrange=None, binwidth=None, n=None):
+    """
+    Returns the bin edges and centres for the data x_dat, which may
+    be a sample of n points (e.g. from :func:`scan`).
+
+    bins may be a number of bins, a list of edges, or one of the rules
+    "auto", "freedman", "scott", "knuth" or "blocks" (Bayesian Blocks).
+    If neither bins nor binwidth is given, the "auto" rule is used, which
+    picks Knuth's rule if there are at most BINS_SAMPLE_SIZE points and 
+    the Freedman-Diaconis rule otherwise. All rules are evaluated on a
+    subsample of at most BINS_SAMPLE_SIZE points, so the cost of
+    finding the edges does not grow with the size of the data.
+    """
+    if np.ndim(bins) > 0:
+        bins = np.asarray(bins)
+        return bins, (bins[1:] + bins[:-1])/2
+
+    x_dat = np.asarray(x_dat)
     if binrange is None:
-        binrange = (min(x_dat), max(x_dat))
+        binrange = (np.nanmin(x_dat), np.nanmax(x_dat))
 
     if bins is None:
         if binwidth is None:
-            _, bins = astropy.stats.histogram(x_dat, range=binrange, bins="blocks")
+            bins = "auto"
         else:
             bins = np.arange(binrange[0], binrange[1], binwidth)
 
-    elif isinstance(bins, int):
+    if isinstance(bins, str):
+        bins = _rule_bins(x_dat, bins, binrange, len(x_dat) if n is None else n)
+    elif isinstance(bins, (int, np.integer)):
         bins = np.linspace(binrange[0], binrange[1], bins)
 
+    bins = np.asarray(bins)
     bin_centers = (bins[1:] + bins[:-1])/2
 
     return bins, bin_centers
 
 
-def _binned_stat(x, y, bins, stat="count", percentile=None):
-    """
-    Calculates statistics for the vecors x, y over the given bins. 
-    """
-    if percentile is not None:
-        return binned_statistic(x, y,
-                    statistic=lambda a: np.percentile(a, percentile), bins=bins)[0]
-
-    if stat == "count":
-        return binned_statistic(x, y, bins=bins, statistic="count")[0]
-    elif stat == "mean":
-        return binned_statistic(x, y, bins=bins, statistic="mean")[0]
-    elif stat == "median":
-        return binned_statistic(x, y, bins=bins, statistic="median")[0]
-    elif stat == "std":
-        return binned_statistic(x, y, bins=bins, statistic="std")[0]
-    elif stat == "count":
-        return binned_statistic(x, y, bins=bins, statistic="count")[0]
-    elif stat == "mode":
-        return binned_statistic(x, y, bins=bins, 
-                                statistic=lambda a: max(set(a), key=list(a).count))[0]
+def _rule_bins(x_dat, rule, binrange, n):
+    sample = _bin_sample(x_dat)
+    in_range = sample[(sample >= binrange[0]) & (sample <= binrange[1])]
+    if len(sample) == 0 or len(in_range) == 0:
+        return np.array(binrange, dtype=float)
 
+    # estimated number of points in range in the full data
+    N = n * len(in_range) / len(sample)
 
+    if rule == "auto":
+        if N <= BINS_SAMPLE_SIZE:
+            rule = "knuth"
+        else:
+            rule = "freedman"
+
+    if rule in ("knuth", "blocks"):
+        import astropy.stats
+        return astropy.stats.calculate_bin_edges(in_range, rule, range=binrange)
+
+    if rule == "freedman":
+        width = freedman_bin_width(in_range, N=N)
+        if not width > 0:
+            rule = "scott"
+    if rule == "scott":
+        width = scotts_bin_width(in_range, N=N)
+    elif rule != "freedman":
+        raise ValueError(f"unknown bin rule {rule}")
+
+    if width > 0:
+        numbins = int(np.ceil((binrange[1] - binrange[0]) / width))
+        numbins = min(max(numbins, 1), MAX_AUTO_BINS)
+    else:
+        numbins = 1
 
-    raise NotImplementedError
+    return np.linspace(binrange[0], binrange[1], numbins + 1)
 
 
-def _binned_stat_range(x, y, bins, stat="count", errorbar="std"):
+def _bin_sample(x_dat):
     """
-    Calculates statistics for the vecors x, y over the given bins. 
-    Returns xl, xc, xh, where xl and xh are the lower and upper
-    values based on the errorbar setting.
+    Returns the finite values of a (seeded) random subsample
+    of at most BINS_SAMPLE_SIZE points of x_dat
     """
-    if stat == "count":
-        x_c = _binned_stat(x, y, bins=bins, stat="count")
-        if errorbar == "std":
-            e = np.sqrt(x_c)
-            x_l = x_c - e
-            x_h = x_c + e
-            return x_l, x_c, x_h
-
-    elif stat == "mean":
-        x_c = _binned_stat(x, y, bins=bins, stat="mean")
-        if errorbar == "std":
-            e = _binned_stat(x, y, bins=bins, stat="std")
-            x_l = x_c - e
-            x_h = x_c + e
-            return x_l, x_c, x_h
-        elif errorbar == "sterr":
-            e = _binned_stat(x, y, bins=bins, stat="std")
-            c = _binned_stat(x, y, bins=bins, stat="count")
-            e /= np.sqrt(c)
-            x_l = x_c - e
-            x_h = x_c + e
-            return x_l, x_c, x_h
-
-    elif stat == "median":
-        x_c = _binned_stat(x, y, bins=bins, stat="median")
-        if errorbar == "pi":
-            x_l = _binned_stat(x, y, bins=bins, percentile=16)
-            x_h = _binned_stat(x, y, bins=bins, percentile=84)
-            return x_l, x_c, x_h
-
-    raise NotImplementedError
+    if len(x_dat) > BINS_SAMPLE_SIZE:
+        rng = np.random.default_rng(0)
+        idx = rng.choice(len(x_dat), BINS_SAMPLE_SIZE, replace=False)
+        x_dat = x_dat[np.sort(idx)]
+
+    return x_dat[np.isfinite(x_dat)]
 
@@ -0,0 +1,232 @@
+import abc
+
+import matplotlib as mpl
+import matplotlib.image
+import numpy as np
+
+from ._plot_data import PlotData
+from ._binning import imap
+from .histogram import _key_2d, BLOCK_SIZE, MAX_BLOCK_SIZE
+from .._lazy import LazyModule
+
+
+plt = LazyModule("matplotlib.pyplot")
+
+
+
+class ViewImage(mpl.image.AxesImage, metaclass=abc.ABCMeta):
+    """
+    An image of the current view of the axes, recomputed by
+    :meth:`rebin` only when the axis limits or the size of the axes
+    change (e.g. on zooming, or saving at another dpi).
+    Otherwise the last image is drawn as is. Subclasses implement
+    :meth:`rebin`.
+    """
+
+    def __init__(self, ax, pixel_size=1, norm=None, vmin=None, vmax=None, 
+                 **kwargs):
+        kwargs.setdefault("origin", "lower")
+        kwargs.setdefault("interpolation", "nearest")
+        super().__init__(ax, norm=norm, **kwargs)
+        self.set_clim(vmin, vmax)
+
+        self.pixel_size = pixel_size
+        self._view = None
+
+        ax.callbacks.connect("xlim_changed", self._limits_changed)
+        ax.callbacks.connect("ylim_changed", self._limits_changed)
+
+
+    def _limits_changed(self, ax):
+        self.stale = True
+
+
+    def view(self):
+        """
+        The current limits and the size of the grid in image pixels
+        """
+        ax = self.axes
+        nx = max(int(ax.bbox.width / self.pixel_size), 1)
+        ny = max(int(ax.bbox.height / self.pixel_size), 1)
+        return (tuple(sorted(ax.get_xlim())), tuple(sorted(ax.get_ylim())), nx, ny)
+
+
+    @abc.abstractmethod
+    def rebin(self, xlim, ylim, nx, ny):
+        """
+        Returns the image (indexed by x, then y) of the view with the
+        given limits and size in pixels, and its extent
+        """
+
+
+    def update_image(self):
+        """
+        Recomputes the image for the current view, if it has changed
+        """
+        view = self.view()
+        if view == self._view:
+            return
+
+        image, extent = self.rebin(*view)
+        self._view = view
+        self._extent = extent
+        self.set_data(image.T)
+
+
+    def draw(self, renderer, *args, **kwargs):
+        self.update_image()
+        super().draw(renderer, *args, **kwargs)
+
+
+
+class DensityImage(ViewImage):
+    """
+    A scatter of x and y drawn as a single image: the number of points
+    (or, with c, their mean c) in each pixel of the axes.
+
+    The points are only re-binned when the axis limits or the size of
+    the axes change (see :class:`ViewImage`), so drawing otherwise 
+    takes the same time for any number of them.
+    Only linear axes are supported.
+
+    Params
+    ------
+    ax : :class:`matplotlib.axes.Axes`
+    x, y : arrays (which may be memory mapped)
+    c : array
+        if given, the mean of c is drawn rather than the counts
+    pixel_size : ``float``
+        the size of an image pixel, in screen pixels
+    workers : ``int`` or :class:`concurrent.futures.Executor`
+        bins blocks of the points in parallel (see :func:`imap`)
+    kwargs
+        passed to :class:`matplotlib.image.AxesImage` (e.g. cmap,
+        norm, vmin, vmax, alpha). The norm defaults to log for counts.
+    """
+
+    def __init__(self, ax, x, y, c=None, pixel_size=1, workers=None,
+                 norm=None, **kwargs):
+        if norm is None and c is None:
+            norm = "log"
+        super().__init__(ax, pixel_size=pixel_size, norm=norm, **kwargs)
+
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.c = None if c is None else np.asarray(c)
+        self.workers = workers
+
+
+    def rebin(self, xlim, ylim, nx, ny):
+        (x0, x1), (y0, y1) = xlim, ylim
+        xedges = np.linspace(x0, x1, nx + 1)
+        yedges = np.linspace(y0, y1, ny + 1)
+        counts, sums = pixel_sums(self.x, self.y, xedges, yedges,
+                                  self.c, self.workers)
+
+        if self.c is None:
+            image = np.ma.masked_equal(counts, 0)
+        else:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                image = np.ma.masked_invalid(sums / counts)
+        return image, (x0, x1, y0, y1)
+
+
+
+def pixel_sums(x, y, xedges, yedges, c=None, workers=None):
+    """
+    Returns the number of (x, y) in each bin of the uniform edges
+    xedges by yedges, and, if c is given, the sum of c in each
+    bin (else None). Points with a non-finite c are ignored.
+    x, y, and c are read one block at a time.
+    """
+    nx = len(xedges) - 1
+    ny = len(yedges) - 1
+    size = nx * ny
+    block = min(max(BLOCK_SIZE, 4 * size), MAX_BLOCK_SIZE)
+
+    counts = np.zeros(size, dtype=int)
+    sums = None if c is None else np.zeros(size)
+    blocks = ((x[start:start + block], y[start:start + block],
+               None if c is None else c[start:start + block], xedges, yedges)
+              for start in range(0, len(x), block))
+    for n, s in imap(_pixel_sums_block, blocks, workers):
+        counts += n
+        if s is not None:
+            sums += s
+
+    return counts.reshape(nx, ny), (None if sums is None else sums.reshape(nx, ny))
+
+
+def _pixel_sums_block(x, y, c, xedges, yedges):
+    """
+    The counts and sums of a block of pixel_sums (at module level,
+    so that it can be sent to other processes)
+    """
+    size = (len(xedges) - 1) * (len(yedges) - 1)
+    key = _key_2d(x, y, xedges, yedges, (True, True))
+    if c is None:
+        return np.bincount(key, minlength=size+1)[:size], None
+
+    w = np.asarray(c, dtype=float)
+    key[~np.isfinite(w)] = size
+    w = np.where(key < size, w, 0)
+    return (np.bincount(key, minlength=size+1)[:size],
+            np.bincount(key, weights=w, minlength=size+1)[:size])
+
+
+def densityplot(x, y=None, hue=None, data=None, ax=None,
+                pixel_size=1, workers=None, **kwargs):
+    """
+    A scatter plot of x and y drawn as an image of the number of points
+    in each pixel, or the mean of hue if given, with the arya colormap
+    by default. The image is re-binned whenever the axes are zoomed
+    or resized, and drawn in a time independent of the number of points
+    (see :class:`DensityImage`). Returns the :class:`DensityImage`.
+
+    If data is given (anything :class:`PlotData` accepts), x, y, and
+    hue are columns of data.
+    """
+    if ax is None:
+        ax = plt.gca()
+
+    if data is not None:
+        dat = PlotData(data, x=x, y=y, hue=hue)
+        x = dat.columns["x"]
+        y = dat.columns["y"]
+        hue = dat.columns.get("hue")
+
+    im = DensityImage(ax, x, y, c=hue, pixel_size=pixel_size,
+                      workers=workers, **kwargs)
+    ax.add_image(im)
+
+    # the data limits, for autoscaling
+    x0, x1 = _finite_range(im.x)
+    y0, y1 = _finite_range(im.y)
+    ax.update_datalim([(x0, y0), (x1, y1)])
+    ax.autoscale_view()
+
+    im.update_image()
+    return im
+
+
+def fade_cmap(color):
+    """
+    A colormap from faint to solid color, for drawing the density
+    of one group of points over others
+    """
+    r, g, b = mpl.colors.to_rgb(color)
+    return mpl.colors.LinearSegmentedColormap.from_list(
+            "fade", [(r, g, b, 0.1), (r, g, b, 1)])
+
+
+def _finite_range(x):
+    lo, hi = np.inf, -np.inf
+    for start in range(0, len(x), MAX_BLOCK_SIZE):
+        block = x[start:start + MAX_BLOCK_SIZE]
+        block = block[np.isfinite(block)]
+        if len(block):
+            lo = min(lo, np.min(block))
+            hi = max(hi, np.max(block))
+    if lo > hi:
+        raise ValueError("there are no finite values to plot")
+    return lo, hi
@@ -1,25 +1,578 @@
 import numpy as np
-import matplotlib.pyplot as plt
 
+from ._plot_data import PlotData, is_chunked, is_reiterable, iter_chunks
+from ._binning import imap, scan
+from .._lazy import LazyModule
 
 
-def scotts_bin_width(x):
+plt = LazyModule("matplotlib.pyplot")
+
+
+
+def scotts_bin_width(x, N=None):
     f = np.isfinite(x)
-    N = len(x)
-    return 3.49 * np.std(x[f]) / np.cbrt(N)
+    if N is None:
+        N = len(x)
+    return _scotts_width(x[f], N)
 
-def scotts_bins(x):
+def _scotts_width(finite, N):
+    return 3.49 * np.std(finite) / np.cbrt(N)
+
+def scotts_bandwidth(x, N=None):
+    """
+    The standard deviation of a Gaussian kernel for x by Scott's rule,
+    that of x times N**(-1/5)
+    """
+    x = np.asarray(x)
     f = np.isfinite(x)
-    return np.arange(np.min(x[f]), np.nanmax(x[f]), scotts_bin_width(x))
+    if N is None:
+        N = len(x)
+    return np.sqrt(_scotts_cov([x[f]], N)[0, 0])
 
-def hist(x, bins=None, **kwargs):
-    if bins is None:
-        bins = scotts_bins(x)
-    plt.hist(x, bins=bins, **kwargs)
+def _scotts_cov(sample, N):
+    """
+    The covariance of a Gaussian kernel by Scott's rule for N points
+    in d dimensions, that of the sample (a list of d columns) times
+    N**(-2/(d+4))
+    """
+    d = len(sample)
+    return np.atleast_2d(np.cov(np.vstack(sample))) * N**(-2 / (d + 4))
+
+def freedman_bin_width(x, N=None):
+    f = np.isfinite(x)
+    if N is None:
+        N = len(x)
+    q25, q75 = np.percentile(x[f], [25, 75])
+    return 2 * (q75 - q25) / np.cbrt(N)
+
+def scotts_bins(x):
+    """
+    Uniform bins of width by Scott's rule, covering the finite values of x.
+    The width is estimated from a sample of at most SAMPLE_SIZE values.
+    """
+    x = np.asarray(x)
+    edges, = _make_edges([None], [None], lambda: _array_blocks(x))
+    return edges
+
+
+def uniform_edges(lo, hi, width):
+    """
+    Edges of uniform bins of (about) the given width from lo to hi
+    """
+    if not width > 0 or hi <= lo:
+        return np.array([lo - 0.5, hi + 0.5])
+    nbins = max(int(np.ceil((hi - lo) / width)), 1)
+    return np.linspace(lo, hi, nbins + 1)
+
+
+# the number of values binned at once, small enough that
+# the temporary arrays stay in cache
+BLOCK_SIZE = 2**16
+
+# the most values binned at once (for large grids), and the number 
+# of rows read at once when scanning arrays for their range
+MAX_BLOCK_SIZE = 2**20
+
+# options of plt.hist which Histogram.plot leaves to plt.hist
+HIST_ONLY_KWARGS = ("align", "rwidth", "bottom", "stacked")
+
+
+def is_uniform(edges):
+    widths = np.diff(edges)
+    return len(widths) > 0 and np.allclose(widths, widths[0], rtol=1e-10, atol=0)
+
+
+def bin_counts(cols, edges, counts, weights=None, workers=None):
+    """
+    Adds the counts of the values cols (a tuple of 1 or 2 columns) in
+    the bins edges (one per column) to the flat array counts, in the
+    order of :func:`_key_2d`, one block at a time.
+
+    With workers, the blocks are counted in that many threads (or an 
+    Executor, see :func:`imap`) into private arrays. These are added
+    in order, so the result is identical to the serial one.
+    """
+    n = len(cols[0])
+    size = len(counts)
+    uniform = tuple(is_uniform(e) for e in edges)
+    # each bincount allocates the whole grid, so large grids
+    # are binned in larger blocks
+    block = min(max(BLOCK_SIZE, 4 * size), MAX_BLOCK_SIZE)
+
+    blocks = (([col[start:start + block] for col in cols], edges, uniform,
+               None if weights is None else weights[start:start + block], size)
+              for start in range(0, n, block))
+    for part in imap(_count_block, blocks, workers):
+        counts += part
+    return counts
+
+
+def _count_block(cols, edges, uniform, weights, size):
+    """
+    The counts of a block of bin_counts (at module level, so that
+    it can be sent to other processes)
+    """
+    if len(cols) == 1:
+        idx = bin_index(cols[0], edges[0], uniform[0])
+    else:
+        idx = _key_2d(*cols, *edges, uniform)
+    return np.bincount(idx, weights=weights, minlength=size+1)[:size]
+
+
+def bin_index(x, edges, uniform=None):
+    """
+    Returns the bin of each value of x, following ``np.histogram``:
+    bins are half open, [a, b), except for the last. Values outside
+    the edges (or not finite) are given the index nbins, so the
+    counts are ``np.bincount(idx, minlength=nbins+1)[:nbins]``.
+
+    For uniform edges, the index is computed directly as
+    (x - lo) / width rather than by a search.
+    uniform may be passed if already known.
+    """
+    x = np.asarray(x)
+    edges = np.asarray(edges, dtype=float)
+    nbins = len(edges) - 1
+    lo, hi = edges[0], edges[-1]
+
+    outside = ~((x >= lo) & (x <= hi))
+
+    if uniform is None:
+        uniform = is_uniform(edges)
+
+    if uniform:
+        f = (x - lo) * (nbins / (hi - lo))
+        f[outside] = 0
+        idx = f.astype(np.intp)
+        del f
+        np.minimum(idx, nbins - 1, out=idx)
+
+        # the arithmetic may round across an edge, so check the
+        # neighbours as np.histogram does
+        idx -= x < edges[idx]
+        idx += (x >= edges[idx + 1]) & (idx < nbins - 1)
+    else:
+        idx = np.searchsorted(edges, x, side="right")
+        idx -= 1
+        idx[x == hi] = nbins - 1
+
+    idx[outside] = nbins
+    return idx
+
+
+
+class Histogram:
+    """
+    The counts of x in bins with the given edges.
+
+    A Histogram may be drawn any number of times with different
+    styles (see :meth:`plot`) without re-binning the data, or
+    merged with the histogram of more data.
+    """
+
+    def __init__(self, counts, edges):
+        self.counts = counts
+        self.edges = edges
+
+
+    @classmethod
+    def empty(cls, edges, dtype=int):
+        edges = np.asarray(edges, dtype=float)
+        return cls(np.zeros(len(edges) - 1, dtype=dtype), edges)
+
+
+    @classmethod
+    def from_values(cls, x, bins=None, range=None, weights=None, workers=None):
+        """
+        Bins x into bins, which may be edges, a number of uniform bins,
+        a rule of ``np.histogram_bin_edges`` (e.g. "auto" or "fd"), or 
+        None for bins by Scott's rule, over range (by default, the
+        range of the finite values of x). With workers, blocks of x are
+        binned in parallel threads or processes (see :func:`bin_counts`).
+
+        x may be memory mapped: it is read one block at a time, and the
+        bin width is estimated from a sample of at most SAMPLE_SIZE.
+        """
+        x = np.asarray(x)
+        edges, = _make_edges([bins], [range], lambda: _array_blocks(x))
+        return cls.empty(edges).add(x, weights, workers=workers)
+
+
+    @classmethod
+    def from_chunks(cls, chunks, x, bins=None, range=None, weights=None, 
+                    workers=None):
+        """
+        Bins the column x of chunked data (see :func:`is_chunked`), 
+        one chunk at a time, weighted by the column weights if given. 
+        Unless the bins are fixed (by edges, or a number and a range), 
+        the chunks are first scanned for the range and a sample, so must
+        be a list or a function returning an iterator.
+        """
+        blocks = lambda: _chunk_blocks(chunks, x=x)
+        edges, = _make_edges([bins], [range], blocks, is_reiterable(chunks))
+
+        h = cls.empty(edges)
+        for x_block, w_block in _chunk_blocks(chunks, x=x, weights=weights):
+            h.add(x_block, w_block, workers=workers)
+        return h
+
+
+    def add(self, x, weights=None, workers=None):
+        """
+        Adds the counts of more values x in place, and returns self
+        """
+        if weights is not None:
+            self.counts = self.counts.astype(float, copy=False)
+        bin_counts((x,), (self.edges,), self.counts, weights, workers)
+        return self
+
+
+    @property
+    def centers(self):
+        return (self.edges[1:] + self.edges[:-1]) / 2
+
+    @property
+    def widths(self):
+        return np.diff(self.edges)
+
+    @property
+    def density(self):
+        """
+        The counts normalized to integrate to one
+        """
+        return self.counts / self.widths / np.sum(self.counts)
+
+
+    def merge(self, other):
+        """
+        Returns the histogram of both samples (which must have the same bins)
+        """
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("histograms must have the same bins to be merged")
+        return Histogram(self.counts + other.counts, self.edges)
+
+
+    def plot(self, ax=None, density=False, histtype="bar", cumulative=False,
+             log=False, **kwargs):
+        """
+        Draws the histogram as steps. histtype may be "bar" or
+        "stepfilled" (filled), or "step" (an outline), and density,
+        cumulative, log, and orientation are as in ``plt.hist``.
+        Other options of ``plt.hist`` (e.g. rwidth, bottom, or
+        histtype="barstacked") are drawn by ``plt.hist`` itself,
+        weighting the bin centers by the counts.
+        """
+        if ax is None:
+            ax = plt.gca()
+
+        if (histtype not in ("bar", "stepfilled", "step") 
+                or any(k in kwargs for k in HIST_ONLY_KWARGS)):
+            return ax.hist(self.centers, bins=self.edges, weights=self.counts,
+                           density=density, histtype=histtype, 
+                           cumulative=cumulative, log=log, **kwargs)
+
+        values = self.density if density else self.counts
+        if cumulative:
+            if density:
+                values = values * self.widths
+            if cumulative < 0:
+                values = np.cumsum(values[::-1])[::-1]
+            else:
+                values = np.cumsum(values)
+
+        kwargs.setdefault("fill", histtype != "step")
+        steps = ax.stairs(values, self.edges, **kwargs)
+        if log:
+            if kwargs.get("orientation") == "horizontal":
+                ax.set_xscale("log", nonpositive="clip")
+            else:
+                ax.set_yscale("log", nonpositive="clip")
+        return steps
+
+
+
+class Histogram2D:
+    """
+    The counts of (x, y) in the bins with edges xedges by yedges.
+    counts has shape (len(xedges) - 1, len(yedges) - 1).
+    """
+
+    def __init__(self, counts, xedges, yedges):
+        self.counts = counts
+        self.xedges = xedges
+        self.yedges = yedges
+
+
+    @classmethod
+    def empty(cls, xedges, yedges, dtype=int):
+        xedges = np.asarray(xedges, dtype=float)
+        yedges = np.asarray(yedges, dtype=float)
+        return cls(np.zeros((len(xedges) - 1, len(yedges) - 1), dtype=dtype), 
+                   xedges, yedges)
+
+
+    @classmethod
+    def from_values(cls, x, y, bins=None, range=None, weights=None, workers=None):
+        """
+        Bins x and y, where bins may be given for both or as a pair
+        (see :meth:`Histogram.from_values`), and range is a pair of
+        ranges. x and y may be memory mapped.
+        """
+        x = np.asarray(x)
+        y = np.asarray(y)
+        edges = _make_edges(_axis_bins(bins), _axis_ranges(range), 
+                            lambda: _array_blocks(x, y))
+        return cls.empty(*edges).add(x, y, weights, workers=workers)
+
+
+    @classmethod
+    def from_chunks(cls, chunks, x, y, bins=None, range=None, weights=None,
+                    workers=None):
+        """
+        Bins the columns x and y of chunked data one chunk at a time,
+        weighted by the column weights if given
+        (see :meth:`Histogram.from_chunks`).
+        """
+        blocks = lambda: _chunk_blocks(chunks, x=x, y=y)
+        edges = _make_edges(_axis_bins(bins), _axis_ranges(range), blocks,
+                            is_reiterable(chunks))
+
+        h = cls.empty(*edges)
+        for x_block, y_block, w_block in _chunk_blocks(chunks, x=x, y=y, 
+                                                       weights=weights):
+            h.add(x_block, y_block, w_block, workers=workers)
+        return h
+
+
+    def add(self, x, y, weights=None, workers=None):
+        """
+        Adds the counts of more values x, y in place, and returns self
+        """
+        if weights is not None:
+            self.counts = self.counts.astype(float, copy=False)
+        self.counts = np.ascontiguousarray(self.counts)
+        # counts is contiguous, so its flat view is filled in place
+        bin_counts((x, y), (self.xedges, self.yedges), self.counts.reshape(-1),
+                   weights, workers)
+        return self
+
+
+    def merge(self, other):
+        """
+        Returns the histogram of both samples (which must have the same bins)
+        """
+        if not (np.array_equal(self.xedges, other.xedges)
+                and np.array_equal(self.yedges, other.yedges)):
+            raise ValueError("histograms must have the same bins to be merged")
+        return Histogram2D(self.counts + other.counts, self.xedges, self.yedges)
+
+
+    def plot(self, ax=None, norm="log", density=False, cmin=None, cmax=None,
+             **kwargs):
+        """
+        Draws the counts as a pcolormesh (empty bins are blank with
+        the default log norm). density, cmin, and cmax are as in
+        ``plt.hist2d``: bins below cmin or above cmax are blank.
+        """
+        if ax is None:
+            ax = plt.gca()
+
+        counts = self.counts
+        if density:
+            areas = np.outer(np.diff(self.xedges), np.diff(self.yedges))
+            counts = counts / areas / np.sum(counts)
+        if cmin is not None or cmax is not None:
+            blank = np.zeros(counts.shape, dtype=bool)
+            if cmin is not None:
+                blank |= counts < cmin
+            if cmax is not None:
+                blank |= counts > cmax
+            counts = np.ma.masked_where(blank, counts)
+
+        return ax.pcolormesh(self.xedges, self.yedges, counts.T,
+                             norm=norm, **kwargs)
+
+
+
+def _key_2d(x, y, xedges, yedges, uniform=(None, None)):
+    """
+    The flat bin index ix * ny + iy of each (x, y), with nx * ny
+    for values outside the bins
+    """
+    nx = len(xedges) - 1
+    ny = len(yedges) - 1
+    key = bin_index(x, xedges, uniform[0])
+    iy = bin_index(y, yedges, uniform[1])
+    outside = (key == nx) | (iy == ny)
+    key *= ny
+    key += iy
+    key[outside] = nx * ny
+    return key
+
+
+def _make_edges(bins, ranges, blocks, reiterable=True):
+    """
+    Returns the edges for each axis, given its bins and range. If any
+    are not fixed, the data (an iterable of tuples of columns
+    from blocks()) are first scanned for their range and a sample.
+    """
+    scanned = None
+    if any(_needs_scan(b, r) for b, r in zip(bins, ranges)):
+        if not reiterable:
+            raise ValueError("the bins of an iterator of chunks must be "
+                    "fixed by edges or a number of bins and a range, or else "
+                    "pass a list of chunks or a function returning an iterator")
+        scanned = scan(blocks())
+
+    return [_axis_edges(b, r, scanned, i) 
+            for i, (b, r) in enumerate(zip(bins, ranges))]
+
+
+def _needs_scan(bins, range):
+    return (isinstance(bins, str) 
+            or (np.ndim(bins) == 0 and (bins is None or range is None)))
+
+
+def _axis_edges(bins, range, scanned, axis):
+    if isinstance(bins, str):
+        # a rule of np.histogram_bin_edges, applied to the sample
+        # (exact if the sample holds every value)
+        if range is None:
+            range = (scanned.lo[axis], scanned.hi[axis])
+        return np.histogram_bin_edges(scanned.sample[axis], bins, range=range)
+
+    if np.ndim(bins) > 0:
+        return np.asarray(bins, dtype=float)
+
+    if range is None:
+        lo, hi = scanned.lo[axis], scanned.hi[axis]
+    else:
+        lo, hi = range
 
-def hist2d(x, y, bins=None, **kwargs):
     if bins is None:
-        xbins = scotts_bins(x)
-        ybins = scotts_bins(y)
-        
-    plt.hist2d(x, y, norm="log", bins=(xbins, ybins), **kwargs)
+        return uniform_edges(lo, hi, _scotts_width(scanned.sample[axis], scanned.n))
+
+    if hi <= lo:
+        lo, hi = lo - 0.5, hi + 0.5
+    return np.linspace(lo, hi, bins + 1)
+
+
+def _array_blocks(*cols):
+    n = len(cols[0])
+    for start in range(0, n, MAX_BLOCK_SIZE):
+        yield tuple(col[start:start + MAX_BLOCK_SIZE] for col in cols)
+
+
+def _chunk_blocks(chunks, **vars):
+    """
+    The columns vars (e.g. x, y, weights) of each chunk, in order,
+    with None for a var which is None
+    """
+    given = [name for name, var in vars.items() if var is not None]
+    # PlotData reads columns by role, so the columns take the roles in turn
+    roles = dict(zip(given, ["x", "y", "hue", "size", "style"]))
+    for chunk in iter_chunks(chunks):
+        dat = PlotData(chunk, **{roles[name]: vars[name] for name in given})
+        yield tuple(dat.columns[roles[name]] if name in roles else None 
+                    for name in vars)
+
+
+def _data_columns(data, **vars):
+    """
+    The columns vars of data (see :func:`_chunk_blocks`). A var which
+    is an array (e.g. weights) rather than a column name is returned as is.
+    """
+    names = {name: var for name, var in vars.items() if np.ndim(var) == 0}
+    columns, = _chunk_blocks([data], **names)
+    columns = dict(zip(names, columns))
+    return tuple(columns.get(name, var) for name, var in vars.items())
+
+
+def _chunk_weights(weights):
+    """
+    The weights of chunked data must be a column of the chunks
+    """
+    if weights is not None and not isinstance(weights, str):
+        raise ValueError("the weights of chunked data must be the name "
+                         "of a column of the chunks")
+    return weights
+
+
+def _axis_ranges(range):
+    return (None, None) if range is None else range
+
+
+def _axis_bins(bins):
+    """
+    Splits bins into (x, y) bins, as in ``np.histogram2d``: a pair
+    is a number of bins or edges for each axis, otherwise bins
+    applies to both.
+    """
+    if (bins is None or isinstance(bins, (int, np.integer, str)) 
+            or len(bins) != 2):
+        return bins, bins
+    return bins
+
+
+
+def hist(x, bins=None, data=None, range=None, weights=None, workers=None, **kwargs):
+    """
+    A histogram of x, with bins by Scott's rule by default. Returns
+    the :class:`Histogram`, which may be passed back as x to draw
+    it again (with other kwargs) without re-binning.
+    If data is given (anything :class:`PlotData` accepts, e.g. a
+    file path, or chunked data), x is a column of data.
+
+    x may be memory mapped, and chunks are read one at a time, so
+    the memory used does not grow with the size of the data.
+    With workers, blocks of the data are binned in that many threads,
+    giving the same counts as without.
+
+    weights may be an array, or with data, a column of data. 
+    Chunked data can only be weighted by a column.
+    """
+    if isinstance(x, Histogram):
+        h = x
+    elif data is not None and is_chunked(data):
+        h = Histogram.from_chunks(data, x, bins=bins, range=range, 
+                                  weights=_chunk_weights(weights), workers=workers)
+    else:
+        if data is not None:
+            x, weights = _data_columns(data, x=x, weights=weights)
+        h = Histogram.from_values(x, bins=bins, range=range, weights=weights,
+                                  workers=workers)
+
+    h.plot(**kwargs)
+    return h
+
+
+def hist2d(x, y=None, bins=None, data=None, range=None, weights=None, 
+           workers=None, **kwargs):
+    """
+    A 2D histogram of x and y, with bins by Scott's rule by default,
+    returning the :class:`Histogram2D` (which may be passed back as x).
+    If data is given, x, y, and weights may be columns of data 
+    (see :func:`hist`).
+
+    x may also be a :class:`HistPyramid`, which is drawn at the
+    resolution of the axes and redrawn from the tiles of the right
+    level whenever they are zoomed, returning the :class:`PyramidImage`.
+    """
+    from .pyramid import HistPyramid
+    if isinstance(x, HistPyramid):
+        return x.plot(**kwargs)
+
+    if isinstance(x, Histogram2D):
+        h = x
+    elif data is not None and is_chunked(data):
+        h = Histogram2D.from_chunks(data, x, y, bins=bins, range=range, 
+                                    weights=_chunk_weights(weights), 
+                                    workers=workers)
+    else:
+        if data is not None:
+            x, y, weights = _data_columns(data, x=x, y=y, weights=weights)
+        h = Histogram2D.from_values(x, y, bins=bins, range=range, weights=weights,
+                                    workers=workers)
+
+    h.plot(**kwargs)
+    return h
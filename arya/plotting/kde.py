@@ -0,0 +1,411 @@
+import numpy as np
+
+from ._plot_data import PlotData, is_chunked, is_reiterable
+from ._binning import imap, scan
+from .histogram import (_scotts_cov, _array_blocks, _chunk_blocks,
+                        _axis_ranges, BLOCK_SIZE, MAX_BLOCK_SIZE)
+from .._lazy import LazyModule
+
+
+plt = LazyModule("matplotlib.pyplot")
+
+
+# the default number of grid points along each axis
+GRID_SIZE = 1024
+GRID_SIZE_2D = 256
+
+# the kernel is cut off at this many standard deviations
+KERNEL_CUT = 5
+
+
+class KDE:
+    """
+    A Gaussian kernel density estimate of x, evaluated on a uniform grid.
+
+    The values are binned onto the grid (each split between its two
+    nearest grid points), and the counts convolved with the kernel
+    by FFT, so the cost is O(N + G log G) for N values and G grid
+    points, rather than O(N G).
+    """
+
+    def __init__(self, grid, density, bandwidth):
+        self.grid = grid
+        self.density = density
+        self.bandwidth = bandwidth
+
+
+    @classmethod
+    def from_values(cls, x, bw=None, bw_adjust=1, gridsize=GRID_SIZE, cut=3,
+                    range=None, weights=None, workers=None):
+        """
+        The KDE of x (which may be memory mapped).
+
+        Params
+        ------
+        bw : ``float``
+            the standard deviation of the kernel (by default, by Scott's
+            rule from a sample of at most SAMPLE_SIZE values)
+        bw_adjust : ``float``
+            a factor scaling the bandwidth
+        gridsize : ``int``
+        cut : ``float``
+            the grid extends this many bandwidths past the data
+        range : ``(lo, hi)``
+            the range of the grid, outside which values are dropped
+        weights : array
+        workers : ``int`` or :class:`concurrent.futures.Executor`
+            bins blocks of x in parallel (see :func:`imap`)
+        """
+        x = np.asarray(x)
+        cov = None if bw is None else np.atleast_2d(np.square(bw))
+        grids, density, cov = _kde(lambda: [(x,)], True, cov,
+                                   bw_adjust, (gridsize,), cut, [range],
+                                   weights, workers, lambda: _array_blocks(x))
+        return cls(grids[0], density, np.sqrt(cov[0, 0]))
+
+
+    @classmethod
+    def from_chunks(cls, chunks, x, bw=None, bw_adjust=1, gridsize=GRID_SIZE,
+                    cut=3, range=None, workers=None):
+        """
+        The KDE of the column x of chunked data, read one chunk at a time.
+        Unless bw and range are given, the chunks are first scanned for
+        the range and a sample, so must be a list or a function returning
+        an iterator.
+        """
+        cov = None if bw is None else np.atleast_2d(np.square(bw))
+        grids, density, cov = _kde(lambda: _chunk_blocks(chunks, x=x),
+                                   is_reiterable(chunks), cov, bw_adjust,
+                                   (gridsize,), cut, [range], None, workers)
+        return cls(grids[0], density, np.sqrt(cov[0, 0]))
+
+
+    def plot(self, ax=None, fill=False, **kwargs):
+        """
+        Draws the density as a line, or filled down to zero
+        """
+        if ax is None:
+            ax = plt.gca()
+        if fill:
+            return ax.fill_between(self.grid, self.density, **kwargs)
+        return ax.plot(self.grid, self.density, **kwargs)
+
+
+
+class KDE2D:
+    """
+    A Gaussian kernel density estimate of (x, y) on a uniform grid,
+    computed as for :class:`KDE`. density has shape
+    (len(xgrid), len(ygrid)), and the kernel has covariance cov.
+    """
+
+    def __init__(self, xgrid, ygrid, density, cov):
+        self.xgrid = xgrid
+        self.ygrid = ygrid
+        self.density = density
+        self.cov = cov
+
+
+    @classmethod
+    def from_values(cls, x, y, bw=None, bw_adjust=1, gridsize=GRID_SIZE_2D,
+                    cut=3, range=None, weights=None, workers=None):
+        """
+        The KDE of x and y (see :meth:`KDE.from_values`). By default, the
+        kernel has the covariance of the data scaled by Scott's rule; bw
+        may instead give the standard deviation of the kernel along each
+        axis (or both). gridsize may be a pair, and range is a pair of ranges.
+        """
+        x = np.asarray(x)
+        y = np.asarray(y)
+        grids, density, cov = _kde(lambda: [(x, y)], True,
+                                   _diagonal_cov(bw), bw_adjust,
+                                   _grid_shape(gridsize), cut,
+                                   _axis_ranges(range), weights, workers,
+                                   lambda: _array_blocks(x, y))
+        return cls(*grids, density, cov)
+
+
+    @classmethod
+    def from_chunks(cls, chunks, x, y, bw=None, bw_adjust=1,
+                    gridsize=GRID_SIZE_2D, cut=3, range=None, workers=None):
+        """
+        The KDE of the columns x and y of chunked data
+        (see :meth:`KDE.from_chunks`)
+        """
+        grids, density, cov = _kde(lambda: _chunk_blocks(chunks, x=x, y=y),
+                                   is_reiterable(chunks), _diagonal_cov(bw),
+                                   bw_adjust, _grid_shape(gridsize), cut,
+                                   _axis_ranges(range), None, workers)
+        return cls(*grids, density, cov)
+
+
+    def plot(self, ax=None, filled=False, **kwargs):
+        """
+        Draws contours of the density (filled, if filled)
+        """
+        if ax is None:
+            ax = plt.gca()
+        contour = ax.contourf if filled else ax.contour
+        return contour(self.xgrid, self.ygrid, self.density.T, **kwargs)
+
+
+
+def _kde(blocks, reiterable, cov, bw_adjust, shape, cut, ranges,
+         weights, workers, scan_blocks=None):
+    """
+    Returns the grids, the density on them, and the kernel covariance
+    for data given by blocks() (an iterable of tuples of ndim columns).
+    If the kernel covariance or any range is not given, the data (or
+    scan_blocks(), if given) are first scanned for them. The density
+    integrates to the fraction of the (finite) data inside the grid.
+    """
+    scanned = None
+    if cov is None or any(r is None for r in ranges):
+        if not reiterable:
+            raise ValueError("the bandwidth and range of a KDE of an iterator "
+                    "of chunks must be given, or else pass a list of chunks "
+                    "or a function returning an iterator")
+        scanned = scan((scan_blocks or blocks)())
+
+    if cov is None:
+        cov = _scotts_cov(scanned.sample, scanned.n)
+    cov = cov * bw_adjust**2
+    if not np.all(np.diag(cov) > 0):
+        raise ValueError("the bandwidth must be positive")
+
+    grids = []
+    for axis, (n, r) in enumerate(zip(shape, ranges)):
+        if r is None:
+            pad = cut * np.sqrt(cov[axis, axis])
+            r = (scanned.lo[axis] - pad, scanned.hi[axis] + pad)
+        grids.append(np.linspace(r[0], r[1], n))
+
+    counts = np.zeros(shape)
+    total = 0
+    start = 0
+    for cols in blocks():
+        w = None if weights is None else weights[start:start + len(cols[0])]
+        start += len(cols[0])
+        block_counts, block_total = linear_binned(cols, grids, w, workers)
+        counts += block_counts
+        total += block_total
+
+    density = _convolve(counts, grids, cov)
+    if total > 0:
+        density /= total
+    return grids, density, cov
+
+
+def linear_binned(cols, grids, weights=None, workers=None):
+    """
+    Returns the weight of values (a tuple of 1 or 2 columns) at each
+    point of the uniform grids (one per column), with each value split
+    linearly between the grid points around it, and the total weight
+    of the finite values. Values outside the grids are dropped.
+    The columns are binned in blocks, in parallel with workers
+    (see :func:`imap`).
+    """
+    n = len(cols[0])
+    counts = np.zeros([len(g) for g in grids])
+    # as in bin_counts, larger grids are binned in larger blocks
+    block = min(max(BLOCK_SIZE, 4 * counts.size), MAX_BLOCK_SIZE)
+    blocks = (([col[start:start + block] for col in cols], grids,
+               None if weights is None else weights[start:start + block])
+              for start in range(0, n, block))
+
+    total = 0
+    for part, part_total in imap(_linear_bin_block, blocks, workers):
+        counts += part
+        total += part_total
+    return counts, total
+
+
+def _linear_bin_block(cols, grids, weights):
+    """
+    The weights and total weight of a block of linear_binned (at
+    module level, so that it can be sent to other processes)
+    """
+    bin_block = _linear_bin_1d if len(cols) == 1 else _linear_bin_2d
+    return bin_block(cols, grids, weights), _total_weight(cols, weights)
+
+
+def _grid_position(x, grid):
+    """
+    The position of x in units of the grid spacing, and the index and
+    fraction past it. Values outside the grid (or not finite) are given
+    the index len(grid) and a fraction of 0.
+    """
+    n = len(grid)
+    f = (np.asarray(x, dtype=float) - grid[0]) * ((n - 1) / (grid[-1] - grid[0]))
+    outside = ~((f >= 0) & (f <= n - 1))
+    f[outside] = n
+    idx = f.astype(np.intp)
+    f -= idx
+    return idx, f, outside
+
+
+def _linear_bin_1d(cols, grids, weights):
+    grid, = grids
+    n = len(grid)
+    idx, frac, _ = _grid_position(cols[0], grid)
+    if weights is not None:
+        frac *= weights
+
+    # each value adds (1 - frac) at idx and frac at idx + 1; the extra
+    # point n collects the values outside the grid
+    c = np.bincount(idx, weights=weights, minlength=n + 1)
+    s = np.bincount(idx, weights=frac, minlength=n + 1)
+    counts = c[:n] - s[:n]
+    counts[1:] += s[:n - 1]
+    return counts
+
+
+def _linear_bin_2d(cols, grids, weights):
+    nx, ny = len(grids[0]), len(grids[1])
+    ix, fx, x_out = _grid_position(cols[0], grids[0])
+    iy, fy, y_out = _grid_position(cols[1], grids[1])
+
+    # the keys of a (nx + 1) by (ny + 1) grid, where the last point
+    # collects the values outside the grid
+    outside = x_out | y_out
+    ix[outside] = nx
+    iy[outside] = ny
+    fx[outside] = 0
+    fy[outside] = 0
+    key = ix
+    key *= ny + 1
+    key += iy
+    del iy
+
+    fxy = fx * fy
+    if weights is not None:
+        fx *= weights
+        fy *= weights
+        fxy *= weights
+
+    size = (nx + 1) * (ny + 1)
+    shape = (nx + 1, ny + 1)
+    c = np.bincount(key, weights=weights, minlength=size).reshape(shape)
+    sx = np.bincount(key, weights=fx, minlength=size).reshape(shape)
+    sy = np.bincount(key, weights=fy, minlength=size).reshape(shape)
+    sxy = np.bincount(key, weights=fxy, minlength=size).reshape(shape)
+
+    counts = c - sx - sy + sxy
+    counts[1:] += (sx - sxy)[:-1]
+    counts[:, 1:] += (sy - sxy)[:, :-1]
+    counts[1:, 1:] += sxy[:-1, :-1]
+    return counts[:nx, :ny]
+
+
+def _convolve(counts, grids, cov):
+    """
+    The convolution of counts on the grids with a Gaussian kernel of
+    covariance cov, cut off at KERNEL_CUT standard deviations, by FFT
+    """
+    steps = [g[1] - g[0] for g in grids]
+    half = [min(int(np.ceil(KERNEL_CUT * np.sqrt(cov[i, i]) / step)), len(g) - 1)
+            for i, (g, step) in enumerate(zip(grids, steps))]
+
+    offsets = np.meshgrid(*[np.arange(-m, m + 1) * step
+                            for m, step in zip(half, steps)], indexing="ij")
+    offsets = np.stack(offsets, axis=-1)
+    q = np.einsum("...i,ij,...j->...", offsets, np.linalg.inv(cov), offsets)
+    kernel = np.exp(-0.5 * q) / np.sqrt(np.linalg.det(2 * np.pi * cov))
+
+    # zero padded, so the convolution does not wrap around
+    size = [_fft_size(n + 2 * m) for n, m in zip(counts.shape, half)]
+    full = np.fft.irfftn(np.fft.rfftn(counts, size) * np.fft.rfftn(kernel, size),
+                         size)
+    density = full[tuple(slice(m, m + n) for m, n in zip(half, counts.shape))]
+    # the FFT leaves tiny negative values where the density is zero
+    return np.maximum(density, 0)
+
+
+def _fft_size(n):
+    """
+    The smallest power of 2 of at least n
+    """
+    return 1 << int(np.ceil(np.log2(n)))
+
+
+def _total_weight(cols, weights):
+    """
+    The total weight of the rows finite in every column
+    """
+    finite = np.isfinite(cols[0])
+    for col in cols[1:]:
+        finite &= np.isfinite(col)
+    if weights is None:
+        return np.count_nonzero(finite)
+    return np.sum(weights[finite])
+
+
+def _diagonal_cov(bw):
+    if bw is None:
+        return None
+    return np.diag(np.square(np.broadcast_to(bw, 2)).astype(float))
+
+
+def _grid_shape(gridsize):
+    return tuple(np.broadcast_to(gridsize, 2))
+
+
+
+def _no_chunk_weights(weights):
+    if weights is not None:
+        raise ValueError("the KDE of chunked data cannot be weighted")
+
+
+def kde(x, data=None, bw=None, bw_adjust=1, gridsize=GRID_SIZE, cut=3,
+        range=None, weights=None, workers=None, fill=False, **kwargs):
+    """
+    A Gaussian kernel density estimate of x, with a bandwidth by
+    Scott's rule by default (see :meth:`KDE.from_values`). Returns the
+    :class:`KDE`, which may be passed back as x to draw it again.
+    If data is given (anything :class:`PlotData` accepts, e.g. a
+    file path, or chunked data), x is a column of data. Chunked
+    data cannot be weighted.
+    """
+    if isinstance(x, KDE):
+        k = x
+    elif data is not None and is_chunked(data):
+        _no_chunk_weights(weights)
+        k = KDE.from_chunks(data, x, bw=bw, bw_adjust=bw_adjust,
+                            gridsize=gridsize, cut=cut, range=range,
+                            workers=workers)
+    else:
+        if data is not None:
+            x = PlotData(data, x=x).columns["x"]
+        k = KDE.from_values(x, bw=bw, bw_adjust=bw_adjust, gridsize=gridsize,
+                            cut=cut, range=range, weights=weights,
+                            workers=workers)
+
+    k.plot(fill=fill, **kwargs)
+    return k
+
+
+def kde2d(x, y=None, data=None, bw=None, bw_adjust=1, gridsize=GRID_SIZE_2D,
+          cut=3, range=None, weights=None, workers=None, filled=False, **kwargs):
+    """
+    A Gaussian kernel density estimate of x and y, drawn as contours
+    (see :meth:`KDE2D.from_values`), returning the :class:`KDE2D`.
+    If data is given, x and y are columns of data (see :func:`kde`).
+    """
+    if isinstance(x, KDE2D):
+        k = x
+    elif data is not None and is_chunked(data):
+        _no_chunk_weights(weights)
+        k = KDE2D.from_chunks(data, x, y, bw=bw, bw_adjust=bw_adjust,
+                              gridsize=gridsize, cut=cut, range=range,
+                              workers=workers)
+    else:
+        if data is not None:
+            dat = PlotData(data, x=x, y=y)
+            x = dat.columns["x"]
+            y = dat.columns["y"]
+        k = KDE2D.from_values(x, y, bw=bw, bw_adjust=bw_adjust,
+                              gridsize=gridsize, cut=cut, range=range,
+                              weights=weights, workers=workers)
+
+    k.plot(filled=filled, **kwargs)
+    return k
@@ -1,15 +1,20 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
-import pandas as pd
 
-from scipy.stats import binned_statistic
-import astropy.stats
-
-from ._plot_data import PlotData
+from ._plot_data import (PlotData, plot_vars, global_codes, 
+                         group_table, is_chunked, is_reiterable, iter_chunks)
+from ._binning import (binned_stats, bin_order, rolling_stats,
+                       BinnedMoments, accumulators, 
+                       merge_accumulators, sketched_stats, needs_percentiles, 
+                       sketch_size, imap, num_workers)
+from ._cache import get_cache, result_key
 from ..figure.colorbar import Colorbar
-from .binnedplot import plot_err
+from .binnedplot import plot_groups
 from .. import COLORS
+from .._lazy import LazyModule
+
+
+plt = LazyModule("matplotlib.pyplot")
+pd = LazyModule("pandas")
 
 
 
@@ -20,6 +25,8 @@ def medianplot(data,
                binsize=20,
                numbins=None,
                stat="median", errorbar="pi",
+               rolling=False, stride=1,
+               accuracy=None, workers=None, cache=None,
                # aesthetics
                hue_label=None,
                aes="scatter",
@@ -36,14 +43,36 @@ def medianplot(data,
     Params
     ------
     data :  :class:`pandas.DataFrame`, :class:`numpy.ndarray`, mapping, or sequence
-        The Input data for the plot.
+        The Input data for the plot. May also be chunked (a list of
+        chunks or a function returning an iterator of chunks, see
+        :class:`MedianData`), which is binned with quantile sketches.
     x, y :  vectors or keys in ``data``
-    bins : ``int`` or list-like
-    binwidth
-    binrange
+    binsize : ``int``
+        the number of points in each bin
+    numbins : ``int``
+        the number of bins (overrides binsize)
     stat
     errorbar: 
         statistic for errorbars
+    rolling : ``bool``
+        if True, the stat is calculated in a window of binsize points
+        sliding along x, rather than in disjoint bins
+    stride : ``int``
+        for a rolling window, the number of points between evaluations
+    accuracy : ``float``
+        if set, the bins and percentiles are estimated with quantile
+        sketches instead of sorting the data, to within this fraction
+        of each group's points in rank (e.g. 0.01). Memory then scales
+        with the number of bins rather than points.
+    workers : ``int`` or :class:`concurrent.futures.Executor`
+        sketches shards of the data (or chunks) in parallel, 
+        in this many threads
+    cache : ``bool``, path, or :class:`ResultCache`
+        if set, the binned statistics are memoized (see :func:`binnedplot`)
+    aes : ``str``
+        "scatter", "line", or "density", which draws the points as an
+        image of their density in each pixel (see :func:`densityplot`),
+        e.g. for a rolling stat of many points. Errors are not drawn.
 
 
     kwargs
@@ -53,7 +82,9 @@ def medianplot(data,
         hue_label=hue
 
     dat = MedianData(data, x=x, y=y, hue=hue, style=style, size=size,
-            binsize=binsize, numbins=numbins, stat=stat, errorbar=errorbar)
+            binsize=binsize, numbins=numbins, stat=stat, errorbar=errorbar,
+            rolling=rolling, stride=stride, accuracy=accuracy, workers=workers,
+            cache=cache)
 
     if hue is not None:
         hue = "hue"
@@ -64,16 +95,16 @@ def medianplot(data,
 
     has_cb, cb = create_cb(dat, hue, hue_label, legend)
 
-    kwargs["has_errors"] = dat.has_errors
+    groups = dat.groups()
     if has_cb:
-        for group in dat.groups():
-            color = cb(np.mean(group.hue)) # TODO
-            plot_err(group, color=color, aes=aes, err_kwargs=err_kwargs, **kwargs)
+        colors = cb(np.array([np.mean(group.hue) for group in groups])) # TODO
     else:
-        for group in dat.groups():
-            if color is None:
-                color = COLORS[0]
-            plot_err(group, color=color, aes=aes, err_kwargs=err_kwargs, **kwargs)
+        if color is None:
+            color = COLORS[0]
+        colors = [color] * len(groups)
+
+    plot_groups(groups, colors, has_errors=dat.has_errors, aes=aes, 
+                err_kwargs=err_kwargs, **kwargs)
 
 
     if has_cb or not legend:
@@ -90,10 +121,10 @@ def create_cb(dat, hue, hue_label, legend):
         if binned_hue:
             if hue_binrange is None:
                 hue_binrange = (min(dat.data.hue), max(dat.data.hue))
-            cb = Colorbar(hue_binrange, norm=dat.hue_bins,
+            cb = Colorbar(clim=hue_binrange, norm=dat.hue_bins,
                           label=hue_label, create=legend)
         else: 
-            cb = Colorbar((min(dat.data.hue), max(dat.data.hue)), label=hue_label,
+            cb = Colorbar(clim=(min(dat.data.hue), max(dat.data.hue)), label=hue_label,
                           create=legend)
         seq_hue = True
     else:
@@ -105,71 +136,268 @@ def create_cb(dat, hue, hue_label, legend):
 
 
 class MedianData(PlotData):
-    def __init__(self, data, x=None, y=None, 
-            hue=None, style=None, size=None, **kwargs):
-        
-        super().__init__(data, x=x, y=y, hue=hue, style=style, size=size)
+    """
+    The stat of x and y in bins of x with equal numbers of points,
+    for each group of hue, style and size.
 
-        self.group_cols = list(set(["hue", "style", "size"]) & set(self.vars.keys()))
+    With an accuracy (or workers, or chunked data), the data are never
+    sorted. Instead, the bins and their percentiles are estimated with
+    :class:`QuantileSketch` es, which take memory proportional to the
+    number of bins and merge across chunks and workers. Chunked data 
+    (see :func:`is_chunked`) are read twice, so must be a list of chunks
+    or a function returning a new iterator.
 
-        df = pd.DataFrame()
+    With a cache, the result is memoized as for :class:`BinnedData`.
+    """
+    def __init__(self, data, x=None, y=None, 
+            hue=None, style=None, size=None, 
+            stat="median", binsize=10, numbins=None, errorbar=None,
+            rolling=False, stride=1, accuracy=None, workers=None, cache=None):
         
-        for group in self.groups():
-            df = pd.concat(
-                     [df, self.bin(group,  **kwargs)], 
-                     ignore_index=True)
-
-        self._old_data = data
-        self._data = df
-
-
-    def bin(self, df, stat, binsize=10, numbins=None, errorbar=None):
-        df_sorted = df.sort_values(by="x")
-
+        chunked = is_chunked(data)
+        if chunked:
+            self._vars = plot_vars(x=x, y=y, hue=hue, style=style, size=size)
+            self._data = None
+        else:
+            super().__init__(data, x=x, y=y, hue=hue, style=style, size=size)
+
+        self.group_cols = [c for c in ["hue", "style", "size"] if c in self.vars]
         self.has_errors = errorbar is not None
-
-        N = len(df_sorted) 
-        offset = (N % binsize)//2
-
+        sketched = chunked or (accuracy is not None) or (num_workers(workers) > 1)
+
+        cache = get_cache(cache)
+        key = None
+        if cache is not None:
+            key = result_key(self, chunks=data if chunked else None,
+                    stat=stat, binsize=binsize, numbins=numbins, 
+                    errorbar=errorbar, rolling=rolling, stride=stride, 
+                    accuracy=accuracy, workers=num_workers(workers))
+            result = None if key is None else cache.get(key)
+            if result is not None:
+                self._replace_data(result[0])
+                return
+
+        if rolling:
+            if numbins is not None:
+                raise ValueError("a rolling window is set by binsize, not numbins")
+            if sketched:
+                raise ValueError("a rolling window needs in-memory data "
+                                 "and no accuracy or workers")
+            df = self.rolling(stat, binsize=binsize, errorbar=errorbar, stride=stride)
+        elif sketched:
+            df = self.sketch_bin(stat, binsize=binsize, numbins=numbins,
+                    errorbar=errorbar, accuracy=accuracy, workers=workers,
+                    chunks=data if chunked else None)
+        else:
+            df = self.bin(stat, binsize=binsize, numbins=numbins, errorbar=errorbar)
+
+        self._replace_data(df)
+        if key is not None:
+            cache.put(key, df, {})
+
+
+    def bin(self, stat, binsize=10, numbins=None, errorbar=None):
+        """
+        Splits each group, sorted by x, into bins with equal numbers
+        of points, and calculates the stat of x and y in each bin.
+
+        All groups are sorted together by (group, x), and each point
+        is labeled by its bin, so the statistics of every bin come 
+        from a single vectorized reduction.
+        """
+        codes, x, y, group_values = self.sorted_groups()
+
+        N = np.bincount(codes, minlength=len(group_values))
         if numbins is None:
-            numbins = N // binsize + (N % binsize > 0)
-        binsize = N / numbins
-        offset = 0
-
+            group_numbins = N // binsize + (N % binsize > 0)
+        else:
+            group_numbins = np.full(len(N), numbins)
+
+        # the first point of each bin
+        bin_group = np.repeat(np.arange(len(N)), group_numbins)
+        n = np.arange(len(bin_group)) - np.repeat(
+                np.cumsum(group_numbins) - group_numbins, group_numbins)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            group_binsize = N / group_numbins
+        group_start = np.cumsum(N) - N
+        starts = group_start[bin_group] + np.round(group_binsize[bin_group] * n).astype(int)
+
+        total_bins = len(bin_group)
+        ends = np.append(starts[1:], len(x))
+        idx = np.repeat(np.arange(total_bins), ends - starts)
+
+        _, x_c, _, counts = binned_stats(idx, x, total_bins, stat=stat)
+        y_l, y_c, y_h, _ = binned_stats(idx, y, total_bins, stat=stat, errorbar=errorbar)
+
+        # x is sorted in each bin (empty bins are dropped)
+        last = max(len(x) - 1, 0)
+        x_range = (x[np.minimum(starts, last)], x[np.clip(ends - 1, 0, last)])
+
+        data = self._stat_frame(x_c, y_l, y_c, y_h, counts, 
+                                group_values.iloc[bin_group], x_range)
+        return data[counts > 0].reset_index(drop=True)
+
+
+    def sketch_bin(self, stat, binsize=10, numbins=None, errorbar=None,
+                   accuracy=None, workers=None, chunks=None):
+        """
+        Like :meth:`bin`, but in two passes over the data without sorting.
+        The first sketches x in each group, and the bin edges are
+        the quantiles of x which split the group into equal counts. 
+        The second accumulates x and y into each bin.
+        Bins then hold equal counts only to within the accuracy.
+        """
+        if chunks is not None and not is_reiterable(chunks):
+            raise ValueError("chunks are read twice, so must be a list of "
+                             "chunks or a function returning an iterator")
+
+        k = sketch_size(accuracy)
+        groups = {}
+        if chunks is None:
+            codes, group_values = self.group_codes()
+            x = self.columns["x"]
+            y = self.columns["y"]
+            bounds = np.linspace(0, len(x), num_workers(workers) + 1).astype(int)
+            shards = lambda: ((x[a:b], y[a:b], codes[a:b], len(group_values))
+                              for a, b in zip(bounds[:-1], bounds[1:]))
+        else:
+            def shards():
+                for chunk in iter_chunks(chunks):
+                    df = PlotData(chunk, **self.vars).data
+                    codes = global_codes(df, self.group_cols, groups)
+                    yield df.x.values, df.y.values, codes, len(groups)
+
+        x_moments, x_sketch = merge_accumulators(imap(accumulators, 
+                ((codes, x, ngroups, True, i, k) 
+                 for i, (x, _, codes, ngroups) in enumerate(shards())), 
+                workers))
+
+        if chunks is not None:
+            group_values = group_table(groups, self.group_cols)
+        ngroups = len(group_values)
+        x_sketch.resize(ngroups)
+
+        N = x_moments.resize(ngroups).count
+        if numbins is None:
+            group_numbins = N // binsize + (N % binsize > 0)
+        else:
+            group_numbins = np.where(N > 0, numbins, 0)
+
+        # the inner edges of each group, at equal steps in quantile
+        bin_group = np.repeat(np.arange(ngroups), group_numbins)
+        bin_starts = np.cumsum(group_numbins) - group_numbins
+        n = np.arange(len(bin_group)) - bin_starts[bin_group]
+        inner = n > 0
+        edges = x_sketch.percentiles(100 * n[inner] / group_numbins[bin_group[inner]],
+                                     idx=bin_group[inner])
+
+        total_bins = len(bin_group)
+        sketch = needs_percentiles(stat)
+        parts = imap(_median_accumulators, 
+                ((x, y, codes, edges, bin_starts, group_numbins, total_bins, 
+                  sketch, i, k)
+                 for i, (x, y, codes, _) in enumerate(shards())), 
+                workers)
+
+        x_acc = y_acc = (BinnedMoments.empty(total_bins), None)
+        for x_part, y_part in parts:
+            x_acc = merge_accumulators([x_acc, x_part])
+            y_acc = merge_accumulators([y_acc, y_part])
+
+        _, x_c, _, counts = sketched_stats(*x_acc, stat=stat)
+        y_l, y_c, y_h, _ = sketched_stats(*y_acc, stat=stat, errorbar=errorbar)
+
+        data = self._stat_frame(x_c, y_l, y_c, y_h, counts, 
+                                group_values.iloc[bin_group], 
+                                (x_acc[0].min, x_acc[0].max))
+        return data[counts > 0].reset_index(drop=True)
+
+
+    def rolling(self, stat, binsize=10, errorbar=None, stride=1):
+        """
+        Calculates the stat of x and y in a window of binsize points
+        sliding along x within each group, evaluated every stride points.
+        Groups with fewer than binsize points are left out.
+
+        The windows are rolled over all groups at once (sorted by
+        (group, x)), and those which straddle two groups are dropped.
+        """
+        codes, x, y, group_values = self.sorted_groups()
+
+        # the position of each window's last point in its group
+        N = np.bincount(codes, minlength=len(group_values))
+        pos = np.arange(len(x)) - (np.cumsum(N) - N)[codes]
+        filt = (pos >= binsize - 1) & ((pos - binsize + 1) % stride == 0)
+        ends = np.flatnonzero(filt)
+
+        if stat == "median":
+            # x is sorted, so the median is the middle of the window
+            starts = ends - binsize + 1
+            x_c = (x[starts + (binsize - 1)//2] + x[starts + binsize//2]) / 2
+        else:
+            _, x_c, _ = rolling_stats(x, binsize, stat=stat)
+            x_c = x_c[ends]
+
+        y_l, y_c, y_h = rolling_stats(y, binsize, stat=stat, errorbar=errorbar)
+        if self.has_errors:
+            y_l = y_l[ends]
+            y_h = y_h[ends]
+
+        counts = np.full(len(ends), binsize)
+        return self._stat_frame(x_c, y_l, y_c[ends], y_h, counts, 
+                                group_values.iloc[codes[ends]],
+                                (x[ends - binsize + 1], x[ends]))
+
+
+    def sorted_groups(self):
+        """
+        Returns the group codes, x, and y of the points in a group,
+        sorted by group and then x, and the DataFrame of group values.
+        """
+        codes, group_values = self.group_codes()
+        filt = codes >= 0
+        codes = codes[filt]
+        x = self.columns["x"][filt]
+        y = self.columns["y"][filt]
+
+        order = bin_order(codes, x, len(group_values))
+        return codes[order], x[order], y[order], group_values
+
+
+    def _stat_frame(self, x_c, y_l, y_c, y_h, counts, group_values, x_range):
+        """
+        The DataFrame of the stats of each bin. x_lo and x_hi are the 
+        smallest and largest x in the bin (or window).
+        """
         data = pd.DataFrame()
-        for n in range(numbins):
-            i = offset + round(binsize*n)
-            if n == numbins-1:
-                j = -1
-            else:
-                j = offset + round(binsize * (n+1))
-
-            group = df_sorted.iloc[i:j]
-
-            x = _stat(group["x"], stat)
-            y = _stat(group["y"], stat)
-
-            if self.has_errors:
-                y_l, y_h = _stat_range(group.y, stat=stat, errorbar=errorbar)
-                data = pd.concat([data, pd.DataFrame( 
-                    dict(x=[x], y=[y], y_l=[y_l], y_h=[y_h], counts=[len(group)]))],
-                                 ignore_index=True)
-            else:
-                data = pd.concat([data, pd.DataFrame(dict(x=[x],
-                    y=[y],counts=[len(group)]))],
-                                 ignore_index=True)
-
-            i += binsize
+        data["x"] = x_c
+        data["y"] = y_c
+        if self.has_errors:
+            data["y_l"] = y_l
+            data["y_h"] = y_h
+
+        for col in self.group_cols:
+            data[col] = group_values[col].values
+        data["counts"] = counts
+        data["x_lo"], data["x_hi"] = x_range
 
         return data
 
 
+    def group_codes(self):
+        """
+        Returns the group number of each point (-1 if the point
+        is invalid or belongs to no group) and a DataFrame of the group values.
+        """
+        return super().group_codes(self.group_cols)
+
+
     def groups(self):
         if len(self.group_cols) == 0:
             return [self.data]
 
         gs = []
-        for _, g in self.data.groupby(self.group_cols):
+        for _, g in self.data.groupby(self.group_cols, observed=True):
             if len(g) > 0:
                 gs.append(g)
 
@@ -204,59 +432,26 @@ class MedianData(PlotData):
 
 
 
-def _stat(x, stat="count", percentile=None):
-    """
-    Calculates statistics for the vecors x, y over the given bins. 
-    """
-    if percentile is not None:
-        return np.percentile(x, percentile)
-
-    if stat == "count":
-        return len(x)
-    elif stat == "mean":
-        return np.mean(x)
-    elif stat == "median":
-        return np.median(x)
-    elif stat == "std":
-        return np.std(x)
-    elif stat == "count":
-        return binned_statistic(x, y, bins=bins, statistic="count")[0]
-    elif stat == "mode":
-        return binned_statistic(x, y, bins=bins, 
-                                statistic=lambda a: max(set(a), key=list(a).count))[0]
-
-    raise NotImplementedError
-
-
-
-def _stat_range(x, stat="count", errorbar="std"):
+def _median_accumulators(x, y, codes, edges, bin_starts, group_numbins, 
+                         size, sketch, seed, k):
     """
-    Calculates statistics for the vecors x, y over the given bins. 
-    Returns xl, xc, xh, where xl and xh are the lower and upper
-    values based on the errorbar setting.
+    Bins x and y by the inner edges of each group (as from
+    :meth:`MedianData.sketch_bin`) and returns the accumulators of each.
     """
-
-    if stat == "mean":
-        x_c = np.mean(x)
-        if errorbar == "std":
-            e = np.std(x)
-            x_l = x_c - e
-            x_h = x_c + e
-            return x_l, x_h
-        elif errorbar == "sterr":
-            e = np.std(x)
-            c = len(x)
-            e /= np.sqrt(c)
-            x_l = x_c - e
-            x_h = x_c + e
-            return x_l, x_h
-
-    elif stat == "median":
-        x_c = np.median(x)
-        if errorbar == "pi":
-            x_l = _stat(x, percentile=16)
-            x_h = _stat(x, percentile=84)
-            return x_l, x_h
-
-    raise NotImplementedError
-
+    codes = np.asarray(codes)
+    keys = np.full(len(x), -1)
+    
+    order = np.argsort(codes, kind="stable")
+    ngroups = len(group_numbins)
+    bounds = np.searchsorted(codes[order], np.arange(-1, ngroups) + 1)
+    # each group with bins has one inner edge fewer than bins
+    has_bins = group_numbins > 0
+    edge_starts = bin_starts - (np.cumsum(has_bins) - has_bins)
+
+    for g in np.flatnonzero(group_numbins):
+        rows = order[bounds[g]:bounds[g+1]]
+        inner = edges[edge_starts[g]:edge_starts[g] + group_numbins[g] - 1]
+        keys[rows] = bin_starts[g] + np.searchsorted(inner, x[rows], side="right")
+
+    return (accumulators(keys, x, size, sketch, seed, k),
+            accumulators(keys, y, size, sketch, seed, k))
@@ -0,0 +1,308 @@
+import os
+
+import numpy as np
+
+from .histogram import Histogram2D, is_uniform
+from .density import ViewImage
+from .._lazy import LazyModule
+
+
+plt = LazyModule("matplotlib.pyplot")
+
+
+# the number of bins along each side of a tile
+TILE_SIZE = 256
+
+
+class HistPyramid:
+    """
+    A 2D histogram at several resolutions: the finest counts (level 0),
+    and levels each coarsened 2x along both axes, down to a single tile.
+    Each level is stored as tiles of TILE_SIZE x TILE_SIZE bins, so
+    that a view of the histogram (see :meth:`select`) reads only the
+    tiles it overlaps, of the coarsest level still finer than the
+    screen. Zooming and panning then take a time independent of the
+    number of points (and of the size of the finest grid).
+
+    A pyramid is built once, e.g. by :meth:`from_values`, and may be
+    saved as a directory of memory-mapped ``.npy`` levels or a
+    compressed ``.npz`` of the non-empty tiles (see :meth:`save`).
+
+    The bins must be uniform. The edges of the coarser levels extend
+    past the finest edges when a level has an odd number of bins.
+    """
+
+    def __init__(self, levels, xedges, yedges, shapes, tile_size=TILE_SIZE):
+        self.levels = levels
+        self.xedges = np.asarray(xedges, dtype=float)
+        self.yedges = np.asarray(yedges, dtype=float)
+        self.shapes = [tuple(shape) for shape in shapes]
+        self.tile_size = tile_size
+
+
+    @classmethod
+    def from_histogram(cls, h, tile_size=TILE_SIZE):
+        """
+        The pyramid of a :class:`Histogram2D` with uniform bins
+        """
+        if not (is_uniform(h.xedges) and is_uniform(h.yedges)):
+            raise ValueError("a pyramid needs uniform bins")
+
+        counts = np.asarray(h.counts)
+        levels = [_tile(counts, tile_size)]
+        shapes = [counts.shape]
+        while max(counts.shape) > tile_size:
+            counts = _coarsen(counts)
+            levels.append(_tile(counts, tile_size))
+            shapes.append(counts.shape)
+
+        return cls(levels, h.xedges, h.yedges, shapes, tile_size)
+
+
+    @classmethod
+    def from_values(cls, x, y, bins=None, range=None, workers=None,
+                    tile_size=TILE_SIZE):
+        """
+        Bins x and y (see :meth:`Histogram2D.from_values`), where bins
+        is the number of bins of the finest level, e.g. 4096
+        """
+        h = Histogram2D.from_values(x, y, bins=bins, range=range, workers=workers)
+        return cls.from_histogram(h, tile_size)
+
+
+    @classmethod
+    def from_chunks(cls, chunks, x, y, bins=None, range=None, workers=None,
+                    tile_size=TILE_SIZE):
+        """
+        Bins the columns x and y of chunked data
+        (see :meth:`Histogram2D.from_chunks`)
+        """
+        h = Histogram2D.from_chunks(chunks, x, y, bins=bins, range=range,
+                                    workers=workers)
+        return cls.from_histogram(h, tile_size)
+
+
+    def save(self, path):
+        """
+        Saves the pyramid to path: if it ends in ``.npz``, as one
+        compressed file of the non-empty tiles, otherwise as a directory
+        of one ``.npy`` per level, which :meth:`load` memory maps.
+        """
+        meta = dict(xedges=self.xedges, yedges=self.yedges,
+                    shapes=np.array(self.shapes), tile_size=self.tile_size,
+                    dtype=str(self.levels[0].dtype))
+
+        if os.fspath(path).endswith(".npz"):
+            tiles = {}
+            for k in range(len(self.levels)):
+                ntx, nty = self._num_tiles(k)
+                for i in range(ntx):
+                    for j in range(nty):
+                        tile = _block(self.levels[k], i, i + 1, j, j + 1)
+                        if np.any(tile):
+                            tiles[_tile_key(k, i, j)] = tile
+            np.savez_compressed(path, **meta, **tiles)
+            return
+
+        os.makedirs(path, exist_ok=True)
+        np.savez(os.path.join(path, "meta.npz"), **meta)
+        for k, level in enumerate(self.levels):
+            np.save(os.path.join(path, f"level{k}.npy"), level)
+
+
+    @classmethod
+    def load(cls, path):
+        """
+        Opens a pyramid saved by :meth:`save`. Tiles are read only when
+        a view needs them.
+        """
+        npz = os.fspath(path).endswith(".npz")
+        with np.load(path if npz else os.path.join(path, "meta.npz")) as f:
+            shapes = f["shapes"]
+            tile_size = int(f["tile_size"])
+            dtype = np.dtype(str(f["dtype"]))
+            xedges = f["xedges"]
+            yedges = f["yedges"]
+
+        if npz:
+            levels = [_NpzTiles(path, k, shape, tile_size, dtype)
+                      for k, shape in enumerate(shapes)]
+        else:
+            levels = [np.load(os.path.join(path, f"level{k}.npy"), mmap_mode="r")
+                      for k in range(len(shapes))]
+
+        return cls(levels, xedges, yedges, shapes, tile_size)
+
+
+    def edges(self, level):
+        """
+        The x and y edges of the bins of a level
+        """
+        nx, ny = self.shapes[level]
+        return (_level_edges(self.xedges, level, nx),
+                _level_edges(self.yedges, level, ny))
+
+
+    def level_for(self, xlim, ylim, nx, ny):
+        """
+        The coarsest level with bins no larger than the pixels of
+        an nx by ny image of the view
+        """
+        dx = (self.xedges[1] - self.xedges[0])
+        dy = (self.yedges[1] - self.yedges[0])
+        scale = min((xlim[1] - xlim[0]) / nx / dx, (ylim[1] - ylim[0]) / ny / dy)
+        if not scale >= 1:
+            return 0
+        # (allowing for rounding when the scale is a power of 2)
+        return min(int(np.log2(scale) + 1e-9), len(self.levels) - 1)
+
+
+    def select(self, xlim, ylim, level=None, nx=None, ny=None):
+        """
+        Returns the :class:`Histogram2D` of the bins of a level that
+        overlap the view xlim by ylim. By default, the level is chosen
+        for an image of nx by ny pixels (see :meth:`level_for`).
+        Only the tiles overlapping the view are read.
+        """
+        if level is None:
+            if nx is None or ny is None:
+                raise ValueError("give either a level or the size nx, ny "
+                                 "of the image in pixels")
+            level = self.level_for(xlim, ylim, nx, ny)
+        xedges, yedges = self.edges(level)
+
+        bx0, bx1 = _bin_range(xedges, xlim)
+        by0, by1 = _bin_range(yedges, ylim)
+        T = self.tile_size
+        i0, i1 = bx0 // T, -(-bx1 // T)
+        j0, j1 = by0 // T, -(-by1 // T)
+
+        counts = _block(self.levels[level], i0, i1, j0, j1)
+        counts = counts[bx0 - i0*T: bx1 - i0*T, by0 - j0*T: by1 - j0*T]
+        return Histogram2D(counts, xedges[bx0:bx1 + 1], yedges[by0:by1 + 1])
+
+
+    def plot(self, ax=None, norm="log", pixel_size=1, **kwargs):
+        """
+        Draws the pyramid as a :class:`PyramidImage`, which reads the
+        level and tiles for the view again whenever the axes are zoomed
+        """
+        if ax is None:
+            ax = plt.gca()
+
+        im = PyramidImage(ax, self, pixel_size=pixel_size, norm=norm, **kwargs)
+        ax.add_image(im)
+        ax.update_datalim([(self.xedges[0], self.yedges[0]),
+                           (self.xedges[-1], self.yedges[-1])])
+        ax.autoscale_view()
+
+        im.update_image()
+        return im
+
+
+    def _num_tiles(self, level):
+        return self.levels[level].shape[:2]
+
+
+
+class PyramidImage(ViewImage):
+    """
+    An image of a :class:`HistPyramid` at the resolution of the axes.
+    The counts of level k are divided by 4**k, the number of finest bins
+    in each of its bins, so the colours are the same at every zoom.
+    Empty bins are blank.
+    """
+
+    def __init__(self, ax, pyramid, **kwargs):
+        super().__init__(ax, **kwargs)
+        self.pyramid = pyramid
+
+
+    def rebin(self, xlim, ylim, nx, ny):
+        level = self.pyramid.level_for(xlim, ylim, nx, ny)
+        h = self.pyramid.select(xlim, ylim, level=level)
+        image = np.ma.masked_equal(h.counts, 0) / 4**level
+        if image.size == 0:
+            return np.ma.masked_all((1, 1)), xlim + ylim
+        return image, (h.xedges[0], h.xedges[-1], h.yedges[0], h.yedges[-1])
+
+
+
+class _NpzTiles:
+    """
+    The tiles of one level of a saved ``.npz`` pyramid, read on demand
+    (missing tiles are empty). The file is opened for each read, so no
+    handle is left open.
+    """
+    def __init__(self, path, level, shape, tile_size, dtype):
+        self.path = path
+        self.level = level
+        self.tile_size = tile_size
+        self.dtype = dtype
+        self.shape = tuple(-(-n // tile_size) for n in shape) + (tile_size, tile_size)
+
+    def block(self, i0, i1, j0, j1):
+        T = self.tile_size
+        tiles = np.zeros((i1 - i0, j1 - j0, T, T), dtype=self.dtype)
+        with np.load(self.path) as f:
+            saved = set(f.files)
+            for i in range(i0, i1):
+                for j in range(j0, j1):
+                    key = _tile_key(self.level, i, j)
+                    if key in saved:
+                        tiles[i - i0, j - j0] = f[key]
+        return tiles
+
+
+
+def _coarsen(counts):
+    """
+    Sums 2x2 blocks of counts, padding odd sizes with an empty bin
+    """
+    nx, ny = counts.shape
+    padded = np.zeros((nx + nx % 2, ny + ny % 2), dtype=counts.dtype)
+    padded[:nx, :ny] = counts
+    return padded.reshape(len(padded) // 2, 2, -1, 2).sum(axis=(1, 3))
+
+
+def _tile(counts, T):
+    """
+    counts split into tiles, an array of shape (ntx, nty, T, T),
+    padded with empty bins
+    """
+    nx, ny = counts.shape
+    ntx, nty = -(-nx // T), -(-ny // T)
+    padded = np.zeros((ntx * T, nty * T), dtype=counts.dtype)
+    padded[:nx, :ny] = counts
+    return np.ascontiguousarray(padded.reshape(ntx, T, nty, T).transpose(0, 2, 1, 3))
+
+
+def _block(tiles, i0, i1, j0, j1):
+    """
+    The bins of tiles i0:i1 by j0:j1 as one array
+    """
+    if isinstance(tiles, _NpzTiles):
+        block = tiles.block(i0, i1, j0, j1)
+    else:
+        block = np.asarray(tiles[i0:i1, j0:j1])
+    ntx, nty, T, _ = block.shape
+    return block.transpose(0, 2, 1, 3).reshape(ntx * T, nty * T)
+
+
+def _level_edges(edges, level, n):
+    width = (edges[1] - edges[0]) * 2**level
+    return edges[0] + width * np.arange(n + 1)
+
+
+def _bin_range(edges, lim):
+    """
+    The first and one past the last bin of edges overlapping lim
+    """
+    n = len(edges) - 1
+    start = np.searchsorted(edges, lim[0], side="right") - 1
+    stop = np.searchsorted(edges, lim[1], side="left")
+    return int(np.clip(start, 0, n)), int(np.clip(stop, 0, n))
+
+
+def _tile_key(level, i, j):
+    return f"level{level}_{i}_{j}"
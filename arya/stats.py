@@ -0,0 +1,144 @@
+"""
+The binned statistics of :func:`binnedplot` and :func:`medianplot`,
+computed without drawing (and without importing pyplot), as plain
+arrays that are cheap to send between processes.
+"""
+import numpy as np
+
+from .plotting.binnedplot import BinnedData
+from .plotting.medianplot import MedianData
+from .plotting._plot_data import group_codes
+
+
+class BinnedStats:
+    """
+    The statistics of y in bins of x, as a struct of arrays with one
+    entry per (non-empty) bin of each group, ordered by group, then x.
+
+    Attributes
+    ----------
+    edges : array of shape (n, 2)
+        the lower and upper x edges of each bin. For equal-count bins
+        and rolling windows, the smallest and largest x in the bin.
+    centers : array
+        the x of each bin: the bin center, or the stat of x
+    stat : array
+        the stat of y
+    lower, upper : arrays or None
+        the ends of the errorbar of y, if any
+    counts : int array
+        the number of points in each bin
+    codes : int array
+        the group of each bin, indexing the arrays of groups
+    groups : ``dict``
+        the values of each group variable ("hue", "style", "size")
+        for each group
+
+    Results pickle as a few arrays; :meth:`to_dict` gives them as a dict
+    (e.g. for ``np.savez``), which :meth:`from_dict` reads back.
+    """
+
+    _fields = ["edges", "centers", "stat", "lower", "upper", "counts", "codes"]
+
+    def __init__(self, edges, centers, stat, lower, upper, counts, codes, groups):
+        self.edges = edges
+        self.centers = centers
+        self.stat = stat
+        self.lower = lower
+        self.upper = upper
+        self.counts = counts
+        self.codes = codes
+        self.groups = groups
+
+
+    @classmethod
+    def from_data(cls, dat, edges):
+        """
+        The stats of a computed :class:`BinnedData` or :class:`MedianData`,
+        given the edges of each of its bins
+        """
+        data = dat.data
+        codes, group_values = group_codes(data, dat.group_cols)
+        groups = {col: np.asarray(group_values[col]) for col in dat.group_cols}
+
+        return cls(edges=edges,
+                   centers=data["x"].to_numpy(dtype=float),
+                   stat=data["y"].to_numpy(dtype=float),
+                   lower=data["y_l"].to_numpy(dtype=float) if dat.has_errors else None,
+                   upper=data["y_h"].to_numpy(dtype=float) if dat.has_errors else None,
+                   counts=data["counts"].to_numpy(dtype=int),
+                   codes=codes,
+                   groups=groups)
+
+
+    def to_dict(self):
+        """
+        The arrays as a flat dict, leaving out missing errorbars.
+        Group variables are keyed "group_<name>".
+        """
+        d = {name: getattr(self, name) for name in self._fields
+             if getattr(self, name) is not None}
+        d.update({f"group_{name}": values for name, values in self.groups.items()})
+        return d
+
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        The stats from the arrays of :meth:`to_dict` (or a loaded ``.npz``)
+        """
+        fields = {name: (np.asarray(d[name]) if name in d else None)
+                  for name in cls._fields}
+        groups = {name[len("group_"):]: np.asarray(d[name])
+                  for name in d if name.startswith("group_")}
+        return cls(groups=groups, **fields)
+
+
+    def __len__(self):
+        return len(self.centers)
+
+
+    def __repr__(self):
+        return (f"BinnedStats({len(self)} bins, "
+                f"{len(next(iter(self.groups.values()), [0]))} groups)")
+
+
+
+def binned(data, x=None, y=None, hue=None, style=None, size=None,
+           bins=None, binwidth=None, binrange=None,
+           hue_bins=None, hue_binwidth=None, hue_binrange=None,
+           stat="mean", errorbar="std", cmin=2, workers=None, cache=None):
+    """
+    The stats :func:`binnedplot` draws, as :class:`BinnedStats`.
+    The parameters are those of :class:`BinnedData`; bins with fewer
+    than cmin points are left out.
+    """
+    dat = BinnedData(data, x=x, y=y, hue=hue, style=style, size=size,
+                     bins=bins, binwidth=binwidth, binrange=binrange,
+                     hue_bins=hue_bins, hue_binwidth=hue_binwidth,
+                     hue_binrange=hue_binrange, stat=stat, errorbar=errorbar,
+                     cmin=cmin, workers=workers, cache=cache)
+
+    i = np.searchsorted(dat.bin_centers, dat.data["x"].to_numpy())
+    edges = np.column_stack([dat.bins[i], dat.bins[i + 1]])
+    return BinnedStats.from_data(dat, edges)
+
+
+def running_median(data, x=None, y=None, hue=None, style=None, size=None,
+                   binsize=20, numbins=None, stat="median", errorbar="pi",
+                   rolling=False, stride=1, accuracy=None, workers=None,
+                   cache=None):
+    """
+    The stats :func:`medianplot` draws, as :class:`BinnedStats`:
+    the median (or stat) of x and y in bins of binsize points,
+    or with rolling, in a window of binsize points sliding along x.
+    The parameters are those of :class:`MedianData`.
+    """
+    dat = MedianData(data, x=x, y=y, hue=hue, style=style, size=size,
+                     binsize=binsize, numbins=numbins, stat=stat,
+                     errorbar=errorbar, rolling=rolling, stride=stride,
+                     accuracy=accuracy, workers=workers, cache=cache)
+
+    edges = np.column_stack([dat.data["x_lo"].to_numpy(dtype=float),
+                             dat.data["x_hi"].to_numpy(dtype=float)])
+    return BinnedStats.from_data(dat, edges)
@@ -1,20 +1,31 @@
 import matplotlib as mpl
+import numpy as np
 
 
 
 def to_rgb(h):
     return tuple(int(h[i:i+2], 16)/256 for i in (1, 3, 5))
 
+def to_rgb_array(colors):
+    """
+    The hex colors as an (N, 3) array, parsed in one go (as :func:`to_rgb`)
+    """
+    rgb = np.frombuffer(bytes.fromhex("".join(h[1:] for h in colors)), 
+                        dtype=np.uint8)
+    return rgb.reshape(-1, 3) / 256
+
 def get_cmap(reverse=False, to_white=False):
+    """
+    The arya colormap as a ListedColormap of the precomputed colours
+    (matplotlib builds its lookup table on first use)
+    """
     if to_white:
-        cm = cmap_w
+        cmap_rgb = CMAP_W_RGB
     else:
-        cm = cmap
+        cmap_rgb = CMAP_RGB
 
     if reverse:
-        cmap_rgb = [to_rgb(h) for h in cm[::-1]]
-    else:
-        cmap_rgb = [to_rgb(h) for h in cm]
+        cmap_rgb = cmap_rgb[::-1]
 
     lcm = mpl.colors.ListedColormap(cmap_rgb)
     lcm.set_under(cmap_rgb[0])
@@ -113,3 +124,7 @@ cmap_w = ['#142d72', '#172d72', '#1a2e73', '#1d2e73', '#202f74', '#232f74',
           '#f6f1ea', '#f6f2ec', '#f7f3ed', '#f8f4ee', '#f8f5f0', '#f9f6f1',
           '#f9f7f2', '#faf8f4', '#fbf9f5', '#fbf9f7', '#fcfaf8', '#fcfbf9',
           '#fdfcfb', '#fefdfc', '#fefefe', '#ffffff']
+
+
+CMAP_RGB = to_rgb_array(cmap)
+CMAP_W_RGB = to_rgb_array(cmap_w)
@@ -1,8 +1,8 @@
 import matplotlib as mpl
+import matplotlib.style
+import matplotlib.ticker
 import os
-import seaborn as sns
 import itertools
-import matplotlib.pyplot as plt
 
 from .cmap import get_cmap
 
@@ -20,6 +20,40 @@ FILL =    [True, True, True, True,
 
 FIG_SIZE = (10/3, 10/4)
 
+# seaborn's "ticks" style (``sns.axes_style("ticks")``, seaborn 0.13),
+# with ticks inside on all four sides. Kept here so that importing
+# arya does not import seaborn (and with it scipy and pandas).
+SEABORN_STYLE = {
+    "figure.facecolor": "white",
+    "axes.labelcolor": ".15",
+    "xtick.direction": "in",
+    "ytick.direction": "in",
+    "xtick.color": ".15",
+    "ytick.color": ".15",
+    "axes.axisbelow": True,
+    "grid.linestyle": "-",
+    "text.color": ".15",
+    "font.family": ["sans-serif"],
+    "font.sans-serif": ["Arial", "DejaVu Sans", "Liberation Sans",
+                        "Bitstream Vera Sans", "sans-serif"],
+    "lines.solid_capstyle": "round",
+    "patch.edgecolor": "w",
+    "patch.force_edgecolor": True,
+    "image.cmap": "arya",
+    "xtick.top": True,
+    "ytick.right": True,
+    "axes.grid": False,
+    "axes.facecolor": "white",
+    "axes.edgecolor": ".15",
+    "grid.color": ".8",
+    "axes.spines.left": True,
+    "axes.spines.bottom": True,
+    "axes.spines.right": True,
+    "axes.spines.top": True,
+    "xtick.bottom": True,
+    "ytick.left": True,
+}
+
 
 
 def init():
@@ -98,20 +132,10 @@ def set_tick_lengths(L, l):
 
 
 def set_seaborn():
-    sns.set_style("ticks")
-
-    sns.set_style({
-        'xtick.direction': 'in',
-        'ytick.direction': 'in',
-        'xtick.top': True,
-        'ytick.right': True,
-        'axes.splines.top': True,
-        'axes.splines.right': True,
-        'image.cmap': 'arya',
-    })
-
-    plt.rcParams["font.family"] = "serif"
-    plt.rcParams["font.serif"] = "Times"
+    mpl.rcParams.update(SEABORN_STYLE)
+
+    mpl.rcParams["font.family"] = "serif"
+    mpl.rcParams["font.serif"] = "Times"
 
 
 
@@ -0,0 +1,137 @@
+import unittest
+import numpy as np
+import pandas as pd
+import context
+
+from arya.plotting.binnedplot import BinnedData, make_bins, plot_groups, MAX_AUTO_BINS
+
+
+class TestBinnedData(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        N = 2000
+        self.df = pd.DataFrame(dict(
+            a=rng.normal(size=N), 
+            b=rng.normal(size=N), 
+            c=rng.integers(0, 5, N),
+            ))
+
+    def test_groups_match_separate_binning(self):
+        grouped = BinnedData(self.df, x="a", y="b", hue="c", bins=10,
+                             binrange=(-2, 2))
+
+        for c in range(5):
+            sub = self.df[self.df.c == c]
+            single = BinnedData(sub, x="a", y="b", bins=10, binrange=(-2, 2))
+            g = grouped.data[grouped.data.hue == c]
+
+            np.testing.assert_allclose(g.x, single.data.x)
+            np.testing.assert_allclose(g.y, single.data.y)
+            np.testing.assert_allclose(g.y_l, single.data.y_l)
+            np.testing.assert_array_equal(g.counts, single.data.counts)
+
+    def test_chunks_match_in_memory(self):
+        chunks = [self.df.iloc[i:i+300] for i in range(0, len(self.df), 300)]
+        for kwargs in [dict(), dict(hue="c"), dict(errorbar="sterr", binrange=(-1, 1))]:
+            full = BinnedData(self.df, x="a", y="b", bins=10, **kwargs)
+            streamed = BinnedData(chunks, x="a", y="b", bins=10, **kwargs)
+            np.testing.assert_allclose(streamed.data.values.astype(float), 
+                                       full.data.values.astype(float))
+
+    def test_hue_bins(self):
+        self.df["h"] = np.linspace(0, 1, len(self.df))
+        binned = BinnedData(self.df, x="a", y="b", hue="h", bins=10, hue_bins=5, cmin=1)
+        
+        self.assertEqual(list(binned.data.hue.cat.categories), [0, 0.25, 0.5, 0.75])
+        self.assertEqual(binned.data.counts.sum(), len(self.df))
+        self.assertEqual(binned.data.hue.cat.codes.max(), 3)
+
+    def test_workers_match_serial(self):
+        serial = BinnedData(self.df, x="a", y="b", hue="c", bins=10)
+        parallel = BinnedData(self.df, x="a", y="b", hue="c", bins=10, workers=3)
+        np.testing.assert_allclose(parallel.data.values.astype(float), 
+                                   serial.data.values.astype(float))
+
+        serial = BinnedData(self.df, x="a", y="b", bins=10, 
+                            stat="median", errorbar="pi")
+        parallel = BinnedData(self.df, x="a", y="b", bins=10, 
+                              stat="median", errorbar="pi", workers=3)
+        np.testing.assert_array_equal(parallel.data.counts, serial.data.counts)
+        np.testing.assert_allclose(parallel.data.y, serial.data.y, atol=0.2)
+
+    def test_plot_groups(self):
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        binned = BinnedData(self.df, x="a", y="b", hue="c", bins=10, 
+                            stat="median", errorbar="pi")
+        groups = binned.groups()
+        colors = ["C%d" % i for i in range(len(groups))]
+        n = len(binned.data)
+
+        fig, ax = plt.subplots()
+        plot_groups(groups, colors, has_errors=True, aes="scatter")
+        centres, ends = ax.collections
+        self.assertEqual(len(centres.get_offsets()), n)
+        self.assertEqual(len(ends.get_offsets()), 2 * n)
+        np.testing.assert_allclose(centres.get_facecolors()[0], 
+                                   matplotlib.colors.to_rgba("C0"))
+
+        ax.clear()
+        plot_groups(groups, colors, has_errors=True, aes="line")
+        lines, bands = ax.collections
+        self.assertEqual(len(lines.get_segments()), len(groups))
+        self.assertEqual(len(bands.get_paths()), len(groups))
+
+        # keywords only lines take
+        ax.clear()
+        plot_groups(groups, colors, aes="line", marker="o", ms=3, 
+                    drawstyle="steps-mid")
+        self.assertEqual(len(ax.lines), len(groups))
+        self.assertEqual(ax.lines[0].get_marker(), "o")
+        self.assertEqual(ax.lines[0].get_drawstyle(), "steps-mid")
+
+        ax.clear()
+        plot_groups(groups, colors, aes="line", c="k", lw=2)
+        lines, = ax.collections
+        np.testing.assert_allclose(lines.get_colors(), [[0, 0, 0, 1]] * len(groups))
+        plt.close(fig)
+
+    def test_iterator_needs_fixed_bins(self):
+        chunks = (self.df.iloc[i:i+300] for i in range(0, len(self.df), 300))
+        with self.assertRaises(ValueError):
+            BinnedData(chunks, x="a", y="b", bins=10)
+
+        chunks = (self.df.iloc[i:i+300] for i in range(0, len(self.df), 300))
+        streamed = BinnedData(chunks, x="a", y="b", bins=10, binrange=(-2, 2))
+        self.assertEqual(streamed.data.counts.sum(), np.sum(np.abs(self.df.a) <= 2))
+
+
+class TestMakeBins(unittest.TestCase):
+
+    def test_explicit(self):
+        bins, centers = make_bins(np.arange(10), bins=4)
+        np.testing.assert_allclose(bins, [0, 3, 6, 9])
+        np.testing.assert_allclose(centers, [1.5, 4.5, 7.5])
+
+        bins, _ = make_bins(np.arange(10), binwidth=2)
+        np.testing.assert_allclose(bins, [0, 2, 4, 6, 8])
+
+    def test_rules_cover_range(self):
+        x = np.random.default_rng(0).normal(size=20000)
+        for rule in [None, "auto", "freedman", "scott", "knuth", "blocks"]:
+            bins, _ = make_bins(x, bins=rule)
+            self.assertEqual(bins[0], x.min())
+            self.assertEqual(bins[-1], x.max())
+            self.assertTrue(np.all(np.diff(bins) > 0))
+
+    def test_max_bins(self):
+        x = np.concatenate([np.zeros(10000), np.random.default_rng(0).normal(size=10000), [1e6]])
+        bins, _ = make_bins(x)
+        self.assertLessEqual(len(bins) - 1, MAX_AUTO_BINS)
+
+
+if __name__ == '__main__':
+    unittest.main()
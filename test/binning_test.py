@@ -0,0 +1,111 @@
+import unittest
+import numpy as np
+from scipy.stats import binned_statistic
+import context
+
+from arya.plotting._binning import digitize, BinnedMoments, binned_stats, binned_percentiles, QuantileSketch, sketch_size, scan
+
+
+class TestBinning(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.x = rng.normal(size=1000)
+        self.y = 3 * rng.normal(size=1000) + 1e6
+        self.bins = np.linspace(-2, 2, 11)
+
+    def test_digitize(self):
+        x = np.array([-1, 0, 0.5, 1, 1.5, 2, 3, np.nan])
+        idx = digitize(x, [0, 1, 2])
+        np.testing.assert_array_equal(idx, [-1, 0, 0, 1, 1, 1, -1, -1])
+
+    def test_moments(self):
+        for stat in ["count", "mean", "std", "min", "max"]:
+            expected = binned_statistic(self.x, self.y,
+                                        statistic=stat, bins=self.bins)[0]
+            idx = digitize(self.x, self.bins)
+            _, actual, _, _ = binned_stats(idx, self.y, 10, stat=stat)
+            np.testing.assert_allclose(actual, expected)
+
+    def test_merge(self):
+        idx = digitize(self.x, self.bins)
+        full = BinnedMoments.from_index(idx, self.y, 10)
+        a = BinnedMoments.from_index(idx[:300], self.y[:300], 10)
+        b = BinnedMoments.from_index(idx[300:], self.y[300:], 10)
+        merged = a.merge(b)
+
+        np.testing.assert_array_equal(merged.count, full.count)
+        np.testing.assert_allclose(merged.mean, full.mean)
+        np.testing.assert_allclose(merged.std, full.std)
+        np.testing.assert_allclose(merged.min, full.min)
+
+    def test_scan(self):
+        x = self.x.copy()
+        y = self.y.copy()
+        x[::10] = np.nan
+        y[5::10] = np.inf
+        finite = np.isfinite(x) & np.isfinite(y)
+        blocks = [(x[i:i+300], y[i:i+300]) for i in range(0, 1000, 300)]
+
+        scanned = scan(blocks, 500)
+        self.assertEqual(scanned.n, 1000)
+        np.testing.assert_array_equal(scanned.lo, [x[finite].min(), y[finite].min()])
+        np.testing.assert_array_equal(scanned.hi, [x[finite].max(), y[finite].max()])
+        self.assertEqual(len(scanned.sample[0]), 500)
+        # whole rows, all finite
+        rows = set(zip(x[finite], y[finite]))
+        self.assertTrue(all(row in rows for row in zip(*scanned.sample)))
+
+        everything = scan(blocks)
+        self.assertEqual(len(everything.sample[0]), finite.sum())
+        with self.assertRaises(ValueError):
+            scan([(np.full(3, np.nan),)])
+
+    def test_percentiles(self):
+        idx = digitize(self.x, self.bins)
+        q = [50, 16, 84, 2.5, 97.5]
+        actual = binned_percentiles(idx, self.y, 10, q)
+        for i in range(10):
+            expected = np.percentile(self.y[idx == i], q)
+            np.testing.assert_allclose(actual[:, i], expected)
+
+        empty = binned_percentiles([0, 0, 2], [1, 2, 3], 3, 50)
+        np.testing.assert_array_equal(empty, [1.5, np.nan, 3])
+
+    def test_sketch_exact_when_small(self):
+        idx = digitize(self.x, self.bins)
+        sketch = QuantileSketch(10, k=1000).update(idx, self.y)
+        np.testing.assert_allclose(sketch.percentiles([16, 50, 84]),
+                binned_percentiles(idx, self.y, 10, [16, 50, 84]))
+
+    def test_sketch_accuracy(self):
+        rng = np.random.default_rng(1)
+        idx = rng.integers(0, 3, 100000)
+        y = rng.normal(size=100000)
+
+        sketch = QuantileSketch(3, k=100, seed=0)
+        for i in range(0, 100000, 10000):
+            sketch.merge(QuantileSketch(3, k=100, seed=i).update(idx[i:i+10000], y[i:i+10000]))
+
+        q = [2.5, 16, 50, 84, 97.5]
+        approx = sketch.percentiles(q)
+        for b in range(3):
+            ranks = [np.mean(y[idx == b] <= v) for v in approx[:, b]]
+            np.testing.assert_allclose(ranks, np.array(q)/100, atol=0.03)
+
+    def test_sketch_size(self):
+        self.assertEqual(sketch_size(0.01), 200)
+        self.assertAlmostEqual(QuantileSketch(1, k=sketch_size(0.02)).error, 0.02)
+        with self.assertRaises(ValueError):
+            sketch_size(2)
+
+    def test_sketch_percentiles_by_bin(self):
+        idx = digitize(self.x, self.bins)
+        sketch = QuantileSketch(10, k=1000).update(idx, self.y)
+        full = sketch.percentiles([16, 84])
+        np.testing.assert_allclose(sketch.percentiles([16, 84, 84], idx=[2, 2, 7]),
+                                   [full[0, 2], full[1, 2], full[1, 7]])
+
+
+if __name__ == '__main__':
+    unittest.main()
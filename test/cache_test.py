@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+import context
+
+from arya.plotting import ResultCache
+from arya.plotting._cache import fingerprint
+from arya.plotting.binnedplot import BinnedData
+from arya.plotting.medianplot import MedianData
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        N = 2000
+        self.df = pd.DataFrame(dict(
+            a=rng.normal(size=N),
+            b=rng.normal(size=N),
+            c=rng.integers(0, 5, N),
+            h=rng.random(N),
+            ))
+
+    def test_fingerprint(self):
+        a = self.df.a.values
+        self.assertEqual(fingerprint(a, dict(bins=10)), fingerprint(a.copy(), dict(bins=10)))
+        self.assertNotEqual(fingerprint(a, dict(bins=10)), fingerprint(a, dict(bins=11)))
+        self.assertNotEqual(fingerprint(a), fingerprint(a.astype(np.float32)))
+
+        b = a.copy()
+        b[1000] += 1e-9
+        self.assertNotEqual(fingerprint(a), fingerprint(b))
+
+        # strided columns, and objects by value
+        s = np.array(["x", "y"] * 10, dtype=object)
+        self.assertEqual(fingerprint(a[::3]), fingerprint(a[::3].copy()))
+        self.assertEqual(fingerprint(s), fingerprint(s.copy()))
+
+    def test_memory(self):
+        cache = ResultCache()
+        kwargs = dict(x="a", y="b", hue="c", bins=10, binrange=(-2, 2), cache=cache)
+        first = BinnedData(self.df, **kwargs)
+
+        with mock.patch.object(BinnedData, "make_binned", side_effect=AssertionError):
+            second = BinnedData(self.df.copy(), **kwargs)
+        pd.testing.assert_frame_equal(second.data, first.data)
+        np.testing.assert_array_equal(second.bins, first.bins)
+        self.assertTrue(second.has_errors)
+
+        BinnedData(self.df, **dict(kwargs, stat="median", errorbar="pi"))
+        self.df.loc[0, "b"] += 1
+        BinnedData(self.df, **kwargs)
+        self.assertEqual(len(cache), 3)
+
+        small = ResultCache(maxsize=2)
+        for binsize in [10, 20, 30]:
+            MedianData(self.df, x="a", y="b", binsize=binsize, cache=small)
+        self.assertEqual(len(small), 2)
+
+    def test_disk(self):
+        kwargs = dict(x="a", y="b", hue="h", bins=10, hue_bins=4)
+        with tempfile.TemporaryDirectory() as tmp:
+            first = BinnedData(self.df, cache=tmp, **kwargs)
+            first_key, = os.listdir(tmp)
+            first_key = first_key[:-len(".npz")]
+            median = MedianData(self.df, x="a", y="b", style="c",
+                                errorbar="pi", cache=tmp)
+            self.assertEqual(len(os.listdir(tmp)), 2)
+
+            with mock.patch.object(BinnedData, "make_binned", side_effect=AssertionError):
+                second = BinnedData(self.df, cache=ResultCache(path=tmp), **kwargs)
+            with mock.patch.object(MedianData, "bin", side_effect=AssertionError):
+                median2 = MedianData(self.df, x="a", y="b", style="c",
+                                     errorbar="pi", cache=tmp)
+
+            pd.testing.assert_frame_equal(second.data, first.data)
+            pd.testing.assert_frame_equal(median2.data, median.data)
+            np.testing.assert_array_equal(second.hue_bins, first.hue_bins)
+            self.assertIs(second.has_errors, True)
+
+            # the least recently used files are evicted first
+            sizes = lambda: [os.path.getsize(os.path.join(tmp, name)) 
+                             for name in os.listdir(tmp)]
+            cache = ResultCache(path=tmp, max_bytes=sum(sizes()))
+            for binsize in [10, 20, 30]:
+                MedianData(self.df, x="a", y="b", binsize=binsize, cache=cache)
+            self.assertLessEqual(sum(sizes()), cache.max_bytes)
+            self.assertLess(len(sizes()), 5)
+            self.assertFalse(os.path.exists(cache._file(first_key)))
+            self.assertFalse(any(name.endswith(".tmp") for name in os.listdir(tmp)))
+
+            cache.clear()
+            self.assertEqual(os.listdir(tmp), [])
+
+    def test_chunk_columns(self):
+        rec = np.zeros(4, dtype=[("a", float), ("b", float), ("c", float)])
+        rec["a"] = [0, 1, 2, 3]
+        rec["c"] = 5
+        cache = ResultCache()
+        with tempfile.TemporaryDirectory() as tmp:
+            files = []
+            for i in range(2):
+                files.append(os.path.join(tmp, f"{i}.npy"))
+                np.save(files[-1], rec)
+
+            for y, expected in [("b", 0), ("c", 5)]:
+                binned = BinnedData(files, x="a", y=y, bins=[0, 1, 2, 3, 4],
+                                    cmin=1, cache=cache)
+                np.testing.assert_array_equal(binned.data.y, [expected] * 4)
+                median = MedianData(files, x="a", y=y, binsize=2, accuracy=0.01,
+                                    cache=cache)
+                np.testing.assert_array_equal(median.data.y, expected)
+        self.assertEqual(len(cache), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
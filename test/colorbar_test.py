@@ -0,0 +1,44 @@
+import unittest
+import numpy as np
+import context
+
+from arya.figure import HueMap
+
+
+class TestHueMap(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.x = np.concatenate([rng.uniform(-0.5, 3.5, 100000), 
+                                 [0, 0.5, 1.5, 3, -1, 4, 1e300]])
+
+    def check(self, huemap, x):
+        np.testing.assert_array_equal(huemap(x, bytes=True), 
+                                      huemap._mpl.to_rgba(x, bytes=True))
+        np.testing.assert_array_equal(huemap(x), huemap._mpl.to_rgba(x))
+        self.assertEqual(huemap(1.2), huemap._mpl.to_rgba(1.2))
+
+    def test_matches_matplotlib(self):
+        self.check(HueMap((0, 3), "linear"), self.x)
+        self.check(HueMap((0.1, 3), "log"), self.x)
+        self.check(HueMap((0, 3), np.array([0, 0.5, 1.5, 3])), self.x)
+
+    def test_infinite(self):
+        x = np.array([np.inf, -np.inf, 1, 0, -1])
+        self.check(HueMap((0, 3), "linear"), x)
+        self.check(HueMap((0.1, 3), "log"), x)
+        huemap = HueMap((0.1, 3), "log")
+        np.testing.assert_array_equal(huemap(x[:2]), [huemap._mpl.cmap.get_bad()] * 2)
+
+    def test_bad(self):
+        huemap = HueMap((0, 3), np.array([0, 0.5, 1.5, 3]))
+        x = np.array([[1, np.nan], [np.inf, -np.inf]])
+        rgba = huemap(x, bytes=True)
+        self.assertEqual(rgba.shape, (2, 2, 4))
+        np.testing.assert_array_equal(rgba[0, 1], huemap._mpl.cmap.get_bad() * 255)
+        np.testing.assert_array_equal(huemap.bin_color(np.array([0, 2])), 
+                                      huemap._mpl.cmap([0, 2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import context
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from arya.plotting import densityplot
+from arya.plotting.density import ViewImage, pixel_sums
+
+
+class TestDensity(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        N = 100000
+        self.x = rng.normal(size=N)
+        self.y = rng.normal(size=N)
+        self.c = self.x + rng.normal(size=N)
+        self.c[::7] = np.nan
+
+    def test_pixel_sums(self):
+        xedges = np.linspace(-2, 2, 41)
+        yedges = np.linspace(-1, 3, 31)
+        counts, sums = pixel_sums(self.x, self.y, xedges, yedges)
+        expected, _, _ = np.histogram2d(self.x, self.y, [xedges, yedges])
+        np.testing.assert_array_equal(counts, expected)
+        self.assertIsNone(sums)
+
+        valid = np.isfinite(self.c)
+        counts, sums = pixel_sums(self.x, self.y, xedges, yedges, c=self.c, workers=2)
+        expected, _, _ = np.histogram2d(self.x[valid], self.y[valid], [xedges, yedges])
+        expected_sums, _, _ = np.histogram2d(self.x[valid], self.y[valid],
+                [xedges, yedges], weights=self.c[valid])
+        np.testing.assert_array_equal(counts, expected)
+        np.testing.assert_allclose(sums, expected_sums)
+
+        with ProcessPoolExecutor(2) as pool:
+            parallel, parallel_sums = pixel_sums(self.x, self.y, xedges, yedges,
+                                                 c=self.c, workers=pool)
+        np.testing.assert_array_equal(parallel, counts)
+        np.testing.assert_allclose(parallel_sums, sums)
+
+    @plt.rc_context({"text.usetex": False})
+    def test_rebin_on_zoom(self):
+        fig, ax = plt.subplots(figsize=(2, 2), dpi=50)
+        im = densityplot(self.x, self.y, hue=self.c, ax=ax)
+        fig.canvas.draw()
+        view = im._view
+        self.assertEqual(im.get_array().shape[::-1], view[2:])
+
+        fig.canvas.draw()
+        self.assertIs(im._view, view)
+
+        ax.set_xlim(-1, 1)
+        self.assertTrue(im.stale)
+        fig.canvas.draw()
+        self.assertEqual(im._view[0], (-1, 1))
+        self.assertEqual(im.get_extent()[:2], (-1, 1))
+        plt.close(fig)
+
+    @plt.rc_context({"text.usetex": False})
+    def test_rebin_required(self):
+        fig, ax = plt.subplots()
+        with self.assertRaises(TypeError):
+            ViewImage(ax)
+
+        class Blank(ViewImage):
+            def rebin(self, xlim, ylim, nx, ny):
+                return np.zeros((nx, ny)), xlim + ylim
+
+        im = Blank(ax)
+        ax.add_image(im)
+        fig.canvas.draw()
+        self.assertEqual(im.get_extent(), (0, 1, 0, 1))
+        plt.close(fig)
+
+
+if __name__ == '__main__':
+    unittest.main()
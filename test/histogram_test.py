@@ -0,0 +1,171 @@
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import context
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from arya.plotting import hist, hist2d
+from arya.plotting.histogram import Histogram, Histogram2D, bin_index, scotts_bins
+
+
+class TestHistogram(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.x = rng.normal(size=10000)
+        self.y = rng.normal(size=10000)
+        # values on and around the edges
+        self.x[:100] = np.round(self.x[:100], 1)
+        self.x[100:110] = [np.nan, np.inf, -np.inf, 1, -1, 1, 1, 1, 0.3, -0.7]
+
+    def test_uniform_matches_numpy(self):
+        for edges in [np.linspace(-1, 1, 21), np.linspace(-3.3, 2.9, 7), 0.1*np.arange(-10, 11)]:
+            h = Histogram.from_values(self.x, bins=edges)
+            finite = self.x[np.isfinite(self.x)]
+            np.testing.assert_array_equal(h.counts, np.histogram(finite, bins=edges)[0])
+
+    def test_nonuniform_matches_numpy(self):
+        edges = [-2, -1, -0.5, 0, 0.1, 1, 3]
+        h = Histogram.from_values(self.x, bins=edges)
+        finite = self.x[np.isfinite(self.x)]
+        np.testing.assert_array_equal(h.counts, np.histogram(finite, bins=edges)[0])
+        np.testing.assert_array_equal(bin_index([-3, -2, 3, np.nan], edges), [6, 0, 5, 6])
+
+    def test_scotts_bins(self):
+        edges = scotts_bins(self.x)
+        finite = self.x[np.isfinite(self.x)]
+        self.assertEqual(edges[0], finite.min())
+        self.assertEqual(edges[-1], finite.max())
+        h = Histogram.from_values(self.x)
+        self.assertEqual(h.counts.sum(), len(finite))
+
+    def test_2d_matches_numpy(self):
+        h = Histogram2D.from_values(self.x, self.y, bins=(10, [-1, 0, 0.5, 2]), 
+                                    range=((-2, 2), None))
+        filt = np.isfinite(self.x)
+        expected = np.histogram2d(self.x[filt], self.y[filt], 
+                                  bins=(np.linspace(-2, 2, 11), [-1, 0, 0.5, 2]))[0]
+        np.testing.assert_array_equal(h.counts, expected)
+
+    def test_merge(self):
+        edges = np.linspace(-2, 2, 9)
+        a = Histogram.from_values(self.x[:5000], bins=edges)
+        b = Histogram.from_values(self.x[5000:], bins=edges)
+        np.testing.assert_array_equal(a.merge(b).counts, 
+                                      Histogram.from_values(self.x, bins=edges).counts)
+        with self.assertRaises(ValueError):
+            a.merge(Histogram.from_values(self.x, bins=5))
+
+    def test_chunks(self):
+        chunks = [dict(a=self.x[i:i+1000], b=self.y[i:i+1000]) for i in range(0, 10000, 1000)]
+        h = Histogram2D.from_chunks(chunks, "a", "b", bins=20)
+        expected = Histogram2D.from_values(self.x, self.y, bins=20)
+        np.testing.assert_array_equal(h.counts, expected.counts)
+        np.testing.assert_array_equal(h.xedges, expected.xedges)
+
+        h = Histogram.from_chunks(iter(chunks), "a", bins=10, range=(-1, 1))
+        np.testing.assert_array_equal(h.counts, 
+                Histogram.from_values(self.x, bins=10, range=(-1, 1)).counts)
+
+        with self.assertRaises(ValueError):
+            Histogram.from_chunks(iter(chunks), "a")
+
+    def test_workers_match_serial(self):
+        # enough values for several blocks
+        rng = np.random.default_rng(2)
+        x, y, w = rng.normal(size=(3, 300000))
+        serial2d = Histogram2D.from_values(x, y, bins=7, weights=w)
+        threaded = Histogram2D.from_values(x, y, bins=7, weights=w, workers=3)
+        np.testing.assert_array_equal(threaded.counts, serial2d.counts)
+
+        serial = Histogram.from_values(x, bins=13)
+        threaded = Histogram.from_values(x, bins=13, workers=4)
+        np.testing.assert_array_equal(threaded.counts, serial.counts)
+
+        with ProcessPoolExecutor(2) as pool:
+            parallel = Histogram.from_values(x, bins=13, workers=pool)
+            parallel2d = Histogram2D.from_values(x, y, bins=7, weights=w, workers=pool)
+        np.testing.assert_array_equal(parallel.counts, serial.counts)
+        np.testing.assert_array_equal(parallel2d.counts, serial2d.counts)
+
+
+class TestHistPlot(unittest.TestCase):
+    """
+    hist and hist2d accept the options of plt.hist and plt.hist2d
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.x = rng.normal(size=1000)
+        self.y = rng.normal(size=1000)
+        self.fig, self.ax = plt.subplots()
+
+    def tearDown(self):
+        plt.close(self.fig)
+
+    @plt.rc_context({"text.usetex": False})
+    def test_bin_rules(self):
+        for rule in ["auto", "fd", "sturges"]:
+            h = hist(self.x, bins=rule, ax=self.ax)
+            expected, edges = np.histogram(self.x, rule)
+            np.testing.assert_allclose(h.edges, edges)
+            np.testing.assert_array_equal(h.counts, expected)
+
+        h = hist2d(self.x, self.y, bins="fd", ax=self.ax)
+        np.testing.assert_allclose(h.xedges, np.histogram_bin_edges(self.x, "fd"))
+
+    @plt.rc_context({"text.usetex": False})
+    def test_hist_options(self):
+        steps = hist(self.x, cumulative=True, ax=self.ax).plot(self.ax, cumulative=True)
+        values, _, _ = steps.get_data()
+        self.assertEqual(values[-1], len(self.x))
+
+        h = hist(self.x, density=True, cumulative=-1, log=True, ax=self.ax)
+        values, _, _ = self.ax.patches[-1].get_data()
+        self.assertAlmostEqual(values[0], 1)
+        self.assertEqual(self.ax.get_yscale(), "log")
+
+        # left to plt.hist
+        _, _, bars = h.plot(self.ax, rwidth=0.5)
+        self.assertEqual(len(bars), len(h.counts))
+        np.testing.assert_array_equal([b.get_height() for b in bars], h.counts)
+
+    @plt.rc_context({"text.usetex": False})
+    def test_hist2d_options(self):
+        h = hist2d(self.x, self.y, bins=5, cmin=10, ax=self.ax)
+        shape = h.counts.shape[::-1]
+        mask = np.ma.getmaskarray(self.ax.collections[-1].get_array())
+        np.testing.assert_array_equal(mask.reshape(shape).T, h.counts < 10)
+
+        density = h.plot(self.ax, density=True).get_array().reshape(shape).T
+        areas = np.outer(np.diff(h.xedges), np.diff(h.yedges))
+        self.assertAlmostEqual(np.sum(density * areas), 1)
+
+    @plt.rc_context({"text.usetex": False})
+    def test_weights(self):
+        w = np.arange(len(self.x)) % 3
+        data = dict(x=self.x, y=self.y, w=w)
+        chunks = [{k: v[i:i+250] for k, v in data.items()} for i in range(0, 1000, 250)]
+        edges = np.linspace(-3, 3, 13)
+        expected, _ = np.histogram(self.x, edges, weights=w)
+        expected2d, _, _ = np.histogram2d(self.x, self.y, (edges, edges), weights=w)
+
+        for weights, d in [(w, None), ("w", data), ("w", chunks)]:
+            x, y = ("x", "y") if d is not None else (self.x, self.y)
+            h = hist(x, bins=edges, data=d, weights=weights, ax=self.ax)
+            np.testing.assert_array_equal(h.counts, expected)
+            h = hist2d(x, y, bins=edges, data=d, weights=weights, ax=self.ax)
+            np.testing.assert_array_equal(h.counts, expected2d)
+
+        # chunked data is only weighted by a column
+        with self.assertRaises(ValueError):
+            hist("x", data=chunks, weights=w, ax=self.ax)
+        with self.assertRaises(ValueError):
+            hist2d("x", "y", data=chunks, weights=w, ax=self.ax)
+
+
+if __name__ == '__main__':
+    unittest.main()
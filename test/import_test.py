@@ -0,0 +1,34 @@
+import subprocess
+import sys
+import unittest
+import context
+
+from arya._lazy import LazyModule
+
+
+# imported only when first used
+HEAVY_MODULES = ["seaborn", "pandas", "scipy", "astropy", "matplotlib.pyplot"]
+
+
+class TestImport(unittest.TestCase):
+
+    def test_lazy_imports(self):
+        code = ("import sys, arya, matplotlib as mpl; "
+                "print(*[m for m in %r if m in sys.modules]); "
+                "print(mpl.rcParams['image.cmap'], mpl.colormaps['arya_wr'].N)"
+                % HEAVY_MODULES)
+        out = subprocess.run([sys.executable, "-c", code], cwd=context.main_path,
+                             capture_output=True, text=True, check=True).stdout
+        loaded, cmap = out.splitlines()
+        self.assertEqual(loaded, "")
+        self.assertEqual(cmap, "arya 256")
+
+    def test_lazy_module(self):
+        np = LazyModule("numpy")
+        self.assertIsNone(np._module)
+        self.assertEqual(np.sqrt(4), 2)
+        self.assertEqual(np._module.__name__, "numpy")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import context
+
+from arya.plotting import KDE, KDE2D, kde, kde2d
+from arya.plotting.histogram import scotts_bandwidth
+
+
+def direct_kde(points, grid, cov, weights=None):
+    """
+    The Gaussian KDE of points (n, d) at grid (m, d), summing every kernel
+    """
+    if weights is None:
+        weights = np.ones(len(points))
+    diff = grid[:, None, :] - points[None, :, :]
+    q = np.einsum("mni,ij,mnj->mn", diff, np.linalg.inv(cov), diff)
+    k = np.exp(-0.5 * q) / np.sqrt(np.linalg.det(2 * np.pi * cov))
+    return k @ weights / np.sum(weights)
+
+
+class TestKDE(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        N = 2000
+        self.x = np.concatenate([rng.normal(size=N), rng.normal(4, 0.5, N // 2)])
+        self.y = 0.5 * self.x + rng.normal(size=len(self.x))
+        self.w = rng.random(len(self.x))
+
+    def test_1d(self):
+        k = KDE.from_values(self.x)
+        N = len(self.x)
+        self.assertAlmostEqual(k.bandwidth, np.std(self.x, ddof=1) * N**(-1/5))
+        self.assertAlmostEqual(scotts_bandwidth(self.x), k.bandwidth)
+
+        expected = direct_kde(self.x[:, None], k.grid[:, None], 
+                              np.atleast_2d(k.bandwidth**2))
+        np.testing.assert_allclose(k.density, expected, atol=2e-3 * expected.max())
+        self.assertAlmostEqual(np.trapz(k.density, k.grid), 1, places=2)
+
+        k = KDE.from_values(self.x, bw=0.3, weights=self.w, workers=2)
+        expected = direct_kde(self.x[:, None], k.grid[:, None], 
+                              np.atleast_2d(0.09), self.w)
+        np.testing.assert_allclose(k.density, expected, atol=2e-3 * expected.max())
+
+    def test_2d(self):
+        k = KDE2D.from_values(self.x, self.y, gridsize=(240, 200))
+        self.assertEqual(k.density.shape, (240, 200))
+        self.assertNotEqual(k.cov[0, 1], 0)
+
+        # every 8th grid point
+        X, Y = np.meshgrid(k.xgrid[::8], k.ygrid[::8], indexing="ij")
+        grid = np.column_stack([X.ravel(), Y.ravel()])
+        expected = direct_kde(np.column_stack([self.x, self.y]), grid, k.cov)
+        np.testing.assert_allclose(k.density[::8, ::8], expected.reshape(X.shape),
+                                   atol=2e-3 * expected.max())
+
+    def test_workers(self):
+        # enough values for several blocks
+        x = np.tile(self.x, 50)
+        y = np.tile(self.y, 50)
+        w = np.tile(self.w, 50)
+        serial = KDE2D.from_values(x, y, weights=w)
+        with ProcessPoolExecutor(2) as pool:
+            parallel = KDE2D.from_values(x, y, weights=w, workers=pool)
+            parallel1d = KDE.from_values(x, workers=pool)
+        np.testing.assert_allclose(parallel.density, serial.density)
+        np.testing.assert_allclose(parallel1d.density, KDE.from_values(x).density)
+
+    def test_chunks(self):
+        df = pd.DataFrame(dict(a=self.x, b=self.y))
+        chunks = [df.iloc[i:i + 700] for i in range(0, len(df), 700)]
+
+        expected = KDE.from_values(self.x)
+        actual = KDE.from_chunks(chunks, "a")
+        np.testing.assert_allclose(actual.density, expected.density, atol=1e-12)
+
+        expected = KDE2D.from_values(self.x, self.y, range=[(-3, 6), (-4, 5)])
+        actual = KDE2D.from_chunks(chunks, "a", "b", range=[(-3, 6), (-4, 5)])
+        np.testing.assert_allclose(actual.density, expected.density, atol=1e-12)
+
+        # rather than dropping the weights
+        with self.assertRaises(ValueError):
+            kde("a", data=chunks, weights=self.w)
+        with self.assertRaises(ValueError):
+            kde2d("a", "b", data=chunks, weights=self.w)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import numpy as np
+import pandas as pd
+import context
+
+from arya.plotting.medianplot import MedianData
+
+
+class TestMedianData(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        N = 1000
+        self.df = pd.DataFrame(dict(
+            a=rng.normal(size=N), 
+            b=rng.normal(size=N), 
+            c=rng.integers(0, 3, N),
+            ))
+
+    def test_equal_count_bins(self):
+        binned = MedianData(self.df, x="a", y="b", binsize=100, errorbar="pi")
+        data = binned.data
+        self.assertEqual(list(data.counts), [100] * 10)
+
+        x = np.sort(self.df.a)
+        for i in range(10):
+            self.assertAlmostEqual(data.x[i], np.median(x[100*i:100*(i+1)]))
+
+        y = self.df.b.values[np.argsort(self.df.a)]
+        self.assertAlmostEqual(data.y_l[3], np.percentile(y[300:400], 16))
+
+    def test_groups_match_separate_binning(self):
+        grouped = MedianData(self.df, x="a", y="b", hue="c", numbins=7, 
+                             stat="mean", errorbar="std")
+
+        for c in range(3):
+            single = MedianData(self.df[self.df.c == c], x="a", y="b", numbins=7,
+                                stat="mean", errorbar="std")
+            g = grouped.data[grouped.data.hue == c]
+            for col in ["x", "y", "y_l", "counts"]:
+                np.testing.assert_allclose(g[col], single.data[col])
+
+    def test_rolling(self):
+        rolled = MedianData(self.df, x="a", y="b", binsize=100, errorbar="pi",
+                            rolling=True, stride=10)
+        data = rolled.data
+        self.assertEqual(len(data), 91)
+
+        order = np.argsort(self.df.a.values)
+        x = self.df.a.values[order]
+        y = self.df.b.values[order]
+        for i in [0, 7, 90]:
+            window = slice(10*i, 10*i + 100)
+            self.assertAlmostEqual(data.x[i], np.median(x[window]))
+            self.assertAlmostEqual(data.y[i], np.median(y[window]))
+            self.assertAlmostEqual(data.y_h[i], np.percentile(y[window], 84))
+
+    def test_rolling_groups(self):
+        rolled = MedianData(self.df, x="a", y="b", hue="c", binsize=50,
+                            stat="mean", errorbar="std", rolling=True)
+        sizes = self.df.groupby("c").size()
+        np.testing.assert_array_equal(rolled.data.groupby("hue").size(), sizes - 49)
+
+    def test_sketch_matches_exact(self):
+        exact = MedianData(self.df, x="a", y="b", hue="c", numbins=4, errorbar="pi")
+        sketched = MedianData(self.df, x="a", y="b", hue="c", numbins=4, 
+                              errorbar="pi", accuracy=0.01)
+
+        # few enough points that the sketches are exact
+        for col in ["x", "y", "y_l", "y_h"]:
+            np.testing.assert_allclose(sketched.data[col], exact.data[col], atol=0.1)
+        self.assertEqual(sketched.data.counts.sum(), len(self.df))
+
+    def test_sketch_chunks(self):
+        rng = np.random.default_rng(1)
+        df = pd.DataFrame(dict(a=rng.normal(size=100000), b=rng.normal(size=100000)))
+        chunks = [df.iloc[i:i+10000] for i in range(0, 100000, 10000)]
+
+        binned = MedianData(chunks, x="a", y="b", numbins=10, errorbar="pi",
+                            accuracy=0.01, workers=2)
+        data = binned.data
+        self.assertEqual(data.counts.sum(), 100000)
+        np.testing.assert_allclose(data.counts, 10000, atol=1000)
+
+        order = np.argsort(df.a.values)
+        x = df.a.values[order]
+        for i in range(1, 9):
+            self.assertAlmostEqual(data.x[i], np.median(x[10000*i:10000*(i+1)]), 
+                                   delta=0.05)
+
+        with self.assertRaises(ValueError):
+            MedianData(iter(chunks), x="a", y="b")
+
+
+if __name__ == '__main__':
+    unittest.main()
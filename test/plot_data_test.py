@@ -0,0 +1,85 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import context
+
+from arya.plotting import PlotData
+from arya.plotting.binnedplot import BinnedData
+from arya.plotting._plot_data import group_codes
+
+
+class TestPlotData(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        N = 1000
+        self.arr = np.zeros(N, dtype=[("a", "f8"), ("b", "f8"), ("c", "i8")])
+        self.arr["a"] = rng.normal(size=N)
+        self.arr["b"] = rng.normal(size=N)
+        self.arr["c"] = rng.integers(0, 3, N)
+        self.arr["a"][[3, 5]] = [np.nan, np.inf]
+
+    def test_views(self):
+        dat = PlotData(self.arr, x="a", y="b")
+        self.assertTrue(np.shares_memory(dat.columns["x"], self.arr))
+        self.assertEqual(dat.mask.sum(), len(self.arr) - 2)
+        self.assertEqual(len(dat.data), len(self.arr) - 2)
+
+        d = {k: self.arr[k] for k in ["a", "b"]}
+        dat = PlotData(d, x="a", y="b")
+        self.assertTrue(np.shares_memory(dat.columns["y"], self.arr))
+
+    def test_inputs_agree(self):
+        df = pd.DataFrame({k: self.arr[k] for k in ["a", "b", "c"]})
+        expected = BinnedData(df, x="a", y="b", hue="c", bins=5).data
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "data.npy")
+            np.save(path, self.arr)
+            mmap = np.load(path, mmap_mode="r")
+
+            for data in [self.arr, mmap, {k: self.arr[k] for k in ["a", "b", "c"]}]:
+                actual = BinnedData(data, x="a", y="b", hue="c", bins=5).data
+                pd.testing.assert_frame_equal(actual, expected)
+            del mmap, actual
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "needs pyarrow")
+    def test_arrow(self):
+        import pyarrow as pa
+        table = pa.table({k: self.arr[k] for k in ["a", "b", "c"]})
+        table = table.append_column("h", pa.array(["x", "y"] * 500).dictionary_encode())
+
+        dat = PlotData(table, x="b", y="c", hue="h")
+        buffer = np.frombuffer(table.column("b").chunk(0).buffers()[1], dtype="f8")
+        self.assertTrue(np.shares_memory(dat.columns["x"], buffer))
+        self.assertEqual(list(dat.columns["hue"].categories), ["x", "y"])
+
+        df = pd.DataFrame({k: self.arr[k] for k in ["a", "b", "c"]})
+        pd.testing.assert_frame_equal(
+                BinnedData(table, x="a", y="b", hue="c", bins=5).data,
+                BinnedData(df, x="a", y="b", hue="c", bins=5).data)
+
+    @unittest.skipUnless(importlib.util.find_spec("polars"), "needs polars")
+    def test_polars(self):
+        import polars as pl
+        pdf = pl.DataFrame({k: self.arr[k] for k in ["a", "b", "c"]})
+        df = pd.DataFrame({k: self.arr[k] for k in ["a", "b", "c"]})
+        pd.testing.assert_frame_equal(
+                BinnedData(pdf, x="a", y="b", hue="c", bins=5).data,
+                BinnedData(df, x="a", y="b", hue="c", bins=5).data)
+
+    def test_group_codes(self):
+        df = pd.DataFrame(dict(h=[2, 1, 2, np.nan, 1], s=["a", "b", "b", "a", "c"]))
+        mask = np.array([True, True, True, True, False])
+        codes, values = group_codes(df, ["h", "s"], mask=mask)
+
+        np.testing.assert_array_equal(codes, [1, 0, 2, -1, -1])
+        self.assertEqual(list(values.itertuples(index=False, name=None)),
+                         [(1, "b"), (2, "a"), (2, "b")])
+
+
+if __name__ == '__main__':
+    unittest.main()
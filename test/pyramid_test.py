@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import context
+
+from arya.plotting import HistPyramid
+
+
+class TestHistPyramid(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        N = 100000
+        x = rng.normal(size=N)
+        y = rng.normal(size=N)
+        # the coarser levels extend past the range when padded
+        inside = (np.abs(x) < 4) & (np.abs(y) < 4)
+        self.x = x[inside]
+        self.y = y[inside]
+        self.pyramid = HistPyramid.from_values(self.x, self.y, bins=(300, 200),
+                range=[(-4, 4), (-4, 4)], tile_size=32)
+
+    def test_levels(self):
+        p = self.pyramid
+        self.assertEqual(p.shapes, [(300, 200), (150, 100), (75, 50), (38, 25), (19, 13)])
+
+        for level in range(len(p.levels)):
+            xedges, yedges = p.edges(level)
+            expected, _, _ = np.histogram2d(self.x, self.y, [xedges, yedges])
+            h = p.select((-5, 5), (-5, 5), level=level)
+            np.testing.assert_array_equal(h.counts, expected)
+
+    def test_select(self):
+        p = self.pyramid
+        h = p.select((-1, 0.5), (0.2, 3), level=1)
+        self.assertLessEqual(h.xedges[0], -1)
+        self.assertGreaterEqual(h.xedges[-1], 0.5)
+        expected, _, _ = np.histogram2d(self.x, self.y, [h.xedges, h.yedges])
+        np.testing.assert_array_equal(h.counts, expected)
+
+        # pixels of 8/100 are 3 x-bins and 2 y-bins wide
+        self.assertEqual(p.level_for((-4, 4), (-4, 4), 100, 100), 1)
+        self.assertEqual(p.level_for((-4, 4), (-4, 4), 10, 10), 4)
+        self.assertEqual(p.level_for((0, 0.1), (0, 0.1), 100, 100), 0)
+
+    def test_save(self):
+        NpzFile = np.lib.npyio.NpzFile
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ["p", "p.npz"]:
+                path = os.path.join(tmp, name)
+                self.pyramid.save(path)
+                # every file opened is closed again
+                with mock.patch.object(NpzFile, "__init__", autospec=True,
+                                       side_effect=NpzFile.__init__) as opened, \
+                     mock.patch.object(NpzFile, "close", autospec=True,
+                                       side_effect=NpzFile.close) as closed:
+                    loaded = HistPyramid.load(path)
+                    self.assertEqual(loaded.shapes, self.pyramid.shapes)
+                    for level in [0, 2]:
+                        np.testing.assert_array_equal(
+                            loaded.select((-1, 2), (-3, 0), level=level).counts,
+                            self.pyramid.select((-1, 2), (-3, 0), level=level).counts)
+                self.assertGreater(opened.call_count, 0)
+                self.assertEqual(closed.call_count, opened.call_count)
+                del loaded
+
+        with self.assertRaises(ValueError):
+            self.pyramid.select((-1, 2), (-3, 0))
+
+    def test_non_uniform(self):
+        with self.assertRaises(ValueError):
+            HistPyramid.from_values(self.x, self.y, bins=[[-1, 0, 2], [0, 1, 2]])
+
+
+if __name__ == '__main__':
+    unittest.main()
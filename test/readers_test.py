@@ -0,0 +1,117 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+import context
+
+from arya.plotting import LazyTable
+from arya.plotting.binnedplot import BinnedData
+from arya.plotting.medianplot import MedianData
+
+
+class TestLazyTable(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        N = 1000
+        self.arr = np.zeros(N, dtype=[("a", "f8"), ("b", "f8"), ("c", "i8"), ("d", "f8")])
+        for col in ["a", "b", "d"]:
+            self.arr[col] = rng.normal(size=N)
+        self.arr["c"] = rng.integers(0, 3, N)
+        self.df = pd.DataFrame({k: self.arr[k] for k in self.arr.dtype.names})
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def check(self, source, **kwargs):
+        expected = BinnedData(self.df, x="a", y="b", hue="c", bins=5).data
+        actual = BinnedData(LazyTable(source, **kwargs), x="a", y="b", hue="c", bins=5).data
+        pd.testing.assert_frame_equal(actual, expected)
+
+        sub = self.df.iloc[100:600]
+        sub = sub[(sub.d > 0) & sub.c.isin([0, 2])]
+        table = LazyTable(source, rows=(100, 600), 
+                          where=[("d", ">", 0), ("c", "in", [0, 2])], **kwargs)
+        columns = table.read(["a", "c"])
+        np.testing.assert_array_equal(np.asarray(columns["a"]), sub.a)
+        np.testing.assert_array_equal(np.asarray(columns["c"]), sub.c)
+
+        expected = MedianData(sub, x="a", y="b", binsize=50).data
+        actual = MedianData(table, x="a", y="b", binsize=50).data
+        pd.testing.assert_frame_equal(actual, expected)
+
+    def test_npy(self):
+        np.save(self.path("t.npy"), self.arr)
+        self.check(self.path("t.npy"))
+        pd.testing.assert_frame_equal(
+                BinnedData(self.path("t.npy"), x="a", y="b", bins=5).data,
+                BinnedData(self.df, x="a", y="b", bins=5).data)
+
+    def test_fits(self):
+        from astropy.io import fits
+        fits.BinTableHDU(self.arr).writeto(self.path("t.fits"))
+        self.check(self.path("t.fits"))
+
+        # the file is closed once read, and the columns outlive it
+        with mock.patch.object(fits.HDUList, "close", autospec=True,
+                               side_effect=fits.HDUList.close) as close:
+            columns = LazyTable(self.path("t.fits")).read(["a"])
+        close.assert_called_once()
+        np.testing.assert_array_equal(columns["a"], self.arr["a"])
+
+    def test_hdulist(self):
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        from astropy.io import fits
+        from arya.plotting import hist
+
+        fits.BinTableHDU(self.arr).writeto(self.path("t.fits"))
+        with fits.open(self.path("t.fits")) as hdul:
+            self.check(hdul)
+            pd.testing.assert_frame_equal(
+                    BinnedData(hdul, x="a", y="b", bins=5).data,
+                    BinnedData(self.df, x="a", y="b", bins=5).data)
+
+            fig, ax = plt.subplots()
+            with plt.rc_context({"text.usetex": False}):
+                h = hist("a", data=hdul, bins=10, ax=ax)
+            plt.close(fig)
+        np.testing.assert_array_equal(h.counts, np.histogram(self.arr["a"], 10)[0])
+
+    @unittest.skipUnless(importlib.util.find_spec("h5py"), "needs h5py")
+    def test_hdf5(self):
+        import h5py
+        with h5py.File(self.path("t.h5"), "w") as f:
+            f["table"] = self.arr
+            group = f.create_group("cols")
+            for col in self.arr.dtype.names:
+                group.create_dataset(col, data=self.arr[col], compression="gzip")
+
+        self.check(self.path("t.h5"))
+        self.check(self.path("t.h5"), key="cols")
+
+        with mock.patch.object(h5py.File, "close", autospec=True,
+                               side_effect=h5py.File.close) as close:
+            columns = LazyTable(self.path("t.h5"), key="cols").read(["a"])
+        close.assert_called_once()
+        np.testing.assert_array_equal(columns["a"], self.arr["a"])
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "needs pyarrow")
+    def test_parquet(self):
+        self.df.to_parquet(self.path("t.parquet"), row_group_size=128)
+        self.check(self.path("t.parquet"))
+
+    def test_bad_op(self):
+        with self.assertRaises(ValueError):
+            LazyTable("t.npy", where=[("a", "~", 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import io
+import pickle
+import subprocess
+import sys
+import unittest
+import numpy as np
+import pandas as pd
+import context
+
+from arya import stats
+from arya.plotting.binnedplot import BinnedData
+from arya.plotting.medianplot import MedianData
+
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        N = 2000
+        self.df = pd.DataFrame(dict(
+            a=rng.normal(size=N),
+            b=rng.normal(size=N),
+            c=rng.integers(0, 3, N),
+            ))
+
+    def test_binned(self):
+        s = stats.binned(self.df, x="a", y="b", hue="c", bins=10, binrange=(-2, 2))
+        dat = BinnedData(self.df, x="a", y="b", hue="c", bins=10, binrange=(-2, 2))
+
+        np.testing.assert_array_equal(s.centers, dat.data.x)
+        np.testing.assert_array_equal(s.stat, dat.data.y)
+        np.testing.assert_array_equal(s.lower, dat.data.y_l)
+        np.testing.assert_array_equal(s.counts, dat.data.counts)
+        np.testing.assert_array_equal(s.groups["hue"][s.codes], dat.data.hue)
+
+        # each center is in the middle of its edges
+        np.testing.assert_allclose(s.edges.mean(axis=1), s.centers)
+        for code in range(3):
+            a = self.df.a[self.df.c == code]
+            expected, _ = np.histogram(a, dat.bins)
+            edges = s.edges[s.codes == code]
+            np.testing.assert_array_equal(s.counts[s.codes == code],
+                    expected[np.searchsorted(dat.bins, edges[:, 0])])
+
+    def test_running_median(self):
+        s = stats.running_median(self.df, x="a", y="b", binsize=100, errorbar=None)
+        self.assertIsNone(s.lower)
+        self.assertEqual(s.groups, {})
+        np.testing.assert_array_equal(s.counts, 100)
+
+        x = np.sort(self.df.a)
+        np.testing.assert_array_equal(s.edges[:, 0], x[::100])
+        np.testing.assert_array_equal(s.edges[:, 1], x[99::100])
+
+        rolled = stats.running_median(self.df, x="a", y="b", hue="c", binsize=50,
+                                      rolling=True, stride=10)
+        dat = MedianData(self.df, x="a", y="b", hue="c", binsize=50,
+                         errorbar="pi", rolling=True, stride=10)
+        np.testing.assert_array_equal(rolled.upper, dat.data.y_h)
+        self.assertTrue(np.all(rolled.edges[:, 0] <= rolled.centers))
+        self.assertTrue(np.all(rolled.centers <= rolled.edges[:, 1]))
+
+    def test_serialize(self):
+        s = stats.binned(self.df, x="a", y="b", style="c", bins=10)
+        for loaded in [pickle.loads(pickle.dumps(s)),
+                       stats.BinnedStats.from_dict(s.to_dict())]:
+            for name in ["edges", "centers", "stat", "lower", "counts", "codes"]:
+                np.testing.assert_array_equal(getattr(loaded, name), getattr(s, name))
+            np.testing.assert_array_equal(loaded.groups["style"], s.groups["style"])
+
+        f = io.BytesIO()
+        np.savez(f, **s.to_dict())
+        f.seek(0)
+        with np.load(f, allow_pickle=False) as arrays:
+            loaded = stats.BinnedStats.from_dict(arrays)
+        np.testing.assert_array_equal(loaded.upper, s.upper)
+
+    def test_no_pyplot(self):
+        code = ("import sys, numpy as np, arya; "
+                "s = arya.stats.running_median(dict(x=np.arange(100.), y=np.ones(100)), "
+                "x='x', y='y', numbins=4); "
+                "print(len(s), 'matplotlib.pyplot' in sys.modules)")
+        out = subprocess.run([sys.executable, "-c", code], cwd=context.main_path,
+                             capture_output=True, text=True, check=True).stdout
+        self.assertEqual(out.split(), ["4", "False"])
+
+
+if __name__ == '__main__':
+    unittest.main()